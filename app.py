@@ -5,53 +5,226 @@ for YOLO11 object detection.
 Copyright 2024 ktun@
 
 CREATED: 2024-11-12 23:50:34
-MODIFIED: 2024-11-13 16:13:08
+MODIFIED: 2026-10-17 23:59:40
 """
 # -*- coding:utf-8 -*-
 # import the necessary libraries
+import io
+import os
 import json
-import pandas as pd
+import logging
+import time
+import base64
+import asyncio
+import secrets
+import zipfile
+import numpy as np
 #
 from PIL import Image
-from model import Detector
+from typing import AsyncIterator, BinaryIO, List, Optional, Tuple, Union
+from contextlib import AsyncExitStack, asynccontextmanager
+from model import Detector, BatchScheduler, TiledDetector, ModelRegistry
+from model.tiler import get_tile_boxes
 from fastapi.middleware.cors import CORSMiddleware
-from utils import ImageProcessor, Visualizer, get_logger
-from fastapi.responses import RedirectResponse, StreamingResponse
-from fastapi import FastAPI, status, HTTPException, File, UploadFile
+from fastapi.concurrency import run_in_threadpool
+from utils import Detections, ImageProcessor, Visualizer, get_logger
+from utils import StageExecutors, AdmissionController, ServiceOverloaded, ResultCache
+from utils import VideoProcessor, MjpegParser, LatestFrameMailbox, StartupTracker, FrameDeduplicator
+from utils import QualityController, QualityLevel
+from utils import MetricsMiddleware, UploadLimitMiddleware, metrics_registry, timed_stage
+from utils.metrics import PROMETHEUS_CONTENT_TYPE, observe_stage
+from utils.image_processor import IMAGE_MEDIA_TYPES
+from utils.uploads import spool_request_body, parse_multipart_files
+from utils.frame_dedup import compute_frame_hash
+from utils.tensor_input import NPY_MEDIA_TYPE, read_frame_tensor
+from starlette.websockets import WebSocketState
+from fastapi.responses import JSONResponse, RedirectResponse, Response, StreamingResponse
+from fastapi import FastAPI, Depends, Request, Query, status, HTTPException, File, UploadFile, WebSocket, WebSocketDisconnect
 
 
 #region Configuration
 # Change thepaths with the desired files
 MODEL_PATH = "./weights/yolo11s.pt"
 SWAGGER_JSON_PATH = "./data/swagger.json"
+# Write the OpenAPI documentation to SWAGGER_JSON_PATH on startup only when requested
+SAVE_OPENAPI_JSON = os.getenv("SAVE_OPENAPI_JSON", "0").lower() in ("1", "true", "yes")
 # Define the device
 DEVICE = "cpu"
+# Define the inference backend: "pytorch", "onnx", "openvino" or "torchscript". Exported
+# models are cached in EXPORT_DIR, keyed by weights hash, image size and batch size
+MODEL_BACKEND = "pytorch"
+EXPORT_DIR = "./weights/exported"
+# Define the served models by name, a request picks one with its model parameter. Models are
+# loaded on first use unless preloaded in the background after the server started, and the least
+# recently used idle models are unloaded when the resident size exceeds MODEL_MEMORY_BUDGET_BYTES
+MODELS = {"yolo11s": MODEL_PATH}
+DEFAULT_MODEL = "yolo11s"
+PRELOAD_MODELS = (DEFAULT_MODEL,)
+MODEL_MEMORY_BUDGET_BYTES = 512 * 1024 * 1024
 # Define the allowed origins
 ALLOWED_ORIGINS = ["http://localhost", "http://localhost:8001", "*"]
+# Define the micro-batching limits, a batch is dispatched when it is full or the wait expires
+BATCH_MAX_SIZE = 8
+BATCH_MAX_WAIT_MS = 10.0
+# Define the workers of each blocking pipeline stage, stages listed in
+# STAGE_PROCESS_POOLS run in a process pool instead of a thread pool. Only the
+# stateless "decode" stage may: the inference stage calls the loaded models,
+# which can not be pickled, and process stages lose the request context, so
+# their time is missing from the stage timings and the Server-Timing header
+STAGE_WORKERS = {"decode": 2, "inference": 1, "render": 2}
+STAGE_PROCESS_POOLS = ()
+# Define the admission limits, requests beyond them are rejected with 503
+ADMISSION_MAX_IN_FLIGHT = 16
+ADMISSION_MAX_QUEUE = 64
+ADMISSION_RETRY_AFTER = 1
+# Define the inference parameters of the detection endpoints
+INFERENCE_PARAMS = {"save": False, "image_size": 640, "conf": 0.5, "iou": 0.7, "max_det": 300, "classes": None, "augment": False}
+# Define the limits of the inference parameters a request may override
+INFERENCE_MIN_IMAGE_SIZE = 160
+INFERENCE_MAX_IMAGE_SIZE = 1280
+INFERENCE_MIN_CONF = 0.05
+INFERENCE_MAX_DET = 300
+# Define the most crops a single request of the crops endpoint may return
+CROPS_MAX_COUNT = 100
+# Define the quality levels of the detection endpoints, from the full quality to the cheapest.
+# When the recent p95 inference latency exceeds QUALITY_TARGET_P95_MS, or more than
+# QUALITY_MAX_QUEUE_DEPTH images and requests are waiting, requests are served one level lower,
+# and one level higher again once the load falls. A level caps the model image_size, serves the
+# requests without a model parameter with another model, and with render False drops the
+# annotated image of /img_object_detection (the image endpoints render a preview instead)
+QUALITY_LEVELS = (
+    {"name": "full"},
+    {"name": "reduced", "image_size": 480},
+    {"name": "minimal", "image_size": 320, "render": False},
+)
+QUALITY_TARGET_P95_MS = 500.0
+QUALITY_MAX_QUEUE_DEPTH = 4 * BATCH_MAX_SIZE
+# Decode JPEGs with DCT scaling close to the model input size when no full-size image is returned
+REDUCED_DECODE = True
+# Define the result cache, keyed by the uploaded bytes and the inference parameters
+CACHE_MAX_BYTES = 64 * 1024 * 1024
+CACHE_TTL_SECONDS = 300.0
+CACHE_STORE_IMAGES = True  # also cache the encoded annotated images
+# Define the near-duplicate frame skipping of the requests sending a stream_id: a frame whose
+# hash differs from the last inferred frame of its stream in at most DEDUP_MAX_DISTANCE of
+# 64 bits reuses its detections, until they are DEDUP_MAX_REUSE_SECONDS old
+DEDUP_MAX_STREAMS = 1024
+DEDUP_MAX_DISTANCE = 4
+DEDUP_MAX_REUSE_SECONDS = 5.0
+DEDUP_IDLE_SECONDS = 300.0  # streams not seen for this long are dropped
+# Define the largest pixel buffer of the tensor endpoints, held in memory as sent (an 8K RGB frame)
+TENSOR_MAX_BYTES = 7680 * 4320 * 3 + 4096
+# Define the upload limits, enforced while the request body streams in. Paths listed in
+# UPLOAD_PATH_LIMITS have their own limit, None for none (the MJPEG stream is bounded per frame)
+MAX_UPLOAD_BYTES = 32 * 1024 * 1024
+UPLOAD_PATH_LIMITS = {
+    "/img_object_detection_to_json_batch": 512 * 1024 * 1024,
+    "/video_object_detection": 1024 * 1024 * 1024,
+    "/mjpeg_object_detection": None,
+    "/tensor_object_detection_to_json": TENSOR_MAX_BYTES,
+    "/tensor_object_detection_crops": TENSOR_MAX_BYTES,
+}
+# Raw uploads larger than this are spooled to disk instead of memory. The batch endpoint
+# holds all its files at once, so each of them only keeps UPLOAD_BATCH_SPOOL_MAX_MEMORY in memory
+UPLOAD_SPOOL_MAX_MEMORY = 1024 * 1024
+UPLOAD_BATCH_SPOOL_MAX_MEMORY = 64 * 1024
+# Endpoints reading their multipart body themselves, their parsing is timed by the endpoint
+SELF_PARSED_PATHS = {"/img_object_detection_to_json_batch"}
+# Define the streaming limits of the video endpoints
+MJPEG_MAX_FRAME_BYTES = 16 * 1024 * 1024
+MJPEG_BOUNDARY = "frame"
+# Add a Server-Timing header with the stage durations to every response, a single request
+# opts in with an X-Server-Timing header when it is off
+SERVER_TIMING = False
+# Define the tiled inference limits of very large images
+TILE_MAX_TILES = 256  # tiles a single request may produce
+TILE_MAX_BATCH = 32
+TILE_PREPASS_CONF = 0.25  # lower than the final threshold, so faint objects keep their tiles
 #endregion
 
 
 #region Components
 # Initialize components
 logger = get_logger(__name__)  # setup logger
+startup_tracker = StartupTracker()
 
-detector = Detector(model_path=MODEL_PATH, device=DEVICE)
+model_registry = ModelRegistry(
+    models=MODELS,
+    default_model=DEFAULT_MODEL,
+    memory_budget_bytes=MODEL_MEMORY_BUDGET_BYTES,
+    detector_options={
+        "device": DEVICE,
+        "backend": MODEL_BACKEND,
+        "export_imgsz": INFERENCE_PARAMS["image_size"],
+        "export_batch": BATCH_MAX_SIZE,
+        "export_dir": EXPORT_DIR,
+    },
+    warmup_image_size=INFERENCE_PARAMS["image_size"],
+)
 image_processor = ImageProcessor()
 visualizer = Visualizer()
+video_processor = VideoProcessor()
+tiled_detector = TiledDetector(prepass_size=INFERENCE_PARAMS["image_size"])
+stage_executors = StageExecutors(workers=STAGE_WORKERS, process_stages=STAGE_PROCESS_POOLS)
+admission_controller = AdmissionController(
+    max_in_flight=ADMISSION_MAX_IN_FLIGHT,
+    max_queue=ADMISSION_MAX_QUEUE,
+    retry_after=ADMISSION_RETRY_AFTER,
+)
+result_cache = ResultCache(max_bytes=CACHE_MAX_BYTES, ttl_seconds=CACHE_TTL_SECONDS)
+frame_deduplicator = FrameDeduplicator(
+    max_streams=DEDUP_MAX_STREAMS,
+    max_distance=DEDUP_MAX_DISTANCE,
+    max_reuse_seconds=DEDUP_MAX_REUSE_SECONDS,
+    idle_seconds=DEDUP_IDLE_SECONDS,
+)
+websocket_stats = {"connections": 0, "active_connections": 0, "frames_received": 0, "frames_processed": 0, "frames_dropped": 0}
+batch_scheduler = BatchScheduler(
+    predict_fn=model_registry.batch_predict,
+    max_batch_size=BATCH_MAX_SIZE,
+    max_wait_ms=BATCH_MAX_WAIT_MS,
+    executor=stage_executors.get_executor("inference"),
+)
 
-logger.info("FastAPI components initialized. Detector model loaded from '%s' on device '%s'.", MODEL_PATH, DEVICE)
+quality_controller = QualityController(
+    levels=QUALITY_LEVELS,
+    target_p95_ms=QUALITY_TARGET_P95_MS,
+    max_queue_depth=QUALITY_MAX_QUEUE_DEPTH,
+    queue_depth=lambda: batch_scheduler.queue_depth + admission_controller.queue_depth,
+)
+
+metrics_registry.gauge("yolo_batch_queue_depth", "Images waiting to be batched.", callback=lambda: batch_scheduler.queue_depth)
+metrics_registry.gauge("yolo_admission_queue_depth", "Requests waiting for a processing slot.", callback=lambda: admission_controller.queue_depth)
+metrics_registry.gauge("yolo_admission_in_flight", "Requests holding a processing slot.", callback=lambda: admission_controller.in_flight)
+metrics_registry.gauge("yolo_stream_skip_ratio", "Share of the stream frames served with reused detections.", callback=lambda: frame_deduplicator.get_stats()["skip_ratio"])
+metrics_registry.gauge("yolo_models_resident_bytes", "Approximate memory of the loaded models.", callback=lambda: model_registry.get_stats()["resident_bytes"])
+
+startup_tracker.mark("components")
+logger.info("FastAPI components initialized. Models %s are loaded on device '%s' in the background.", list(PRELOAD_MODELS), DEVICE)
 #endregion
 
 
 #region FastAPI
+def record_request_parse(request: Request) -> None:
+    """Time the upload parsing, dependencies are solved right after the form body was read."""
+    started_at = getattr(request.state, "started_at", None)
+    if request.url.path in SELF_PARSED_PATHS:
+        return
+    if started_at is not None and request.headers.get("content-type", "").startswith("multipart/form-data"):
+        observe_stage("request_parse", time.perf_counter() - started_at)
+
 # Set a title
 app = FastAPI(
     title="Yolo11 Object Detection FastAPI Service",
     description="""This API allows you to obtain object detection values 
             from an image, returning both the image and a JSON result.""",
     version="v1.0",
+    dependencies=[Depends(record_request_parse)],
 )
 
+# Middleware rejecting uploads over their limit with 413 while they stream in
+app.add_middleware(UploadLimitMiddleware, max_bytes=MAX_UPLOAD_BYTES, path_limits=UPLOAD_PATH_LIMITS)
+
 # Middleware for handling CORS, allowing specific origins
 logger.info("CORS middleware initialized with allowed origins: %s", ALLOWED_ORIGINS)
 app.add_middleware(
@@ -62,36 +235,213 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Middleware counting and timing the requests for the /metrics endpoint
+app.add_middleware(MetricsMiddleware, server_timing=SERVER_TIMING)
+
 @app.on_event("startup")
 def save_openapi_json() -> None:
-    """Save OpenAPI documentation data to a JSON file for offline use."""
+    """Save OpenAPI documentation data to a JSON file for offline use, when SAVE_OPENAPI_JSON is set."""
+    if not SAVE_OPENAPI_JSON:
+        return
     openapi_data = app.openapi()
     with open(SWAGGER_JSON_PATH, "w") as file:
         json.dump(openapi_data, file)
     logger.info("OpenAPI JSON documentation saved to '%s'.", SWAGGER_JSON_PATH)
 
+@app.on_event("startup")
+async def start_batch_scheduler() -> None:
+    """Start the micro-batching worker on the server event loop."""
+    await batch_scheduler.start()
+
+@app.on_event("startup")
+async def start_model_loading() -> None:
+    """Load and warm up the preloaded models in the background, so the server binds its port right away."""
+    startup_tracker.mark("server_start")
+
+    async def load_models() -> None:
+        try:
+            await run_in_threadpool(model_registry.preload, PRELOAD_MODELS)
+            startup_tracker.mark("model_warmup")
+            startup_tracker.mark_ready()
+        except Exception as e:
+            startup_tracker.mark_failed(e)
+
+    app.state.model_loading = asyncio.get_running_loop().create_task(load_models())
+
+@app.on_event("shutdown")
+async def stop_batch_scheduler() -> None:
+    """Stop the micro-batching worker."""
+    await batch_scheduler.stop()
+    stage_executors.shutdown()
+
+@app.exception_handler(ServiceOverloaded)
+async def handle_service_overloaded(request: Request, exc: ServiceOverloaded) -> JSONResponse:
+    """Reject requests beyond the admission limits with 503 and a Retry-After hint."""
+    return JSONResponse(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        content={"detail": str(exc)},
+        headers={"Retry-After": str(exc.retry_after)},
+    )
+
 @app.get("/", include_in_schema=False)
 async def redirect_to_docs() -> RedirectResponse:
     """Redirect root URL to API documentation."""
-    logger.info("Redirecting to /docs.")
+    logger.debug("Redirecting to /docs.")
     return RedirectResponse("/docs")
 
 
 @app.get("/healthcheck", status_code=status.HTTP_200_OK)
 def perform_healthcheck() -> dict:
     """Healthcheck endpoint to confirm the service is running."""
-    logger.info("Healthcheck endpoint hit.")
+    logger.debug("Healthcheck endpoint hit.")
     return {"healthcheck": "Everything OK!"}
+
+
+@app.get("/ready")
+def check_readiness() -> JSONResponse:
+    """Readiness probe, 200 once the preloaded models are warmed up and 503 before."""
+    readiness = startup_tracker.get_stats()
+    status_code = status.HTTP_200_OK if readiness["ready"] else status.HTTP_503_SERVICE_UNAVAILABLE
+    return JSONResponse(status_code=status_code, content=readiness)
+
+
+@app.get("/metrics", include_in_schema=False)
+def get_metrics() -> Response:
+    """Request counters and stage latency histograms in the Prometheus text format."""
+    return Response(content=metrics_registry.render(), media_type=PROMETHEUS_CONTENT_TYPE)
+
+
+@app.get("/stats")
+def get_stats() -> dict:
+    """Runtime statistics of the serving components."""
+    return {
+        "batching": batch_scheduler.get_stats(),
+        "admission": admission_controller.get_stats(),
+        "cache": result_cache.get_stats(),
+        "streams": frame_deduplicator.get_stats(),
+        "quality": quality_controller.get_stats(),
+        "models": model_registry.get_stats(),
+        "startup": startup_tracker.get_stats(),
+        "websocket": dict(websocket_stats),
+    }
 #endregion
 
 
 #region Helper Functions
-def crop_image_by_predict(image: Image.Image, predict: pd.DataFrame, crop_class_name: str) -> Image.Image:
+class DuplexStreamingResponse(StreamingResponse):
+    """StreamingResponse whose body iterator keeps reading the request body.
+
+    ``StreamingResponse`` listens for the client disconnect on the same receive
+    channel, which would steal the request body chunks from ``request.stream()``.
+    Here the disconnect surfaces through ``request.stream()`` itself instead.
+    """
+    async def __call__(self, scope, receive, send) -> None:
+        await self.stream_response(send)
+        if self.background is not None:
+            await self.background()
+
+class InferenceOptions:
+    """Inference parameters of a request, validated against the server limits by ``get_inference_options``."""
+    __slots__ = ("params", "class_filter", "roi", "quality")
+
+    def __init__(self, params: dict, class_filter: Optional[List[str]] = None, roi: Optional[Tuple[float, float, float, float]] = None,
+                 quality: Optional[QualityLevel] = None):
+        self.params = params
+        self.class_filter = class_filter
+        self.roi = roi
+        self.quality = quality
+
+    def set_quality(self, quality: QualityLevel) -> None:
+        """Serve the request at a quality level, its image size caps the requested one."""
+        self.quality = quality
+        if quality.image_size is not None:
+            self.params = {**self.params, "image_size": min(self.params["image_size"], quality.image_size)}
+
+    def get_model(self, model: Optional[str]) -> Optional[str]:
+        """Get the model serving the request, the model of the quality level when none was requested."""
+        if model is None and self.quality is not None:
+            return self.quality.model
+        return model
+
+    def get_render_size(self, max_size: Optional[int]) -> Optional[int]:
+        """Get the longest side of the annotated image, no larger than the model image size on the levels without rendering."""
+        if self.quality is None or self.quality.render:
+            return max_size
+        return min(max_size or self.params["image_size"], self.params["image_size"])
+
+    def get_headers(self) -> dict:
+        """Get the response headers reporting the quality level."""
+        return {"X-Quality-Level": self.quality.name} if self.quality is not None else {}
+
+    def get_fields(self) -> dict:
+        """Get the response fields reporting the quality level."""
+        return {"quality_level": self.quality.name} if self.quality is not None else {}
+
+    def resolve(self, detector: Detector) -> dict:
+        """Get the inference parameters for a model, with the class filter turned into its class ids.
+
+        Args:
+            detector (Detector): The leased model, class names are looked up in its table.
+
+        Returns:
+            dict: Keyword arguments of ``Detector.get_model_batch_predict``.
+
+        Raises:
+            HTTPException: If a class is not one of the model classes.
+        """
+        if not self.class_filter:
+            return self.params
+        names = detector.class_names.tolist()
+        class_ids = set()
+        for item in self.class_filter:
+            if item.isdigit() and int(item) < len(names):
+                class_ids.add(int(item))
+            elif item in names:
+                class_ids.add(names.index(item))
+            else:
+                raise HTTPException(status_code=400, detail=f"Unknown class '{item}'")
+        return {**self.params, "classes": tuple(sorted(class_ids))}
+
+def get_inference_options(
+    conf: Optional[float] = Query(None, ge=INFERENCE_MIN_CONF, le=1.0, description="Confidence threshold"),
+    iou: Optional[float] = Query(None, gt=0.0, lt=1.0, description="IoU threshold of the non-maximum suppression"),
+    imgsz: Optional[int] = Query(None, ge=INFERENCE_MIN_IMAGE_SIZE, le=INFERENCE_MAX_IMAGE_SIZE, description="Model image size, rounded up to a multiple of 32"),
+    max_det: Optional[int] = Query(None, ge=1, le=INFERENCE_MAX_DET, description="Maximum number of detections"),
+    classes: Optional[str] = Query(None, description="Comma separated class names or ids to detect, e.g. person,car"),
+    roi: Optional[str] = Query(None, regex=r"^\d+(\.\d+)?(,\d+(\.\d+)?){3}$", description="Region of interest as xmin,ymin,xmax,ymax in pixels"),
+) -> InferenceOptions:
+    """Request dependency overriding the ``INFERENCE_PARAMS`` within the server limits.
+
+    The parameters are passed down to the model, so unwanted classes are dropped before the NMS
+    and only the region of interest is run through the model. The image size is capped by the
+    quality level once the request is admitted, see ``admit_request``.
+
+    Raises:
+        HTTPException: If the region of interest is empty.
+    """
+    params = dict(INFERENCE_PARAMS)
+    if conf is not None:
+        params["conf"] = conf
+    if iou is not None:
+        params["iou"] = iou
+    if imgsz is not None:
+        params["image_size"] = -(-imgsz // 32) * 32  # the model strides need a multiple of 32
+    if max_det is not None:
+        params["max_det"] = max_det
+    class_filter = [item.strip() for item in classes.split(",") if item.strip()] if classes else None
+    region = None
+    if roi is not None:
+        region = tuple(float(value) for value in roi.split(","))
+        if region[2] <= region[0] or region[3] <= region[1]:
+            raise HTTPException(status_code=400, detail=f"Empty region of interest '{roi}'")
+    return InferenceOptions(params, class_filter, region)
+
+def crop_image_by_predict(image: Image.Image, predict: Detections, crop_class_name: str) -> Image.Image:
     """Crop an image based on a specific object detection.
 
     Args:
         image (Image.Image): The image to be cropped.
-        predict (pd.DataFrame): DataFrame containing object detection predictions.
+        predict (Detections): Object detection predictions.
         crop_class_name (str): Object class name to crop the image by.
 
     Returns:
@@ -100,97 +450,1148 @@ def crop_image_by_predict(image: Image.Image, predict: pd.DataFrame, crop_class_
     Raises:
         HTTPException: If the specified object class is not found in the detections.
     """
-    logger.info("Attempting to crop image for class '%s'.", crop_class_name)
-    crop_predictions = predict[predict['name'] == crop_class_name]
+    logger.debug("Attempting to crop image for class '%s'.", crop_class_name)
+    crop_predictions = predict[predict.names == crop_class_name]
 
-    if crop_predictions.empty:
+    if crop_predictions.is_empty:
         logger.error("Crop class '%s' not found in image", crop_class_name)
         raise HTTPException(status_code=400, detail=f"{crop_class_name} not found in image")
 
     # Select the detection with the highest confidence if multiple are present
-    crop_predictions = crop_predictions.sort_values(by='confidence', ascending=False).iloc[0]
-    crop_bbox = crop_predictions[['xmin', 'ymin', 'xmax', 'ymax']].values
+    crop_bbox = crop_predictions.xyxy[np.argmax(crop_predictions.confidence)].tolist()
     img_cropped = image.crop(crop_bbox)
     
-    logger.info("Image cropped successfully for class '%s'.", crop_class_name)
+    logger.debug("Image cropped successfully for class '%s'.", crop_class_name)
     return img_cropped
+
+@asynccontextmanager
+async def admit_request(options: InferenceOptions) -> AsyncIterator[InferenceOptions]:
+    """Hold an admission slot for a request, then take the quality level serving it.
+
+    The level is only taken once the request is admitted, so the rejected requests
+    are not counted as served by the quality controller.
+
+    Args:
+        options (InferenceOptions): The inference parameters of the request.
+
+    Yields:
+        InferenceOptions: The options, capped by the quality level.
+    """
+    async with admission_controller.admit():
+        options.set_quality(quality_controller.acquire())
+        yield options
+
+async def hold_admission(options: InferenceOptions) -> AsyncExitStack:
+    """Take an admission slot and the quality level for a streaming response.
+
+    The slot is taken before the response starts, so overload is still reported
+    with 503, and released when the returned stack is closed by the stream.
+
+    Args:
+        options (InferenceOptions): The inference parameters of the stream, capped by the quality level.
+
+    Returns:
+        AsyncExitStack: Stack holding the admission slot.
+    """
+    exit_stack = AsyncExitStack()
+    await exit_stack.enter_async_context(admit_request(options))
+    return exit_stack
+
+@asynccontextmanager
+async def lease_model(model: Optional[str]) -> AsyncIterator[Tuple[str, Detector]]:
+    """Lease a served model for the duration of a request, loading it on first use.
+
+    Args:
+        model (str, optional): The requested model name, None for ``DEFAULT_MODEL``.
+
+    Yields:
+        Tuple[str, Detector]: The model name and its detector, never unloaded while leased.
+
+    Raises:
+        HTTPException: If the model is not served.
+    """
+    try:
+        model = model_registry.resolve(model)
+    except KeyError as e:
+        raise HTTPException(status_code=404, detail=e.args[0])
+    detector = await run_in_threadpool(model_registry.acquire, model)
+    try:
+        yield model, detector
+    finally:
+        model_registry.release(model)
+
+async def get_upload_source(fileobj: BinaryIO) -> Union[bytes, BinaryIO]:
+    """Get an uploaded image as input of the decode stage.
+
+    The spooled file itself is decoded in place, unless the decode stage runs in a process
+    pool, which needs the picklable bytes.
+
+    Args:
+        fileobj (BinaryIO): The spooled upload.
+
+    Returns:
+        Union[bytes, BinaryIO]: The file, or its bytes.
+    """
+    if "decode" in STAGE_PROCESS_POOLS:
+        fileobj.seek(0)
+        return await run_in_threadpool(fileobj.read)
+    return fileobj
+
+@asynccontextmanager
+async def spooled_body(request: Request) -> AsyncIterator[BinaryIO]:
+    """Spool a raw request body, in memory up to ``UPLOAD_SPOOL_MAX_MEMORY`` and on disk beyond.
+
+    Args:
+        request (Request): The request with an ``application/octet-stream`` body.
+
+    Yields:
+        BinaryIO: The body, closed when the block exits.
+
+    Raises:
+        HTTPException: If the body is empty.
+    """
+    body = await spool_request_body(request, max_memory_bytes=UPLOAD_SPOOL_MAX_MEMORY)
+    try:
+        if body.seek(0, io.SEEK_END) == 0:
+            raise HTTPException(status_code=400, detail="Empty request body")
+        body.seek(0)
+        yield body
+    finally:
+        body.close()
+
+async def read_tensor_body(request: Request) -> np.ndarray:
+    """Read a frame sent as a .npy file or as a raw pixel buffer, wrapped without decoding or copying it.
+
+    A raw buffer is described by the ``X-Tensor-Shape`` (e.g. ``480,640,3``), ``X-Tensor-Dtype``
+    (``uint8``) and ``X-Tensor-Channels`` (``RGB`` or ``BGR``) headers.
+
+    Args:
+        request (Request): The request with a ``application/x-npy`` or ``application/octet-stream`` body.
+
+    Returns:
+        np.ndarray: The HxWx3 uint8 frame in RGB order, a read-only view of the body.
+
+    Raises:
+        HTTPException: If the body is empty or not an HxWx3 uint8 frame.
+    """
+    body = await request.body()
+    if not body:
+        raise HTTPException(status_code=400, detail="Empty request body")
+    media_type = request.headers.get("content-type", "").split(";")[0].strip().lower()
+    try:
+        return read_frame_tensor(
+            body,
+            media_type,
+            shape=request.headers.get("x-tensor-shape"),
+            dtype=request.headers.get("x-tensor-dtype", "uint8"),
+            channels=request.headers.get("x-tensor-channels", "RGB"),
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+async def decode_for_inference(binary_image: Union[bytes, BinaryIO], target_size: Optional[int] = None, full_size: bool = False) -> Tuple[Image.Image, Tuple[float, float]]:
+    """Decode an image only as large as the model needs it.
+
+    Args:
+        binary_image (Union[bytes, BinaryIO]): The binary representation of the image, or the spooled upload.
+        target_size (int, optional): Smallest longest side to decode to, defaults to the model image size.
+        full_size (bool, optional): Decode at full resolution, e.g. to cut a region of interest. Defaults to False.
+
+    Returns:
+        Tuple[Image.Image, Tuple[float, float]]: The decoded image and the (x, y) factors mapping
+            its coordinates back to the original image, see ``Detections.rescale``.
+    """
+    if full_size or not REDUCED_DECODE:
+        return await stage_executors.run("decode", image_processor.get_image_from_bytes, binary_image), (1.0, 1.0)
+    return await stage_executors.run(
+        "decode", image_processor.get_reduced_image_from_bytes, binary_image, target_size or INFERENCE_PARAMS["image_size"]
+    )
+
+async def iter_uploaded_images(files: List[UploadFile]) -> AsyncIterator[Tuple[str, bytes]]:
+    """Lazily yield the images of a batch upload, expanding zip/tar archives member by member.
+
+    Args:
+        files (List[UploadFile]): Image files or archives of images uploaded by user.
+
+    Yields:
+        Tuple[str, bytes]: The image name and its binary content.
+    """
+    for file in files:
+        if not image_processor.is_archive(file.filename):
+            yield file.filename, await file.read()
+            continue
+        members = image_processor.iter_archive_images(file.file, file.filename)
+        while True:
+            member = await run_in_threadpool(next, members, None)
+            if member is None:
+                break
+            yield member
+
+async def iter_video_frames(capture, stride: int, target_fps: Optional[float]) -> AsyncIterator[Tuple[int, float, Image.Image, Tuple[float, float]]]:
+    """Lazily decode the frames of a video file off the event loop, one frame at a time.
+
+    Args:
+        capture (cv2.VideoCapture): The video, from ``VideoProcessor.open_video``.
+        stride (int): Keep every n-th frame.
+        target_fps (float, optional): Keep frames at about this rate, overrides ``stride``.
+
+    Yields:
+        Tuple[int, float, Image.Image, Tuple[float, float]]: Frame index, timestamp in seconds, the frame
+            and its scale to the original frame.
+    """
+    frames = video_processor.iter_video_frames(capture, stride=stride, target_fps=target_fps)
+    while True:
+        frame = await run_in_threadpool(next, frames, None)
+        if frame is None:
+            break
+        yield (*frame, (1.0, 1.0))
+
+async def iter_mjpeg_frames(request: Request, stride: int, target_fps: Optional[float], full_size: bool, target_size: int) -> AsyncIterator[Tuple[int, float, Image.Image, Tuple[float, float]]]:
+    """Lazily split and decode the JPEG frames of a streamed MJPEG request body.
+
+    Args:
+        request (Request): The request streaming a ``multipart/x-mixed-replace`` or concatenated JPEG body.
+        stride (int): Keep every n-th frame.
+        target_fps (float, optional): Drop frames arriving faster than this rate.
+        full_size (bool): Decode frames at full resolution, needed to annotate them.
+        target_size (int): Smallest longest side of the reduced frames, the model image size.
+
+    Yields:
+        Tuple[int, float, Image.Image, Tuple[float, float]]: Frame index, arrival time in seconds since
+            the first frame, the frame and its scale to the original frame.
+    """
+    parser = MjpegParser(max_frame_bytes=MJPEG_MAX_FRAME_BYTES)
+    frame_index, started_at, last_kept_at = 0, None, None
+    async for chunk in request.stream():
+        for jpeg_bytes in parser.feed(chunk):
+            arrived_at = time.monotonic()
+            started_at = arrived_at if started_at is None else started_at
+            keep = frame_index % stride == 0
+            if target_fps:
+                keep = last_kept_at is None or arrived_at - last_kept_at >= 1.0 / target_fps
+            if keep:
+                last_kept_at = arrived_at
+                if full_size:
+                    input_image, scale = await stage_executors.run("decode", image_processor.get_image_from_bytes, jpeg_bytes), (1.0, 1.0)
+                else:
+                    input_image, scale = await decode_for_inference(jpeg_bytes, target_size=target_size)
+                yield frame_index, arrived_at - started_at, input_image, scale
+            frame_index += 1
+
+async def stream_frame_detections(frames: AsyncIterator[Tuple[int, float, Image.Image, Tuple[float, float]]], detector: Detector, params: dict, output: str, batch_size: int, exit_stack: AsyncExitStack) -> AsyncIterator[bytes]:
+    """Run decoded frames through the detector and stream per-frame results.
+
+    At most ``batch_size`` frames are held at a time, so the pipeline stays bounded.
+
+    Args:
+        frames (AsyncIterator): Frame index, timestamp, frame and scale of every kept frame.
+        detector (Detector): The detector, leased until ``exit_stack`` is closed.
+        params (dict): Inference parameters of ``Detector.get_model_batch_predict``.
+        output (str): ``"ndjson"`` for one JSON line per frame, ``"mjpeg"`` for annotated MJPEG parts.
+        batch_size (int): Number of frames per forward pass.
+        exit_stack (AsyncExitStack): Resources released when the stream ends.
+
+    Yields:
+        bytes: NDJSON lines or MJPEG parts.
+    """
+    async def run_batch(batch: List[Tuple[int, float, Image.Image, Tuple[float, float]]]) -> List[bytes]:
+        predictions = await stage_executors.run(
+            "inference",
+            detector.get_model_batch_predict,
+            [image for _, _, image, _ in batch],
+            **params,
+        )
+        if output == "ndjson":
+            return [
+                prediction.rescale(*scale).to_json_bytes(frame=frame_index, timestamp=round(timestamp, 3)) + b"\n"
+                for (frame_index, timestamp, _, scale), prediction in zip(batch, predictions)
+            ]
+        parts = []
+        for (_, _, image, _), prediction in zip(batch, predictions):
+            annotated_image = await stage_executors.run("render", visualizer.draw_bounding_boxes, image=image, predictions=prediction)
+            image_stream = await stage_executors.run("render", image_processor.get_bytes_from_image, annotated_image)
+            parts.append(video_processor.get_mjpeg_part(image_stream.getvalue(), boundary=MJPEG_BOUNDARY))
+        return parts
+
+    try:
+        batch = []
+        async for frame in frames:
+            batch.append(frame)
+            if len(batch) == batch_size:
+                for part in await run_batch(batch):
+                    yield part
+                batch = []
+        if batch:
+            for part in await run_batch(batch):
+                yield part
+    finally:
+        await exit_stack.aclose()
+
+async def predict_region(input_image: Union[Image.Image, np.ndarray], scale: Tuple[float, float], model: str, params: dict, roi: Optional[Tuple[float, float, float, float]] = None) -> Detections:
+    """Run batched inference on a decoded image, or only on its region of interest.
+
+    Args:
+        input_image (Union[Image.Image, np.ndarray]): The decoded image, or an HxWx3 RGB frame array.
+        scale (Tuple[float, float]): Factors mapping the decoded image to the original image.
+        model (str): The served model to run.
+        params (dict): Inference parameters, see ``InferenceOptions.resolve``.
+        roi (Tuple[float, float, float, float], optional): Region of interest in original image pixels. Defaults to None.
+
+    Returns:
+        Detections: The detections in original image coordinates.
+
+    Raises:
+        HTTPException: If the region of interest is outside the image.
+    """
+    offset = (0, 0)
+    if roi is not None:
+        try:
+            input_image, offset = image_processor.crop_region(input_image, [value / factor for value, factor in zip(roi, scale * 2)])
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+    if isinstance(input_image, np.ndarray):
+        input_image = input_image[..., ::-1]  # ultralytics reads arrays as BGR, the reversed view is not a copy
+    start = time.perf_counter()
+    predictions = await batch_scheduler.submit(input_image, model=model, **params)
+    quality_controller.observe(time.perf_counter() - start)
+    return predictions.translate(*offset).rescale(*scale)
+
+async def detect_objects(binary_image: Union[bytes, BinaryIO], model: Optional[str] = None, options: Optional[InferenceOptions] = None, stream_id: Optional[str] = None) -> Tuple[Detections, bool]:
+    """Run one detection on an upload, served from the result cache when possible.
+
+    Args:
+        binary_image (Union[bytes, BinaryIO]): The uploaded image bytes, or the spooled upload.
+        model (str, optional): The served model to run, None for ``DEFAULT_MODEL``. Defaults to None.
+        options (InferenceOptions, optional): Inference parameters of the request, None for ``INFERENCE_PARAMS``. Defaults to None.
+        stream_id (str, optional): Client or stream the frame belongs to, near duplicates of its last
+            inferred frame reuse the detections of that frame. Defaults to None.
+
+    Returns:
+        Tuple[Detections, bool]: The detections in original image coordinates and whether they were reused from an earlier frame of the stream.
+    """
+    options = options or InferenceOptions(INFERENCE_PARAMS)
+    async with lease_model(options.get_model(model)) as (model, detector):
+        params = options.resolve(detector)
+        if stream_id is not None:
+            # Reuse the detections of the last inferred frame of the stream, skipping decode and inference
+            frame_hash, frame_size = await stage_executors.run("decode", compute_frame_hash, binary_image)
+            stream_key = (model, detector.backend, options.roi, tuple(sorted(params.items())))
+            predictions = frame_deduplicator.lookup(stream_id, frame_hash, frame_size, stream_key)
+            if predictions is not None:
+                logger.debug("Detections reused from the last inferred frame of stream '%s'.", stream_id)
+                return predictions, True
+
+        cache_key = await stage_executors.run("decode", result_cache.make_key, binary_image, model=model, backend=detector.backend, roi=options.roi, **params)
+
+        # Reuse the detections of an identical upload, skipping decode and inference
+        predictions = result_cache.get(cache_key)
+        if predictions is not None:
+            logger.debug("Detections served from cache.")
+        else:
+            # Convert image file to image object, no larger than the model needs unless a region is cut from it
+            input_image, scale = await decode_for_inference(binary_image, target_size=params["image_size"], full_size=options.roi is not None)
+            logger.debug("Image file converted to image object.")
+
+            # Perform detection, boxes are mapped back to the original image
+            with timed_stage("batch_predict"):
+                predictions = await predict_region(input_image, scale, model, params, options.roi)
+            result_cache.put(cache_key, predictions, predictions.nbytes)
+            logger.debug("Model prediction completed for image.")
+
+        if stream_id is not None:
+            frame_deduplicator.update(stream_id, frame_hash, frame_size, stream_key, predictions)
+    return predictions, False
+
+async def detect_and_render(binary_image: Union[bytes, BinaryIO], model: Optional[str] = None, max_size: Optional[int] = None, image_format: str = "JPEG", quality: int = 85, options: Optional[InferenceOptions] = None) -> Tuple[Detections, bytes]:
+    """Run one detection on an upload and render the annotated image from it.
+
+    Detections and encoded images are served from the result cache when possible.
+
+    Args:
+        binary_image (Union[bytes, BinaryIO]): The uploaded image bytes, or the spooled upload.
+        model (str, optional): The served model to run, None for ``DEFAULT_MODEL``. Defaults to None.
+        max_size (int, optional): Render a preview downscaled to this longest side. Defaults to None.
+        image_format (str, optional): Output format, one of ``IMAGE_MEDIA_TYPES``. Defaults to "JPEG".
+        quality (int, optional): Quality of the lossy output formats. Defaults to 85.
+        options (InferenceOptions, optional): Inference parameters of the request, None for ``INFERENCE_PARAMS``. Defaults to None.
+
+    Returns:
+        Tuple[Detections, bytes]: The detections in original image coordinates and the encoded annotated image.
+    """
+    options = options or InferenceOptions(INFERENCE_PARAMS)
+    async with lease_model(options.get_model(model)) as (model, detector):
+        params = options.resolve(detector)
+        cache_key = await stage_executors.run("decode", result_cache.make_key, binary_image, model=model, backend=detector.backend, roi=options.roi, **params)
+        image_kind = f"image@{max_size}:{image_format}:{quality}"
+
+        # Reuse the detections and annotated image of an identical upload, skipping every stage.
+        # The request counts one hit or miss, the one of its detections
+        predictions = result_cache.get(cache_key)
+        encoded_image = result_cache.get(cache_key, kind=image_kind, count=False) if CACHE_STORE_IMAGES and predictions is not None else None
+        if predictions is not None and encoded_image is not None:
+            logger.debug("Detections and annotated image served from cache.")
+            return predictions, encoded_image
+
+        # Load and preprocess image, a preview does not need the full resolution
+        if max_size:
+            input_image, scale = await decode_for_inference(binary_image, target_size=max(max_size, params["image_size"]), full_size=options.roi is not None)
+        else:
+            input_image, scale = await stage_executors.run("decode", image_processor.get_image_from_bytes, binary_image), (1.0, 1.0)
+        logger.debug("Image file converted to image object.")
+
+        # Get predictions from the model, unless an identical upload was already detected
+        if predictions is None:
+            with timed_stage("batch_predict"):
+                predictions = await predict_region(input_image, scale, model, params, options.roi)
+            result_cache.put(cache_key, predictions, predictions.nbytes)
+            logger.debug("Model prediction completed for image.")
+
+        # Draw bounding boxes on the image, boxes are mapped from original to decoded coordinates
+        annotated_image = await stage_executors.run(
+            "render",
+            visualizer.draw_bounding_boxes,
+            image=input_image,
+            predictions=predictions.rescale(1.0 / scale[0], 1.0 / scale[1]),
+            max_size=max_size,
+        )
+        logger.debug("Bounding boxes drawn on image.")
+
+        # Encode the image off the event loop
+        image_stream = await stage_executors.run("render", image_processor.get_bytes_from_image, annotated_image, image_format, quality)
+        encoded_image = image_stream.getvalue()
+        if CACHE_STORE_IMAGES:
+            result_cache.put(cache_key, encoded_image, len(encoded_image), kind=image_kind)
+        return predictions, encoded_image
+
+def build_multipart_body(parts: List[Tuple[str, bytes]]) -> Tuple[bytes, str]:
+    """Build a ``multipart/mixed`` body.
+
+    Args:
+        parts (List[Tuple[str, bytes]]): Media type and content of every part, in order.
+
+    Returns:
+        Tuple[bytes, str]: The body and its content type, boundary included.
+    """
+    boundary = secrets.token_hex(16)
+    body = bytearray()
+    for media_type, content in parts:
+        body += f"--{boundary}\r\nContent-Type: {media_type}\r\nContent-Length: {len(content)}\r\n\r\n".encode("ascii")
+        body += content + b"\r\n"
+    body += f"--{boundary}--\r\n".encode("ascii")
+    return bytes(body), f"multipart/mixed; boundary={boundary}"
+
+def build_zip_body(files: List[Tuple[str, bytes]]) -> bytes:
+    """Build an in-memory zip archive, stored without compression since the images already are compressed.
+
+    Args:
+        files (List[Tuple[str, bytes]]): Name and content of every member, in order.
+
+    Returns:
+        bytes: The zip archive.
+    """
+    archive = io.BytesIO()
+    with zipfile.ZipFile(archive, "w", compression=zipfile.ZIP_STORED) as zip_file:
+        for name, content in files:
+            zip_file.writestr(name, content)
+    return archive.getvalue()
+
+# Query parameter description of the endpoints with near-duplicate frame skipping
+STREAM_ID_DESCRIPTION = "Client or stream id of the frame, near duplicates of its last inferred frame reuse its detections"
+
+# OpenAPI request body of the raw endpoints, which read the request stream instead of a form
+RAW_BODY_OPENAPI = {
+    "requestBody": {
+        "required": True,
+        "content": {"application/octet-stream": {"schema": {"type": "string", "format": "binary"}}},
+    }
+}
+
+# OpenAPI request body of the batch endpoint, which parses its multipart body itself to spool each file early
+BATCH_BODY_OPENAPI = {
+    "requestBody": {
+        "required": True,
+        "content": {
+            "multipart/form-data": {
+                "schema": {
+                    "type": "object",
+                    "properties": {"files": {"type": "array", "items": {"type": "string", "format": "binary"}}},
+                    "required": ["files"],
+                }
+            }
+        },
+    }
+}
+
+# OpenAPI request body of the tensor endpoints, a .npy file or a raw buffer described by headers
+TENSOR_BODY_OPENAPI = {
+    "requestBody": {
+        "required": True,
+        "content": {
+            NPY_MEDIA_TYPE: {"schema": {"type": "string", "format": "binary"}},
+            "application/octet-stream": {"schema": {"type": "string", "format": "binary"}},
+        },
+    },
+    "parameters": [
+        {"name": "X-Tensor-Shape", "in": "header", "required": False, "schema": {"type": "string"}, "description": "Shape of a raw buffer, e.g. 480,640,3"},
+        {"name": "X-Tensor-Dtype", "in": "header", "required": False, "schema": {"type": "string", "default": "uint8"}, "description": "Type of a raw buffer"},
+        {"name": "X-Tensor-Channels", "in": "header", "required": False, "schema": {"type": "string", "default": "RGB"}, "description": "Channel order, RGB or BGR"},
+    ],
+}
+
+async def build_crops_response(predictions: Detections, crops: List[bytes], output: str, image_format: str, options: InferenceOptions) -> Response:
+    """Build the response of the crops endpoints.
+
+    Args:
+        predictions (Detections): The detections the crops were cut from, in crop order.
+        crops (List[bytes]): The encoded crops.
+        output (str): ``zip`` or ``multipart``.
+        image_format (str): Format of the crops, one of ``IMAGE_MEDIA_TYPES``.
+        options (InferenceOptions): Inference parameters of the request.
+
+    Returns:
+        Response: The crops with a ``detections.json`` manifest, see ``/img_object_detection_crops``.
+    """
+    extension = "jpg" if image_format == "JPEG" else image_format.lower()
+    file_names = [f"{index:03d}_{name.replace(' ', '_')}.{extension}" for index, name in enumerate(predictions.names.tolist())]
+    manifest = predictions.to_json_bytes(**options.get_fields(), crops=[
+        {"file": file_name, "box": [round(value, 1) for value in box]}
+        for file_name, box in zip(file_names, predictions.xyxy.tolist())
+    ])
+    logger.debug("Returning %d crops.", len(crops))
+
+    if output == "multipart":
+        media_type = IMAGE_MEDIA_TYPES[image_format]
+        body, content_type = build_multipart_body([("application/json", manifest), *((media_type, crop) for crop in crops)])
+        return Response(content=body, media_type=content_type, headers=options.get_headers())
+    archive = await stage_executors.run("render", build_zip_body, [("detections.json", manifest), *zip(file_names, crops)])
+    return Response(content=archive, media_type="application/zip", headers={"Content-Disposition": 'attachment; filename="crops.zip"', **options.get_headers()})
+
+def get_stream_media_type(output: str) -> str:
+    """Media type of the frame streams produced by ``stream_frame_detections``."""
+    if output == "mjpeg":
+        return f"multipart/x-mixed-replace; boundary={MJPEG_BOUNDARY}"
+    return "application/x-ndjson"
 #endregion
 
 
 #region Main Endpoints
 @app.post("/img_object_detection_to_json")
-async def img_object_detection_to_json(file: UploadFile) -> dict:
+async def img_object_detection_to_json(
+    file: UploadFile,
+    model: Optional[str] = Query(None, description="Name of the served model, defaults to DEFAULT_MODEL"),
+    stream_id: Optional[str] = Query(None, min_length=1, max_length=128, description=STREAM_ID_DESCRIPTION),
+    options: InferenceOptions = Depends(get_inference_options),
+) -> Response:
     """
     Perform object detection on an uploaded image and return JSON with detected objects.
 
     Args:
         file (UploadFile): Image file uploaded by user.
+        model (str, optional): Name of the served model, defaults to ``DEFAULT_MODEL``.
+        stream_id (str, optional): Client or stream of the frame, opts in to the near-duplicate frame skipping.
+        options (InferenceOptions): The conf, iou, imgsz, max_det, classes and roi query parameters.
 
     Returns:
-        dict: JSON response containing detected objects and their confidence scores.
+        Response: JSON response containing detected objects and their confidence scores,
+            with a ``reused`` field when a ``stream_id`` was sent.
     """
     logger.info("Received image file for object detection.")
 
-    # Initialize result dictionary
-    result = {"detect_objects": None, "detect_objects_names": None}
-
-    # Convert image file to image object
-    input_image = image_processor.get_image_from_bytes(await file.read())
-    logger.info("Image file converted to image object.")
-
-    # Perform detection
-    predictions = detector.get_model_predict(
-        input_image=input_image,
-        save=False,
-        image_size=640,
-        conf=0.5,
-        augment=False
-    )
-    logger.info("Model prediction completed for image.")
-
-    # Process detection results
-    detection_results = predictions[['name', 'confidence']]
-    detected_objects = detection_results['name'].tolist()
-    result["detect_objects_names"] = ', '.join(detected_objects)
-    result["detect_objects"] = detection_results.to_dict(orient="records")
+    async with admit_request(options):
+        predictions, reused = await detect_objects(await get_upload_source(file.file), model=model, options=options, stream_id=stream_id)
 
-    # Log results
-    logger.info("Detection results: %s", result)
-    return result
+    # Log results, the names are only listed when debug logging is enabled
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("Detected objects: %s", predictions.names.tolist())
+    extra = {"reused": reused} if stream_id is not None else {}
+    return Response(content=predictions.to_json_bytes(**options.get_fields(), **extra), media_type="application/json", headers=options.get_headers())
 
 @app.post("/img_object_detection_to_img")
-async def img_object_detection_to_img(file: UploadFile) -> StreamingResponse:
+async def img_object_detection_to_img(
+    file: UploadFile,
+    max_size: Optional[int] = Query(None, ge=32, description="Return a preview downscaled to this longest side"),
+    model: Optional[str] = Query(None, description="Name of the served model, defaults to DEFAULT_MODEL"),
+    options: InferenceOptions = Depends(get_inference_options),
+) -> Response:
     """
     Perform object detection on an image and return the image with bounding boxes.
 
     Args:
         file (UploadFile): Image file in bytes format.
+        max_size (int, optional): Return a preview downscaled to this longest side instead of the full-size image.
+        model (str, optional): Name of the served model, defaults to ``DEFAULT_MODEL``.
+        options (InferenceOptions): The conf, iou, imgsz, max_det, classes and roi query parameters.
 
     Returns:
-        StreamingResponse: Image in bytes with bounding boxes drawn.
+        Response: Image in bytes with bounding boxes drawn.
     """
     logger.info("Received image file for object detection with bounding boxes.")
 
-    # Load and preprocess image
-    input_image = image_processor.get_image_from_bytes(await file.read())
-    logger.info("Image file converted to image object.")
-
-    # Get predictions from the model
-    predictions = detector.get_model_predict(
-        input_image=input_image,
-        save=False,
-        image_size=640,
-        conf=0.5,
-        augment=False
+    async with admit_request(options):
+        _, encoded_image = await detect_and_render(await get_upload_source(file.file), model=model, max_size=options.get_render_size(max_size), options=options)
+    logger.debug("Returning image with bounding boxes.")
+    return Response(content=encoded_image, media_type="image/jpeg", headers=options.get_headers())
+
+@app.post("/img_object_detection_to_json_raw", openapi_extra=RAW_BODY_OPENAPI)
+async def img_object_detection_to_json_raw(
+    request: Request,
+    model: Optional[str] = Query(None, description="Name of the served model, defaults to DEFAULT_MODEL"),
+    stream_id: Optional[str] = Query(None, min_length=1, max_length=128, description=STREAM_ID_DESCRIPTION),
+    options: InferenceOptions = Depends(get_inference_options),
+) -> Response:
+    """
+    Perform object detection on an image sent as the raw request body and return JSON with detected objects.
+
+    The ``application/octet-stream`` body skips the multipart parsing of ``/img_object_detection_to_json``.
+
+    Args:
+        request (Request): The request with the image bytes as its body.
+        model (str, optional): Name of the served model, defaults to ``DEFAULT_MODEL``.
+        stream_id (str, optional): Client or stream of the frame, opts in to the near-duplicate frame skipping.
+        options (InferenceOptions): The conf, iou, imgsz, max_det, classes and roi query parameters.
+
+    Returns:
+        Response: The detections of ``/img_object_detection_to_json``.
+    """
+    logger.debug("Received raw image body for object detection.")
+
+    async with spooled_body(request) as body, admit_request(options):
+        predictions, reused = await detect_objects(await get_upload_source(body), model=model, options=options, stream_id=stream_id)
+    extra = {"reused": reused} if stream_id is not None else {}
+    return Response(content=predictions.to_json_bytes(**options.get_fields(), **extra), media_type="application/json", headers=options.get_headers())
+
+@app.post("/img_object_detection_to_img_raw", openapi_extra=RAW_BODY_OPENAPI)
+async def img_object_detection_to_img_raw(
+    request: Request,
+    max_size: Optional[int] = Query(None, ge=32, description="Return a preview downscaled to this longest side"),
+    model: Optional[str] = Query(None, description="Name of the served model, defaults to DEFAULT_MODEL"),
+    options: InferenceOptions = Depends(get_inference_options),
+) -> Response:
+    """
+    Perform object detection on an image sent as the raw request body and return the image with bounding boxes.
+
+    Args:
+        request (Request): The request with the image bytes as its body.
+        max_size (int, optional): Return a preview downscaled to this longest side instead of the full-size image.
+        model (str, optional): Name of the served model, defaults to ``DEFAULT_MODEL``.
+        options (InferenceOptions): The conf, iou, imgsz, max_det, classes and roi query parameters.
+
+    Returns:
+        Response: Image in bytes with bounding boxes drawn.
+    """
+    logger.debug("Received raw image body for object detection with bounding boxes.")
+
+    async with spooled_body(request) as body, admit_request(options):
+        _, encoded_image = await detect_and_render(await get_upload_source(body), model=model, max_size=options.get_render_size(max_size), options=options)
+    return Response(content=encoded_image, media_type="image/jpeg", headers=options.get_headers())
+
+@app.post("/img_object_detection")
+async def img_object_detection(
+    file: UploadFile,
+    response_format: str = Query("multipart", regex="^(multipart|json)$", description="multipart/mixed parts or JSON with a base64 image"),
+    image_format: str = Query("jpeg", regex="(?i)^(jpeg|webp|png)$", description="Format of the annotated image"),
+    quality: int = Query(85, ge=1, le=100, description="Quality of the jpeg and webp images"),
+    max_size: Optional[int] = Query(None, ge=32, description="Downscale the annotated image to this longest side"),
+    model: Optional[str] = Query(None, description="Name of the served model, defaults to DEFAULT_MODEL"),
+    options: InferenceOptions = Depends(get_inference_options),
+) -> Response:
+    """
+    Perform object detection once and return both the detections and the annotated image.
+
+    Args:
+        file (UploadFile): Image file uploaded by user.
+        response_format (str): ``multipart`` returns a ``multipart/mixed`` body with a JSON part and an
+            image part, ``json`` returns the detections with the image base64 encoded under ``image``.
+        image_format (str): Format of the annotated image, jpeg, webp or png.
+        quality (int): Quality of the jpeg and webp images.
+        max_size (int, optional): Downscale the annotated image to this longest side.
+        model (str, optional): Name of the served model, defaults to ``DEFAULT_MODEL``.
+        options (InferenceOptions): The conf, iou, imgsz, max_det, classes and roi query parameters.
+
+    Returns:
+        Response: The detections of ``/img_object_detection_to_json`` and the annotated image.
+    """
+    logger.info("Received image file for combined object detection.")
+    image_format = image_format.upper()
+
+    async with admit_request(options):
+        if options.quality is None or options.quality.render:
+            predictions, encoded_image = await detect_and_render(await get_upload_source(file.file), model=model, max_size=max_size, image_format=image_format, quality=quality, options=options)
+        else:
+            # The quality level skips the annotated image
+            (predictions, _), encoded_image = await detect_objects(await get_upload_source(file.file), model=model, options=options), None
+
+    media_type = IMAGE_MEDIA_TYPES[image_format]
+    if response_format == "json":
+        image = None
+        if encoded_image is not None:
+            image = {"media_type": media_type, "encoding": "base64", "data": base64.b64encode(encoded_image).decode("ascii")}
+        return Response(content=predictions.to_json_bytes(**options.get_fields(), image=image), media_type="application/json", headers=options.get_headers())
+
+    parts = [("application/json", predictions.to_json_bytes(**options.get_fields()))]
+    if encoded_image is not None:
+        parts.append((media_type, encoded_image))
+    body, content_type = build_multipart_body(parts)
+    logger.debug("Returning detections with annotated image.")
+    return Response(content=body, media_type=content_type, headers=options.get_headers())
+
+@app.post("/img_object_detection_crops")
+async def img_object_detection_crops(
+    file: UploadFile,
+    output: str = Query("zip", regex="^(zip|multipart)$", description="zip archive or multipart/mixed parts"),
+    padding: int = Query(0, ge=0, le=256, description="Pixels added around every crop"),
+    max_crops: int = Query(CROPS_MAX_COUNT, ge=1, le=CROPS_MAX_COUNT, description="Return the most confident crops only"),
+    image_format: str = Query("jpeg", regex="(?i)^(jpeg|webp|png)$", description="Format of the crops"),
+    quality: int = Query(85, ge=1, le=100, description="Quality of the jpeg and webp crops"),
+    model: Optional[str] = Query(None, description="Name of the served model, defaults to DEFAULT_MODEL"),
+    options: InferenceOptions = Depends(get_inference_options),
+) -> Response:
+    """
+    Perform object detection once and return the crop of every detected object.
+
+    Args:
+        file (UploadFile): Image file uploaded by user.
+        output (str): ``zip`` returns an archive with a ``detections.json`` manifest and one image per crop,
+            ``multipart`` returns a ``multipart/mixed`` body with the manifest part first.
+        padding (int): Pixels added around every crop, clipped to the image.
+        max_crops (int): Return the most confident crops only.
+        image_format (str): Format of the crops, jpeg, webp or png.
+        quality (int): Quality of the jpeg and webp crops.
+        model (str, optional): Name of the served model, defaults to ``DEFAULT_MODEL``.
+        options (InferenceOptions): The conf, iou, imgsz, max_det, classes and roi query parameters.
+
+    Returns:
+        Response: The crops, with the detections of ``/img_object_detection_to_json`` and the
+            file name and box of every crop under ``crops`` in the manifest.
+    """
+    logger.info("Received image file for object detection crops.")
+    image_format = image_format.upper()
+
+    async with admit_request(options), lease_model(options.get_model(model)) as (model, detector):
+        params = options.resolve(detector)
+        # Crops are cut from the full-resolution image
+        input_image = await stage_executors.run("decode", image_processor.get_image_from_bytes, await get_upload_source(file.file))
+        with timed_stage("batch_predict"):
+            predictions = await predict_region(input_image, (1.0, 1.0), model, params, options.roi)
+        predictions = predictions[np.argsort(-predictions.confidence, kind="stable")[:max_crops]]
+        crops = await stage_executors.run("render", image_processor.get_crops_bytes, input_image, predictions.xyxy.tolist(), padding, image_format, quality)
+
+    return await build_crops_response(predictions, crops, output, image_format, options)
+
+@app.post("/tensor_object_detection_to_json", openapi_extra=TENSOR_BODY_OPENAPI)
+async def tensor_object_detection_to_json(
+    request: Request,
+    model: Optional[str] = Query(None, description="Name of the served model, defaults to DEFAULT_MODEL"),
+    options: InferenceOptions = Depends(get_inference_options),
+) -> Response:
+    """
+    Perform object detection on a decoded frame and return JSON with detected objects.
+
+    The frame is sent as a ``.npy`` file (``application/x-npy``) or as a raw HxWx3 uint8 buffer described
+    by the ``X-Tensor-*`` headers. It is passed to the model as is, without encoding, decoding or copying it.
+
+    Args:
+        request (Request): The request with the frame as its body.
+        model (str, optional): Name of the served model, defaults to ``DEFAULT_MODEL``.
+        options (InferenceOptions): The conf, iou, imgsz, max_det, classes and roi query parameters.
+
+    Returns:
+        Response: The detections of ``/img_object_detection_to_json``, in frame pixels.
+    """
+    logger.debug("Received frame tensor for object detection.")
+
+    async with admit_request(options):
+        frame = await read_tensor_body(request)
+        async with lease_model(options.get_model(model)) as (model, detector):
+            params = options.resolve(detector)
+            with timed_stage("batch_predict"):
+                predictions = await predict_region(frame, (1.0, 1.0), model, params, options.roi)
+    return Response(content=predictions.to_json_bytes(**options.get_fields()), media_type="application/json", headers=options.get_headers())
+
+@app.post("/tensor_object_detection_crops", openapi_extra=TENSOR_BODY_OPENAPI)
+async def tensor_object_detection_crops(
+    request: Request,
+    output: str = Query("zip", regex="^(zip|multipart)$", description="zip archive or multipart/mixed parts"),
+    padding: int = Query(0, ge=0, le=256, description="Pixels added around every crop"),
+    max_crops: int = Query(CROPS_MAX_COUNT, ge=1, le=CROPS_MAX_COUNT, description="Return the most confident crops only"),
+    image_format: str = Query("jpeg", regex="(?i)^(jpeg|webp|png)$", description="Format of the crops"),
+    quality: int = Query(85, ge=1, le=100, description="Quality of the jpeg and webp crops"),
+    model: Optional[str] = Query(None, description="Name of the served model, defaults to DEFAULT_MODEL"),
+    options: InferenceOptions = Depends(get_inference_options),
+) -> Response:
+    """
+    Perform object detection on a decoded frame and return the crop of every detected object.
+
+    The frame is sent as for ``/tensor_object_detection_to_json``, the crops are cut from it as views
+    and only they are encoded.
+
+    Args:
+        request (Request): The request with the frame as its body.
+        output (str): ``zip`` or ``multipart``, see ``/img_object_detection_crops``.
+        padding (int): Pixels added around every crop, clipped to the frame.
+        max_crops (int): Return the most confident crops only.
+        image_format (str): Format of the crops, jpeg, webp or png.
+        quality (int): Quality of the jpeg and webp crops.
+        model (str, optional): Name of the served model, defaults to ``DEFAULT_MODEL``.
+        options (InferenceOptions): The conf, iou, imgsz, max_det, classes and roi query parameters.
+
+    Returns:
+        Response: The crops and manifest of ``/img_object_detection_crops``, boxes in frame pixels.
+    """
+    logger.debug("Received frame tensor for object detection crops.")
+    image_format = image_format.upper()
+
+    async with admit_request(options):
+        frame = await read_tensor_body(request)
+        async with lease_model(options.get_model(model)) as (model, detector):
+            params = options.resolve(detector)
+            with timed_stage("batch_predict"):
+                predictions = await predict_region(frame, (1.0, 1.0), model, params, options.roi)
+        predictions = predictions[np.argsort(-predictions.confidence, kind="stable")[:max_crops]]
+        crops = await stage_executors.run("render", image_processor.get_crops_bytes, frame, predictions.xyxy.tolist(), padding, image_format, quality)
+
+    return await build_crops_response(predictions, crops, output, image_format, options)
+
+@app.post("/img_object_detection_tiled")
+async def img_object_detection_tiled(
+    file: UploadFile,
+    tile_size: int = Query(640, ge=128, le=4096, description="Side of the square tiles, also the model image size"),
+    overlap: float = Query(0.2, ge=0.0, le=0.9, description="Fraction of the tile size shared by neighbouring tiles"),
+    batch_size: int = Query(BATCH_MAX_SIZE, ge=1, le=TILE_MAX_BATCH, description="Tiles per forward pass"),
+    skip_empty: bool = Query(False, description="Skip tiles a low-resolution pre-pass found nothing in"),
+    merge: str = Query("nms", regex="^(nms|fusion)$", description="Merge duplicates across tiles by nms or box fusion"),
+    merge_iou: float = Query(0.5, gt=0.0, lt=1.0, description="IoU above which detections of a class are duplicates"),
+    output: str = Query("json", regex="^(json|image)$", description="json detections or the annotated image"),
+    max_size: Optional[int] = Query(None, ge=32, description="Downscale the annotated image to this longest side"),
+    model: Optional[str] = Query(None, description="Name of the served model, defaults to DEFAULT_MODEL"),
+) -> Response:
+    """
+    Perform object detection on overlapping tiles of a very large image.
+
+    Small objects survive because every tile is run at the tile resolution instead of
+    squashing the whole image to the model image size. Detections of overlapping tiles
+    are shifted to image coordinates and merged across tiles. Under load the quality
+    level caps the model image size of the tiles and the size of the annotated image.
+
+    Args:
+        file (UploadFile): Image file uploaded by user.
+        tile_size (int): Side of the square tiles, also the model image size.
+        overlap (float): Fraction of the tile size shared by neighbouring tiles.
+        batch_size (int): Tiles per forward pass.
+        skip_empty (bool): Skip the tiles a low-resolution pre-pass over the whole image found nothing in.
+        merge (str): ``nms`` keeps the most confident duplicate, ``fusion`` averages the duplicates.
+        merge_iou (float): IoU above which detections of a class are duplicates.
+        output (str): ``json`` returns the detections with the tiling statistics under ``tiling``,
+            ``image`` returns the annotated image.
+        max_size (int, optional): Downscale the annotated image to this longest side.
+        model (str, optional): Name of the served model, defaults to ``DEFAULT_MODEL``.
+
+    Returns:
+        Response: JSON response with the detected objects, or the annotated image.
+    """
+    logger.info("Received image file for tiled object detection.")
+
+    options = InferenceOptions(INFERENCE_PARAMS)
+    async with admit_request(options), lease_model(options.get_model(model)) as (model, detector):
+        # Tiles are cut from the full-resolution image
+        input_image = await stage_executors.run("decode", image_processor.get_image_from_bytes, await get_upload_source(file.file))
+        tile_count = len(get_tile_boxes(input_image.width, input_image.height, tile_size, overlap))
+        if tile_count > TILE_MAX_TILES:
+            raise HTTPException(status_code=400, detail=f"{tile_count} tiles exceed the limit of {TILE_MAX_TILES}, use larger tiles or less overlap")
+
+        # The quality level caps the model image size of the tiles, not the tiles themselves
+        image_size = tile_size if options.quality.image_size is None else min(tile_size, options.quality.image_size)
+        start = time.perf_counter()
+        predictions, tiling = await stage_executors.run(
+            "inference",
+            tiled_detector.predict,
+            detector,
+            input_image,
+            tile_size=tile_size,
+            overlap=overlap,
+            batch_size=batch_size,
+            skip_empty=skip_empty,
+            prepass_conf=min(TILE_PREPASS_CONF, options.params["conf"]),
+            merge=merge,
+            merge_iou=merge_iou,
+            conf=options.params["conf"],
+            augment=options.params["augment"],
+            image_size=image_size,
+        )
+        quality_controller.observe(time.perf_counter() - start)
+        logger.debug("Tiled prediction completed: %s", tiling)
+
+        if output == "json":
+            return Response(content=predictions.to_json_bytes(**options.get_fields(), tiling=tiling), media_type="application/json", headers=options.get_headers())
+
+        annotated_image = await stage_executors.run("render", visualizer.draw_bounding_boxes, image=input_image, predictions=predictions, max_size=options.get_render_size(max_size))
+        image_stream = await stage_executors.run("render", image_processor.get_bytes_from_image, annotated_image)
+    return Response(content=image_stream.getvalue(), media_type="image/jpeg", headers=options.get_headers())
+
+@app.post("/img_object_detection_to_json_batch", openapi_extra=BATCH_BODY_OPENAPI)
+async def img_object_detection_to_json_batch(
+    request: Request,
+    model: Optional[str] = Query(None, description="Name of the served model, defaults to DEFAULT_MODEL"),
+) -> StreamingResponse:
+    """
+    Perform object detection on many images and stream one NDJSON line per image.
+
+    Images are decoded as they are consumed and run through the model in batches
+    of ``BATCH_MAX_SIZE``, so memory stays flat regardless of the batch size. The
+    ``files`` of the multipart body, images or zip/tar archives of images, are kept
+    in memory up to ``UPLOAD_BATCH_SPOOL_MAX_MEMORY`` each and on disk beyond.
+
+    Args:
+        request (Request): Multipart request with the uploaded ``files``.
+        model (str, optional): Name of the served model, defaults to ``DEFAULT_MODEL``.
+
+    Returns:
+        StreamingResponse: NDJSON stream, one line per image with the fields of
+            ``/img_object_detection_to_json`` plus its ``index`` and ``filename``.
+    """
+    try:
+        with timed_stage("request_parse"):
+            files = await parse_multipart_files(request, "files", max_memory_bytes=UPLOAD_BATCH_SPOOL_MAX_MEMORY)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if not files:
+        raise HTTPException(status_code=400, detail="No files uploaded")
+    logger.info("Received %d files for batch object detection.", len(files))
+
+    # Take the admission slot and the model before streaming starts, so errors are still reported
+    options = InferenceOptions(INFERENCE_PARAMS)
+    try:
+        exit_stack = await hold_admission(options)
+    except BaseException:
+        for file in files:
+            file.file.close()
+        raise
+    for file in files:
+        exit_stack.callback(file.file.close)
+    try:
+        model, detector = await exit_stack.enter_async_context(lease_model(options.get_model(model)))
+    except Exception:
+        await exit_stack.aclose()
+        raise
+
+    async def run_batch(batch: List[Tuple[int, str, Image.Image, Tuple[float, float]]]) -> List[bytes]:
+        predictions = await stage_executors.run(
+            "inference",
+            detector.get_model_batch_predict,
+            [image for _, _, image, _ in batch],
+            **options.params,
+        )
+        return [
+            prediction.rescale(*scale).to_json_bytes(index=index, filename=filename) + b"\n"
+            for (index, filename, _, scale), prediction in zip(batch, predictions)
+        ]
+
+    async def stream_results() -> AsyncIterator[bytes]:
+        try:
+            batch = []
+            index = 0
+            async for filename, binary_image in iter_uploaded_images(files):
+                try:
+                    input_image, scale = await decode_for_inference(binary_image, target_size=options.params["image_size"])
+                except Exception as e:
+                    yield json.dumps({"index": index, "filename": filename, "error": str(e)}).encode() + b"\n"
+                    index += 1
+                    continue
+                batch.append((index, filename, input_image, scale))
+                index += 1
+                if len(batch) == BATCH_MAX_SIZE:
+                    for line in await run_batch(batch):
+                        yield line
+                    batch = []
+            if batch:
+                for line in await run_batch(batch):
+                    yield line
+            logger.info("Batch object detection completed for %d images.", index)
+        finally:
+            await exit_stack.aclose()
+
+    return StreamingResponse(stream_results(), media_type="application/x-ndjson", headers=options.get_headers())
+
+@app.post("/video_object_detection")
+async def video_object_detection(
+    file: UploadFile,
+    output: str = Query("ndjson", regex="^(ndjson|mjpeg)$", description="ndjson detections or annotated mjpeg"),
+    stride: int = Query(1, ge=1, description="Run detection on every n-th frame"),
+    target_fps: Optional[float] = Query(None, gt=0, description="Run detection at about this frame rate, overrides stride"),
+    model: Optional[str] = Query(None, description="Name of the served model, defaults to DEFAULT_MODEL"),
+) -> StreamingResponse:
+    """
+    Perform object detection on the frames of an uploaded video.
+
+    Frames are decoded lazily and run through the model in batches of ``BATCH_MAX_SIZE``,
+    so a long video never sits fully in memory.
+
+    Args:
+        file (UploadFile): Video file uploaded by user.
+        output (str): ``ndjson`` streams one JSON line per frame, ``mjpeg`` streams annotated frames.
+        stride (int): Run detection on every n-th frame.
+        target_fps (float, optional): Run detection at about this frame rate.
+        model (str, optional): Name of the served model, defaults to ``DEFAULT_MODEL``.
+
+    Returns:
+        StreamingResponse: NDJSON lines with the fields of ``/img_object_detection_to_json`` plus
+            ``frame`` and ``timestamp``, or a ``multipart/x-mixed-replace`` MJPEG stream.
+    """
+    logger.info("Received video file for object detection.")
+
+    options = InferenceOptions(INFERENCE_PARAMS)
+    exit_stack = await hold_admission(options)
+    try:
+        model, detector = await exit_stack.enter_async_context(lease_model(options.get_model(model)))
+        suffix = os.path.splitext(file.filename or "")[1]
+        video_path = await run_in_threadpool(video_processor.spool_to_file, file.file, suffix)
+        exit_stack.callback(video_processor.remove_file, video_path)
+        # Open the video now, once the response starts an unreadable video can not be a 400 anymore
+        try:
+            capture = await run_in_threadpool(video_processor.open_video, video_path)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        exit_stack.callback(capture.release)  # the frames generator may never run
+    except Exception:
+        await exit_stack.aclose()
+        raise
+
+    frames = iter_video_frames(capture, stride=stride, target_fps=target_fps)
+    return StreamingResponse(
+        stream_frame_detections(frames, detector, options.params, output=output, batch_size=BATCH_MAX_SIZE, exit_stack=exit_stack),
+        media_type=get_stream_media_type(output),
+        headers=options.get_headers(),
     )
-    logger.info("Model prediction completed for image.")
 
-    # Draw bounding boxes on the image
-    annotated_image = visualizer.draw_bounding_boxes(image=input_image, predictions=predictions)
-    logger.info("Bounding boxes drawn on image.")
+@app.post("/mjpeg_object_detection")
+async def mjpeg_object_detection(
+    request: Request,
+    output: str = Query("ndjson", regex="^(ndjson|mjpeg)$", description="ndjson detections or annotated mjpeg"),
+    stride: int = Query(1, ge=1, description="Run detection on every n-th frame"),
+    target_fps: Optional[float] = Query(None, gt=0, description="Drop frames arriving faster than this rate"),
+    model: Optional[str] = Query(None, description="Name of the served model, defaults to DEFAULT_MODEL"),
+) -> DuplexStreamingResponse:
+    """
+    Perform object detection on a streamed MJPEG request body.
+
+    The body is a ``multipart/x-mixed-replace`` stream (or concatenated JPEGs). Frames are
+    detected one by one as they arrive, so results flow back while the upload continues.
+
+    Args:
+        request (Request): The request streaming the MJPEG body.
+        output (str): ``ndjson`` streams one JSON line per frame, ``mjpeg`` streams annotated frames.
+        stride (int): Run detection on every n-th frame.
+        target_fps (float, optional): Drop frames arriving faster than this rate.
+        model (str, optional): Name of the served model, defaults to ``DEFAULT_MODEL``.
+
+    Returns:
+        DuplexStreamingResponse: NDJSON lines with the fields of ``/img_object_detection_to_json`` plus
+            ``frame`` and ``timestamp``, or a ``multipart/x-mixed-replace`` MJPEG stream.
+    """
+    logger.info("Received MJPEG stream for object detection.")
+
+    options = InferenceOptions(INFERENCE_PARAMS)
+    exit_stack = await hold_admission(options)
+    try:
+        model, detector = await exit_stack.enter_async_context(lease_model(options.get_model(model)))
+    except Exception:
+        await exit_stack.aclose()
+        raise
+    frames = iter_mjpeg_frames(request, stride=stride, target_fps=target_fps, full_size=output == "mjpeg", target_size=options.params["image_size"])
+    return DuplexStreamingResponse(
+        stream_frame_detections(frames, detector, options.params, output=output, batch_size=1, exit_stack=exit_stack),
+        media_type=get_stream_media_type(output),
+        headers=options.get_headers(),
+    )
+
+@app.websocket("/ws/object_detection")
+async def ws_object_detection(websocket: WebSocket, model: Optional[str] = None) -> None:
+    """
+    Real-time object detection over a WebSocket.
+
+    Clients push images as binary messages and receive one JSON text message per
+    processed frame. Frames arriving while the previous one is still in inference
+    replace the pending frame instead of queuing, so results never lag behind a backlog.
+    Every frame takes an admission slot, a frame rejected under overload gets an error message.
+
+    Args:
+        websocket (WebSocket): The client connection.
+        model (str, optional): Name of the served model, defaults to ``DEFAULT_MODEL``.
+    """
+    if model is not None and model not in model_registry:
+        await websocket.close(code=1008, reason=f"Unknown model '{model}'")
+        return
+    await websocket.accept()
+    logger.info("WebSocket connection opened for object detection.")
+    websocket_stats["connections"] += 1
+    websocket_stats["active_connections"] += 1
+
+    mailbox = LatestFrameMailbox()
+    latency_total, latency_max, processed = 0.0, 0.0, 0
+
+    async def receive_frames() -> None:
+        """Put every received binary frame in the mailbox until the client goes away."""
+        try:
+            while True:
+                message = await websocket.receive()
+                if message["type"] == "websocket.disconnect":
+                    break
+                if message.get("bytes"):
+                    mailbox.put((mailbox.received, time.monotonic(), message["bytes"]))
+        finally:
+            mailbox.close()
+
+    receiver = asyncio.create_task(receive_frames())
+    exit_stack = AsyncExitStack()
+    try:
+        # Keep the requested model loaded for the connection, the frames lease the model of their quality level
+        await exit_stack.enter_async_context(lease_model(model))
+        while True:
+            frame = await mailbox.get()
+            if frame is None:
+                break
+            frame_index, received_at, binary_image = frame
+            options = InferenceOptions(INFERENCE_PARAMS)
+            try:
+                async with admit_request(options), lease_model(options.get_model(model)) as (frame_model, _):
+                    input_image, scale = await decode_for_inference(binary_image, target_size=options.params["image_size"])
+                    predictions = (await batch_scheduler.submit(input_image, model=frame_model, **options.params)).rescale(*scale)
+            except Exception as e:
+                await websocket.send_text(json.dumps({"frame": frame_index, "error": str(e)}))
+                continue
 
-    # Stream the response
-    image_stream = image_processor.get_bytes_from_image(annotated_image)
-    logger.info("Returning image with bounding boxes.")
-    return StreamingResponse(image_stream, media_type="image/jpeg")
+            latency = time.monotonic() - received_at
+            processed += 1
+            latency_total += latency
+            latency_max = max(latency_max, latency)
+            message = predictions.to_json_bytes(
+                frame=frame_index,
+                **options.get_fields(),
+                latency_ms=round(latency * 1000.0, 2),
+                stats={
+                    "received": mailbox.received,
+                    "processed": processed,
+                    "dropped": mailbox.dropped,
+                    "latency_ms_mean": round(latency_total / processed * 1000.0, 2),
+                    "latency_ms_max": round(latency_max * 1000.0, 2),
+                },
+            )
+            await websocket.send_text(message.decode("utf-8"))
+    except Exception as e:
+        # A client going away is normal, whether the send raised WebSocketDisconnect or a server error
+        if isinstance(e, WebSocketDisconnect) or websocket.client_state == WebSocketState.DISCONNECTED:
+            logger.info("WebSocket client disconnected during object detection.")
+        else:
+            logger.error("WebSocket object detection failed: %s", e)
+    finally:
+        receiver.cancel()
+        await exit_stack.aclose()
+        websocket_stats["active_connections"] -= 1
+        websocket_stats["frames_received"] += mailbox.received
+        websocket_stats["frames_processed"] += processed
+        websocket_stats["frames_dropped"] += mailbox.dropped
+        logger.info(
+            "WebSocket connection closed: %d frames received, %d processed, %d dropped, mean latency %.2f ms.",
+            mailbox.received, processed, mailbox.dropped, latency_total / processed * 1000.0 if processed else 0.0,
+        )
 #endregion
\ No newline at end of file
@@ -0,0 +1,8 @@
+"""
+benchmarks package
+This package contains the stage benchmarks and the in-process
+load test of the service, run with a deterministic stub detector.
+"""
+from .stub_detector import StubDetector, StubModel
+
+__all__ = ("StubDetector", "StubModel")
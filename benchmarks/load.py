@@ -0,0 +1,173 @@
+""" benchmarks/load.py
+Load Generator, it is used to drive the FastAPI application
+in-process at fixed concurrency levels and report its latency.
+
+Copyright 2026 ktun@
+
+CREATED: 2026-10-17 21:16:52
+MODIFIED: 2026-10-17 23:47:52
+"""
+# -*- coding:utf-8 -*-
+# import the necessary libraries
+import io
+import time
+import httpx
+import asyncio
+import itertools
+import numpy as np
+#
+from PIL import Image
+from functools import partial
+from typing import Dict, List, Sequence
+from utils import get_logger
+from utils.image_processor import with_jpeg_comment
+from benchmarks.stub_detector import StubDetector
+
+
+# Setup logger
+logger = get_logger(__name__)
+
+# Benchmarked endpoints by name, with the way the image is sent: a multipart upload, the raw
+# JPEG body, or the decoded pixels as a .npy body
+ENDPOINTS = {
+    "json": ("/img_object_detection_to_json", "multipart"),
+    "image": ("/img_object_detection_to_img", "multipart"),
+    "combined": ("/img_object_detection", "multipart"),
+    "json_raw": ("/img_object_detection_to_json_raw", "raw"),
+    "tensor": ("/tensor_object_detection_to_json", "npy"),
+}
+# Ids of the unique uploads, shared by every level and endpoint so no upload is ever sent twice
+UPLOAD_IDS = itertools.count()
+
+def build_request(image_bytes: bytes, body: str, index: int, unique: bool = True) -> dict:
+    """
+    Build the keyword arguments of a benchmark request.
+
+    Args:
+        image_bytes (bytes): The JPEG, or the .npy file of its pixels for the ``npy`` body.
+        body (str): How the image is sent, ``multipart``, ``raw`` or ``npy``.
+        index (int): Id of the upload, makes the JPEG uploads unique.
+        unique (bool, optional): Make every JPEG upload unique, the tensor endpoints have no result cache. Defaults to True.
+
+    Returns:
+        dict: The ``files`` or ``content`` and ``headers`` of ``httpx.AsyncClient.post``.
+    """
+    if body == "npy":
+        return {"content": image_bytes, "headers": {"Content-Type": "application/x-npy"}}
+    upload = with_jpeg_comment(image_bytes, f"bench-{index}") if unique else image_bytes
+    if body == "raw":
+        return {"content": upload, "headers": {"Content-Type": "application/octet-stream"}}
+    return {"files": {"file": ("image.jpg", upload, "image/jpeg")}}
+
+def to_npy_bytes(image_bytes: bytes) -> bytes:
+    """Decode a JPEG and save its RGB pixels as a .npy file, the body of the tensor endpoints."""
+    stream = io.BytesIO()
+    np.save(stream, np.asarray(Image.open(io.BytesIO(image_bytes)).convert("RGB")))
+    return stream.getvalue()
+
+def summarize_latencies(latencies: Sequence[float], elapsed: float, errors: int) -> Dict[str, float]:
+    """
+    Summarize the latencies of a load level.
+
+    Args:
+        latencies (Sequence[float]): Latencies of the successful requests in seconds.
+        elapsed (float): Wall time of the level in seconds.
+        errors (int): Failed requests.
+
+    Returns:
+        Dict[str, float]: Request counts, throughput in requests per second and the mean, p50, p95 and p99 latency in milliseconds.
+    """
+    latencies_ms = np.asarray(latencies) * 1000.0
+    report = {"requests": len(latencies_ms), "errors": errors, "throughput_rps": round(len(latencies_ms) / elapsed, 2) if elapsed > 0 else 0.0}
+    for name, value in (("mean_ms", np.mean), ("p50_ms", 50), ("p95_ms", 95), ("p99_ms", 99)):
+        if not len(latencies_ms):
+            report[name] = None
+        elif callable(value):
+            report[name] = round(float(value(latencies_ms)), 2)
+        else:
+            report[name] = round(float(np.percentile(latencies_ms, value)), 2)
+    return report
+
+async def run_level(client: httpx.AsyncClient, path: str, image_bytes: bytes, concurrency: int, requests: int, unique: bool = True,
+                    body: str = "multipart") -> Dict[str, float]:
+    """
+    Send a fixed number of requests with a fixed number of concurrent clients.
+
+    Args:
+        client (httpx.AsyncClient): Client bound to the application.
+        path (str): The endpoint path.
+        image_bytes (bytes): The uploaded JPEG, or the .npy file of the ``npy`` body.
+        concurrency (int): Concurrent clients.
+        requests (int): Requests of the level, shared by the clients.
+        unique (bool, optional): Make every upload unique, so the result cache never answers. Defaults to True.
+        body (str, optional): How the image is sent, see ``build_request``. Defaults to "multipart".
+
+    Returns:
+        Dict[str, float]: The level report, see ``summarize_latencies``, with the status code counts.
+    """
+    sequence = itertools.count()
+    latencies: List[float] = []
+    status_codes: Dict[int, int] = {}
+
+    async def client_loop() -> None:
+        while next(sequence) < requests:
+            request = build_request(image_bytes, body, next(UPLOAD_IDS), unique)
+            started = time.perf_counter()
+            response = await client.post(path, **request)
+            elapsed = time.perf_counter() - started
+            status_codes[response.status_code] = status_codes.get(response.status_code, 0) + 1
+            if response.status_code == 200:
+                latencies.append(elapsed)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(client_loop() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    report = summarize_latencies(latencies, elapsed, requests - len(latencies))
+    report["status_codes"] = {str(code): count for code, count in sorted(status_codes.items())}
+    return report
+
+async def run_load(image_bytes: bytes, endpoints: Sequence[str] = ("json",), concurrency_levels: Sequence[int] = (1, 4, 16),
+                   requests: int = 200, stub_latency_ms: float = 20.0, stub_per_image_ms: float = 5.0, unique: bool = True) -> Dict[str, Dict[str, dict]]:
+    """
+    Drive the application in-process with the stub detector at every concurrency level.
+
+    The application runs its startup and shutdown hooks as under a server, so the batch
+    scheduler, the stage pools and the admission control take part in the measurement.
+
+    Args:
+        image_bytes (bytes): The uploaded JPEG.
+        endpoints (Sequence[str], optional): Names of the ``ENDPOINTS`` to drive. Defaults to ("json",).
+        concurrency_levels (Sequence[int], optional): Concurrent clients of every level. Defaults to (1, 4, 16).
+        requests (int, optional): Requests per level. Defaults to 200.
+        stub_latency_ms (float, optional): Fixed forward pass cost of the stub model. Defaults to 20.
+        stub_per_image_ms (float, optional): Per image forward pass cost of the stub model. Defaults to 5.
+        unique (bool, optional): Make every upload unique. Defaults to True.
+
+    Returns:
+        Dict[str, Dict[str, dict]]: The level reports by endpoint name and concurrency.
+    """
+    import app as service  # imported here, the benchmark swaps its detector before startup
+
+    service.model_registry.detector_factory = partial(StubDetector, latency_ms=stub_latency_ms, per_image_ms=stub_per_image_ms)
+    await service.app.router.startup()
+    try:
+        await service.app.state.model_loading
+        if not service.startup_tracker.ready:
+            raise RuntimeError(f"Service startup failed: {service.startup_tracker.get_stats()['error']}")
+
+        reports: Dict[str, Dict[str, dict]] = {}
+        npy_bytes = to_npy_bytes(image_bytes) if any(ENDPOINTS[endpoint][1] == "npy" for endpoint in endpoints) else None
+        async with httpx.AsyncClient(app=service.app, base_url="http://benchmark", timeout=None) as client:
+            for endpoint in endpoints:
+                path, body = ENDPOINTS[endpoint]
+                payload = npy_bytes if body == "npy" else image_bytes
+                await run_level(client, path, payload, 1, 3, unique, body)  # warm up the pools and the drawing caches
+                reports[endpoint] = {}
+                for concurrency in concurrency_levels:
+                    report = await run_level(client, path, payload, concurrency, requests, unique, body)
+                    reports[endpoint][str(concurrency)] = report
+                    logger.info("Load %s x%d: %.2f req/s, p50 %s ms, p95 %s ms, p99 %s ms, %d errors", endpoint, concurrency,
+                                report["throughput_rps"], report["p50_ms"], report["p95_ms"], report["p99_ms"], report["errors"])
+        return reports
+    finally:
+        await service.app.router.shutdown()
@@ -0,0 +1,121 @@
+""" benchmarks/run.py
+Benchmark Runner, it is used to run the stage benchmarks and the
+load test, write their results and compare them with a baseline.
+
+Usage:
+    python -m benchmarks.run --output ./benchmarks/results.json
+    python -m benchmarks.run --baseline ./benchmarks/baseline.json --tolerance 0.1
+
+Copyright 2026 ktun@
+
+CREATED: 2026-10-17 21:25:18
+MODIFIED: 2026-10-17 21:25:18
+"""
+# -*- coding:utf-8 -*-
+# import the necessary libraries
+import sys
+import json
+import time
+import asyncio
+import argparse
+import platform
+#
+from typing import Iterator, List, Optional, Tuple
+from utils import get_logger
+from benchmarks.load import ENDPOINTS, run_load
+from benchmarks.stages import run_stage_benchmarks
+
+
+# Setup logger
+logger = get_logger(__name__)
+
+# Compared metrics and whether a higher value is better
+COMPARED_METRICS = {"p50_ms": False, "p95_ms": False, "p99_ms": False, "throughput_rps": True}
+
+def iter_metrics(results: dict) -> Iterator[Tuple[str, float, bool]]:
+    """Flatten the compared metrics of a run as (name, value, higher is better) tuples."""
+    for stage, report in results.get("stages", {}).items():
+        for metric in ("p50_ms", "p95_ms"):
+            yield f"stages.{stage}.{metric}", report.get(metric), COMPARED_METRICS[metric]
+    for endpoint, levels in results.get("load", {}).items():
+        for concurrency, report in levels.items():
+            for metric, higher_is_better in COMPARED_METRICS.items():
+                yield f"load.{endpoint}.c{concurrency}.{metric}", report.get(metric), higher_is_better
+
+def compare_results(results: dict, baseline: dict, tolerance: float = 0.1, min_change_ms: float = 0.1) -> List[dict]:
+    """
+    Compare a run with a baseline run, metric by metric.
+
+    Args:
+        results (dict): The current run.
+        baseline (dict): The baseline run, metrics missing from either run are skipped.
+        tolerance (float, optional): Relative change counted as a regression. Defaults to 0.1.
+        min_change_ms (float, optional): Latency changes below it are noise, never regressions. Defaults to 0.1.
+
+    Returns:
+        List[dict]: The metric, baseline and current values, relative change and whether it regressed.
+    """
+    baseline_values = {name: value for name, value, _ in iter_metrics(baseline)}
+    comparisons = []
+    for name, value, higher_is_better in iter_metrics(results):
+        base = baseline_values.get(name)
+        if value is None or not base:
+            continue
+        change = (value - base) / base
+        regressed = change < -tolerance if higher_is_better else change > tolerance and value - base > min_change_ms
+        comparisons.append({"metric": name, "baseline": base, "current": value, "change": round(change, 4), "regressed": regressed})
+    return comparisons
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """Command line entry point of the benchmarks, returns 1 when a metric regressed against the baseline."""
+    parser = argparse.ArgumentParser(description="Benchmark the pipeline stages and the service under load with a stub detector.")
+    parser.add_argument("--image", default="./data/test_image.jpg", help="Benchmark image")
+    parser.add_argument("--skip-stages", action="store_true", help="Skip the stage benchmarks")
+    parser.add_argument("--skip-load", action="store_true", help="Skip the load test")
+    parser.add_argument("--runs", type=int, default=50, help="Timed calls per stage")
+    parser.add_argument("--endpoints", nargs="+", default=["json", "image"], choices=list(ENDPOINTS), help="Endpoints of the load test")
+    parser.add_argument("--concurrency", nargs="+", type=int, default=[1, 4, 16], help="Concurrency levels of the load test")
+    parser.add_argument("--requests", type=int, default=200, help="Requests per concurrency level")
+    parser.add_argument("--stub-latency-ms", type=float, default=20.0, help="Fixed forward pass cost of the stub model")
+    parser.add_argument("--stub-per-image-ms", type=float, default=5.0, help="Per image forward pass cost of the stub model")
+    parser.add_argument("--output", default="./benchmarks/results.json", help="Write the results to this JSON file")
+    parser.add_argument("--baseline", default=None, help="Compare the results with this earlier results file")
+    parser.add_argument("--tolerance", type=float, default=0.1, help="Relative change counted as a regression")
+    parser.add_argument("--min-change-ms", type=float, default=0.1, help="Latency changes below it are never regressions")
+    args = parser.parse_args(argv)
+
+    with open(args.image, "rb") as image_file:
+        image_bytes = image_file.read()
+
+    results = {
+        "created_at": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "machine": {"python": platform.python_version(), "platform": platform.platform(), "processor": platform.processor()},
+        "config": {key: value for key, value in vars(args).items() if key not in ("output", "baseline")},
+    }
+    if not args.skip_stages:
+        results["stages"] = run_stage_benchmarks(image_bytes, runs=args.runs)
+    if not args.skip_load:
+        results["load"] = asyncio.run(run_load(
+            image_bytes, endpoints=args.endpoints, concurrency_levels=args.concurrency, requests=args.requests,
+            stub_latency_ms=args.stub_latency_ms, stub_per_image_ms=args.stub_per_image_ms,
+        ))
+
+    exit_code = 0
+    if args.baseline:
+        with open(args.baseline) as baseline_file:
+            comparisons = compare_results(results, json.load(baseline_file), args.tolerance, args.min_change_ms)
+        results["comparison"] = comparisons
+        print(f"{'metric':<58} {'baseline':>10} {'current':>10} {'change':>8}")
+        for comparison in comparisons:
+            flag = "  REGRESSED" if comparison["regressed"] else ""
+            print(f"{comparison['metric']:<58} {comparison['baseline']:>10} {comparison['current']:>10} {comparison['change']:>+8.1%}{flag}")
+        exit_code = int(any(comparison["regressed"] for comparison in comparisons))
+
+    with open(args.output, "w") as results_file:
+        json.dump(results, results_file, indent=2)
+    logger.info("Benchmark results written to '%s'.", args.output)
+    return exit_code
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,105 @@
+""" benchmarks/stages.py
+Stage Benchmarks, it is used to time every pipeline stage
+of the service in isolation on the same image.
+
+Copyright 2026 ktun@
+
+CREATED: 2026-10-17 21:09:30
+MODIFIED: 2026-10-17 23:02:51
+"""
+# -*- coding:utf-8 -*-
+# import the necessary libraries
+import io
+import time
+import numpy as np
+#
+from typing import Callable, Dict
+from utils import DataProcessor, ImageProcessor, Visualizer, get_logger
+from utils.tensor_input import NPY_MEDIA_TYPE, read_frame_tensor
+from benchmarks.stub_detector import StubModel
+
+
+# Setup logger
+logger = get_logger(__name__)
+
+def time_function(function: Callable[[], object], runs: int = 50, warmup: int = 5) -> Dict[str, float]:
+    """
+    Time repeated calls of a function.
+
+    Args:
+        function (Callable[[], object]): The function to time, called without arguments.
+        runs (int, optional): Timed calls. Defaults to 50.
+        warmup (int, optional): Untimed calls before the timed ones. Defaults to 5.
+
+    Returns:
+        Dict[str, float]: Number of runs and the mean, min, p50, p95 and p99 latency in milliseconds.
+    """
+    for _ in range(warmup):
+        function()
+    latencies = np.empty(runs)
+    for run in range(runs):
+        started = time.perf_counter()
+        function()
+        latencies[run] = time.perf_counter() - started
+    latencies *= 1000.0
+    return {
+        "runs": runs,
+        "mean_ms": round(float(latencies.mean()), 3),
+        "min_ms": round(float(latencies.min()), 3),
+        "p50_ms": round(float(np.percentile(latencies, 50)), 3),
+        "p95_ms": round(float(np.percentile(latencies, 95)), 3),
+        "p99_ms": round(float(np.percentile(latencies, 99)), 3),
+    }
+
+def run_stage_benchmarks(image_bytes: bytes, image_size: int = 640, runs: int = 50, warmup: int = 5) -> Dict[str, Dict[str, float]]:
+    """
+    Time the decode, conversion, drawing and encoding stages on one image.
+
+    The conversion stages convert the deterministic results of the ``StubModel``, so no weights are needed.
+    The tensor stages read the decoded pixels of the image as the tensor endpoints receive them, a .npy
+    file or a raw buffer, to compare with the JPEG decode.
+
+    Args:
+        image_bytes (bytes): The encoded image.
+        image_size (int, optional): Target size of the reduced decode. Defaults to 640.
+        runs (int, optional): Timed calls per stage. Defaults to 50.
+        warmup (int, optional): Untimed calls per stage. Defaults to 5.
+
+    Returns:
+        Dict[str, Dict[str, float]]: The timings of every stage, see ``time_function``.
+    """
+    image_processor = ImageProcessor()
+    data_processor = DataProcessor("cpu")
+    visualizer = Visualizer()
+    model = StubModel(latency_ms=0.0, per_image_ms=0.0)
+    class_names = data_processor.build_class_names(model.names)
+
+    image = image_processor.get_image_from_bytes(image_bytes)
+    results = model.predict(image, conf=0.25)
+    detections = data_processor.transform_predict_to_detections(results, class_names)
+    annotated_image = visualizer.draw_bounding_boxes(image, detections)
+    pixels = np.asarray(image)
+    npy_stream = io.BytesIO()
+    np.save(npy_stream, pixels)
+    npy_bytes, raw_bytes, shape = npy_stream.getvalue(), pixels.tobytes(), ",".join(map(str, pixels.shape))
+
+    stages = {
+        "get_image_from_bytes": lambda: image_processor.get_image_from_bytes(image_bytes),
+        "get_reduced_image_from_bytes": lambda: image_processor.get_reduced_image_from_bytes(image_bytes, image_size),
+        "read_frame_tensor_npy": lambda: read_frame_tensor(npy_bytes, NPY_MEDIA_TYPE),
+        "read_frame_tensor_raw": lambda: read_frame_tensor(raw_bytes, "application/octet-stream", shape=shape),
+        "transform_predict_to_detections": lambda: data_processor.transform_predict_to_detections(results, class_names),
+        "transform_predict_to_df": lambda: data_processor.transform_predict_to_df(results, model.names),
+        "detections_to_json_bytes": lambda: detections.to_json_bytes(),
+        "draw_bounding_boxes": lambda: visualizer.draw_bounding_boxes(image, detections),
+        "get_bytes_from_image": lambda: image_processor.get_bytes_from_image(annotated_image),
+    }
+    reports = {}
+    for stage, function in stages.items():
+        try:
+            reports[stage] = time_function(function, runs=runs, warmup=warmup)
+        except ImportError as e:  # pandas is optional
+            logger.warning("Stage %s skipped: %s", stage, e)
+            continue
+        logger.info("Stage %s: p50 %.3f ms, p95 %.3f ms", stage, reports[stage]["p50_ms"], reports[stage]["p95_ms"])
+    return reports
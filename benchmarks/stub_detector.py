@@ -0,0 +1,130 @@
+""" benchmarks/stub_detector.py
+Stub Detector, it is used to benchmark the service without
+weights or a GPU, with deterministic detections and latency.
+
+Copyright 2026 ktun@
+
+CREATED: 2026-10-17 21:04:12
+MODIFIED: 2026-10-17 23:02:51
+"""
+# -*- coding:utf-8 -*-
+# import the necessary libraries
+import time
+import zlib
+import numpy as np
+#
+from PIL import Image
+from typing import List, Optional, Sequence, Union
+from utils import DataProcessor, get_logger
+from model.detector import Detector
+
+
+# Setup logger
+logger = get_logger(__name__)
+
+# Class names of the stub model, a subset of the COCO names
+STUB_CLASS_NAMES = {0: "person", 1: "bicycle", 2: "car", 3: "motorcycle", 5: "bus", 7: "truck", 15: "cat", 16: "dog"}
+
+
+class _StubTensor:
+    """The part of the ``torch.Tensor`` interface the data processor uses."""
+
+    def __init__(self, array: np.ndarray):
+        self._array = array
+
+    def cpu(self) -> "_StubTensor":
+        return self
+
+    def numpy(self) -> np.ndarray:
+        return self._array
+
+
+class _StubBoxes:
+    def __init__(self, data: np.ndarray):
+        self.data = _StubTensor(data)
+
+
+class _StubResult:
+    """An ultralytics ``Results`` with its boxes and phase timings."""
+
+    def __init__(self, data: np.ndarray, speed: dict):
+        self.boxes = _StubBoxes(data)
+        self.speed = speed
+
+
+class StubModel:
+    def __init__(self, max_objects: int = 20, latency_ms: float = 20.0, per_image_ms: float = 5.0, seed: int = 0):
+        """
+        Initialize the StubModel class, standing for an ultralytics ``YOLO`` model.
+
+        Args:
+            max_objects (int, optional): Most objects found in an image. Defaults to 20.
+            latency_ms (float, optional): Fixed cost of a forward pass. Defaults to 20.
+            per_image_ms (float, optional): Added cost of every image of a batch. Defaults to 5.
+            seed (int, optional): Seed of the detections. Defaults to 0.
+        """
+        self.names = dict(STUB_CLASS_NAMES)
+        self.max_objects = max_objects
+        self.latency_ms = latency_ms
+        self.per_image_ms = per_image_ms
+        self.seed = seed
+        self._class_ids = np.array(sorted(self.names), dtype=np.float32)
+
+    def _detect(self, image: Union[Image.Image, np.ndarray], conf: float, max_det: int, classes: Optional[Sequence[int]]) -> np.ndarray:
+        """Detections of an image as (N, 6) rows, the same for every image of the same size and mode, arrays count as RGB images."""
+        if isinstance(image, np.ndarray):
+            (height, width), mode = image.shape[:2], "RGB"
+        else:
+            (width, height), mode = image.size, image.mode
+        rng = np.random.default_rng(zlib.crc32(f"{self.seed}:{width}x{height}:{mode}".encode()))
+        count = int(rng.integers(0, self.max_objects + 1))
+        corners = rng.random((count, 2)) * [width, height]
+        sizes = (0.05 + 0.3 * rng.random((count, 2))) * [width, height]
+        data = np.empty((count, 6), dtype=np.float32)
+        data[:, :2] = corners
+        data[:, 2:4] = np.minimum(corners + sizes, [width, height])
+        data[:, 4] = rng.random(count)
+        data[:, 5] = rng.choice(self._class_ids, count)
+        keep = data[:, 4] >= conf
+        if classes is not None:
+            keep &= np.isin(data[:, 5], classes)
+        data = data[keep]
+        return data[np.argsort(-data[:, 4], kind="stable")[:max_det]]
+
+    def predict(self, source: Union[Image.Image, np.ndarray, Sequence[Union[Image.Image, np.ndarray]]], conf: float = 0.25, max_det: int = 300,
+                classes: Optional[Sequence[int]] = None, **kwargs) -> List[_StubResult]:
+        """Detect the objects of an image or a batch, sleeping like a forward pass without holding the GIL."""
+        images = list(source) if isinstance(source, (list, tuple)) else [source]
+        inference_ms = self.latency_ms + self.per_image_ms * len(images)
+        time.sleep(inference_ms / 1000.0)
+        speed = {"preprocess": 0.0, "inference": inference_ms / len(images), "postprocess": 0.0}
+        return [_StubResult(self._detect(image, conf, max_det, classes), speed) for image in images]
+
+
+class StubDetector(Detector):
+    def __init__(self, model_path: str = "stub", device: str = "cpu", backend: str = "stub",
+                 latency_ms: float = 20.0, per_image_ms: float = 5.0, max_objects: int = 20, seed: int = 0, **kwargs):
+        """
+        Initialize the StubDetector class, a ``Detector`` serving a ``StubModel``.
+
+        Only the model is replaced, the prediction, timing and conversion code of the detector
+        runs as in production. Accepts and ignores the other ``Detector`` arguments, so it can
+        stand for it in a ``ModelRegistry``.
+
+        Args:
+            model_path (str, optional): Reported model path. Defaults to "stub".
+            device (str, optional): Device of the data processor. Defaults to "cpu".
+            backend (str, optional): Reported backend. Defaults to "stub".
+            latency_ms (float, optional): Fixed cost of a forward pass. Defaults to 20.
+            per_image_ms (float, optional): Added cost of every image of a batch. Defaults to 5.
+            max_objects (int, optional): Most objects found in an image. Defaults to 20.
+            seed (int, optional): Seed of the detections. Defaults to 0.
+        """
+        self.model_path = model_path
+        self.device = device
+        self.backend = backend
+        self.fixed_image_size = None
+        self.model = StubModel(max_objects=max_objects, latency_ms=latency_ms, per_image_ms=per_image_ms, seed=seed)
+        self.data_processor = DataProcessor(device)
+        self.class_names = self.data_processor.build_class_names(self.model.names)
+        logger.info("StubDetector initialized with %.1f ms + %.1f ms per image latency . . .", latency_ms, per_image_ms)
@@ -4,5 +4,9 @@ This package contains implementation of
 detector model.
 """
 from .detector import Detector
+from .batcher import BatchScheduler
+from .backends import ModelExporter
+from .tiler import TiledDetector
+from .registry import ModelRegistry
 
-__all__ = ("Detector")
\ No newline at end of file
+__all__ = ("Detector", "BatchScheduler", "ModelExporter", "TiledDetector", "ModelRegistry")
\ No newline at end of file
@@ -0,0 +1,220 @@
+""" model/backends.py
+Backends, it is used to export the detector weights to faster
+CPU inference backends and to compare the backends.
+
+Usage:
+    python -m model.backends --weights ./weights/yolo11s.pt --images ./data/test_image.jpg
+
+Copyright 2026 ktun@
+
+CREATED: 2026-10-17 14:52:37
+MODIFIED: 2026-10-17 14:52:37
+"""
+# -*- coding:utf-8 -*-
+# import the necessary libraries
+import os
+import json
+import time
+import shutil
+import hashlib
+import argparse
+import numpy as np
+#
+from typing import List, Optional
+from utils import get_logger
+
+
+# Setup logger
+logger = get_logger(__name__)
+
+# Backends and the ultralytics export format producing them
+BACKEND_FORMATS = {"onnx": "onnx", "openvino": "openvino", "torchscript": "torchscript"}
+# Backends exported with dynamic shapes, the other ones only serve their export image size
+DYNAMIC_BACKENDS = ("onnx", "openvino")
+# Backend served by the plain .pt weights
+DEFAULT_BACKEND = "pytorch"
+BACKENDS = (DEFAULT_BACKEND,) + tuple(BACKEND_FORMATS)
+
+def hash_weights(weights_path: str, chunk_size: int = 1024 * 1024) -> str:
+    """
+    Hash the weights file, exported artifacts are keyed by it.
+
+    Args:
+        weights_path (str): Path of the .pt weights.
+        chunk_size (int, optional): Read size. Defaults to 1 MiB.
+
+    Returns:
+        str: First 16 hex digits of the SHA-256 of the file.
+    """
+    digest = hashlib.sha256()
+    with open(weights_path, "rb") as weights_file:
+        for chunk in iter(lambda: weights_file.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()[:16]
+
+
+class ModelExporter:
+    def __init__(self, cache_dir: str = "./weights/exported"):
+        """
+        Initialize the ModelExporter class.
+
+        Args:
+            cache_dir (str, optional): Directory of the exported artifacts. Defaults to "./weights/exported".
+        """
+        self.cache_dir = cache_dir
+        logger.info("ModelExporter initialized with cache directory '%s' . . .", cache_dir)
+
+    def get_artifact_path(self, weights_path: str, backend: str, imgsz: int, batch: int) -> str:
+        """
+        Get the path the artifact of an export is cached at.
+
+        Args:
+            weights_path (str): Path of the .pt weights.
+            backend (str): One of ``BACKEND_FORMATS``.
+            imgsz (int): Export image size.
+            batch (int): Export batch size.
+
+        Returns:
+            str: Path of the exported model file or directory.
+        """
+        key = f"{hash_weights(weights_path)}_{backend}_{imgsz}_b{batch}"
+        export_dir = os.path.join(self.cache_dir, key)
+        if backend == "openvino":
+            return os.path.join(export_dir, "model_openvino_model")
+        return os.path.join(export_dir, f"model.{BACKEND_FORMATS[backend]}")
+
+    def export(self, weights_path: str, backend: str, imgsz: int = 640, batch: int = 1) -> str:
+        """
+        Export the weights to a backend once, reusing the cached artifact afterwards.
+
+        Args:
+            weights_path (str): Path of the .pt weights.
+            backend (str): One of ``BACKEND_FORMATS``.
+            imgsz (int, optional): Export image size. Defaults to 640.
+            batch (int, optional): Export batch size. Defaults to 1.
+
+        Returns:
+            str: Path of the exported model, loadable with ``YOLO(path, task="detect")``.
+
+        Raises:
+            ValueError: If the backend is not supported.
+            RuntimeError: If the export fails, e.g. because the backend package is missing.
+        """
+        if backend not in BACKEND_FORMATS:
+            raise ValueError(f"Unsupported backend '{backend}', expected one of {sorted(BACKEND_FORMATS)}")
+
+        artifact_path = self.get_artifact_path(weights_path, backend, imgsz, batch)
+        if os.path.exists(artifact_path):
+            logger.info("Reusing cached %s export '%s'.", backend, artifact_path)
+            return artifact_path
+
+        from ultralytics import YOLO  # imported lazily, only needed to export
+
+        # Export from a copy inside the cache entry, ultralytics writes next to the weights
+        export_dir = os.path.dirname(artifact_path)
+        os.makedirs(export_dir, exist_ok=True)
+        staged_weights = os.path.join(export_dir, "model.pt")
+        shutil.copyfile(weights_path, staged_weights)
+        try:
+            logger.info("Exporting '%s' to %s (imgsz %d, batch %d) . . .", weights_path, backend, imgsz, batch)
+            started = time.perf_counter()
+            exported_path = YOLO(staged_weights).export(
+                format=BACKEND_FORMATS[backend],
+                imgsz=imgsz,
+                batch=batch,
+                dynamic=backend in DYNAMIC_BACKENDS,
+                device="cpu",
+            )
+            if not exported_path or not os.path.exists(artifact_path):
+                raise RuntimeError(f"{backend} export produced '{exported_path}' instead of '{artifact_path}'")
+            logger.info("Exported to '%s' in %.1f s.", artifact_path, time.perf_counter() - started)
+            return artifact_path
+        except Exception as e:
+            shutil.rmtree(export_dir, ignore_errors=True)
+            raise RuntimeError(f"{backend} export failed: {e}") from e
+        finally:
+            if os.path.exists(staged_weights):
+                os.remove(staged_weights)
+
+
+def compare_backends(weights_path: str, image_paths: List[str], backends: List[str], imgsz: int = 640, batch: int = 1, runs: int = 20, warmup: int = 3, cache_dir: Optional[str] = None) -> List[dict]:
+    """
+    Measure latency and throughput of every backend on the same images.
+
+    Args:
+        weights_path (str): Path of the .pt weights.
+        image_paths (List[str]): Images of the benchmark, cycled to fill the batches.
+        backends (List[str]): Backends to compare.
+        imgsz (int, optional): Inference and export image size. Defaults to 640.
+        batch (int, optional): Images per forward pass. Defaults to 1.
+        runs (int, optional): Timed forward passes per backend. Defaults to 20.
+        warmup (int, optional): Untimed forward passes per backend. Defaults to 3.
+        cache_dir (str, optional): Directory of the exported artifacts. Defaults to the Detector default.
+
+    Returns:
+        List[dict]: One report per backend, with the backend actually served after fallbacks.
+    """
+    from PIL import Image
+    from model.detector import Detector  # imported lazily, the detector imports this module
+
+    images = [Image.open(path).convert("RGB") for path in image_paths]
+    images = [images[i % len(images)] for i in range(batch)]
+    reports = []
+    for backend in backends:
+        options = {"export_dir": cache_dir} if cache_dir else {}
+        started = time.perf_counter()
+        detector = Detector(model_path=weights_path, device="cpu", backend=backend, export_imgsz=imgsz, export_batch=batch, **options)
+        load_seconds = time.perf_counter() - started
+
+        for _ in range(warmup):
+            detector.get_model_batch_predict(images, image_size=imgsz)
+        latencies = []
+        for _ in range(runs):
+            started = time.perf_counter()
+            detector.get_model_batch_predict(images, image_size=imgsz)
+            latencies.append(time.perf_counter() - started)
+
+        latencies_ms = np.array(latencies) * 1000.0
+        reports.append({
+            "backend": backend,
+            "served_backend": detector.backend,
+            "load_seconds": round(load_seconds, 3),
+            "batch": batch,
+            "latency_ms_mean": round(float(latencies_ms.mean()), 2),
+            "latency_ms_p50": round(float(np.percentile(latencies_ms, 50)), 2),
+            "latency_ms_p95": round(float(np.percentile(latencies_ms, 95)), 2),
+            "throughput_img_s": round(batch * runs / float(np.sum(latencies)), 2),
+        })
+        logger.info("Backend %s: %s", backend, reports[-1])
+    return reports
+
+
+def main() -> None:
+    """Command line entry point of the backend comparison."""
+    parser = argparse.ArgumentParser(description="Compare the latency and throughput of the detector backends.")
+    parser.add_argument("--weights", default="./weights/yolo11s.pt", help="Path of the .pt weights")
+    parser.add_argument("--images", nargs="+", default=["./data/test_image.jpg"], help="Benchmark images")
+    parser.add_argument("--backends", nargs="+", default=list(BACKENDS), choices=BACKENDS, help="Backends to compare")
+    parser.add_argument("--imgsz", type=int, default=640, help="Inference and export image size")
+    parser.add_argument("--batch", type=int, default=1, help="Images per forward pass")
+    parser.add_argument("--runs", type=int, default=20, help="Timed forward passes per backend")
+    parser.add_argument("--warmup", type=int, default=3, help="Untimed forward passes per backend")
+    parser.add_argument("--cache-dir", default=None, help="Directory of the exported artifacts")
+    parser.add_argument("--output", default=None, help="Write the reports to this JSON file")
+    args = parser.parse_args()
+
+    reports = compare_backends(
+        args.weights, args.images, args.backends,
+        imgsz=args.imgsz, batch=args.batch, runs=args.runs, warmup=args.warmup, cache_dir=args.cache_dir,
+    )
+    print(f"{'backend':<12} {'served':<12} {'mean ms':>9} {'p50 ms':>9} {'p95 ms':>9} {'img/s':>9}")
+    for report in reports:
+        print(f"{report['backend']:<12} {report['served_backend']:<12} {report['latency_ms_mean']:>9.2f} "
+              f"{report['latency_ms_p50']:>9.2f} {report['latency_ms_p95']:>9.2f} {report['throughput_img_s']:>9.2f}")
+    if args.output:
+        with open(args.output, "w") as report_file:
+            json.dump(reports, report_file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,196 @@
+""" model/batcher.py
+Batch Scheduler, it is used to gather concurrent detection
+requests into batched model predictions.
+
+Copyright 2026 ktun@
+
+CREATED: 2026-10-17 09:12:41
+MODIFIED: 2026-10-17 23:34:27
+"""
+# -*- coding:utf-8 -*-
+# import the necessary libraries
+import asyncio
+import functools
+import threading
+#
+from collections import Counter
+from typing import Any, Callable, Dict, List, Optional
+from concurrent.futures import Executor
+from utils import get_logger
+
+
+# Setup logger
+logger = get_logger(__name__)
+
+class _PendingRequest:
+    """A single image waiting in the batching queue."""
+    __slots__ = ("image", "params", "future", "enqueued_at")
+
+    def __init__(self, image, params: dict, future: asyncio.Future, enqueued_at: float):
+        self.image = image
+        self.params = params
+        self.future = future
+        self.enqueued_at = enqueued_at
+
+
+class BatchScheduler:
+    def __init__(self, predict_fn: Callable[..., List[Any]], max_batch_size: int = 8, max_wait_ms: float = 10.0, executor: Optional[Executor] = None):
+        """
+        Initialize the BatchScheduler class.
+
+        Args:
+            predict_fn (Callable): Blocking batch predict function, called as ``predict_fn(images, **params)``
+                and returning one result per image (e.g. ``Detector.get_model_batch_predict``).
+            max_batch_size (int, optional): Maximum number of images per forward pass. Defaults to 8.
+            max_wait_ms (float, optional): Maximum time the first image of a batch waits for others. Defaults to 10.0.
+            executor (Executor, optional): Executor running ``predict_fn``, None uses the loop default. Defaults to None.
+        """
+        if max_batch_size < 1:
+            raise ValueError("max_batch_size must be >= 1")
+        self.predict_fn = predict_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max(max_wait_ms, 0.0) / 1000.0
+        self.executor = executor
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+        self._batch: List[_PendingRequest] = []  # requests taken off the queue and not answered yet
+        # Statistics are read from other threads (stats endpoint), so guard them
+        self._stats_lock = threading.Lock()
+        self._batch_sizes = Counter()
+        self._batches = 0
+        self._images = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+        logger.info("BatchScheduler initialized with max batch size %d and max wait %.1f ms . . .", max_batch_size, max_wait_ms)
+
+    @property
+    def queue_depth(self) -> int:
+        """Number of images currently waiting to be batched."""
+        return self._queue.qsize() if self._queue is not None else 0
+
+    async def start(self) -> None:
+        """Start the background batching worker on the running event loop."""
+        if self._worker is not None and not self._worker.done():
+            return
+        self._queue = asyncio.Queue()
+        self._worker = asyncio.get_running_loop().create_task(self._run())
+        logger.info("BatchScheduler worker started.")
+
+    async def stop(self) -> None:
+        """Stop the batching worker and fail every request still waiting in the queue or in the batch being predicted."""
+        if self._worker is None:
+            return
+        self._worker.cancel()
+        try:
+            await self._worker
+        except asyncio.CancelledError:
+            pass
+        self._worker = None
+        # A prediction still running in the executor finishes on its own, but its results are never delivered
+        pending_requests, self._batch = self._batch, []
+        while not self._queue.empty():
+            pending_requests.append(self._queue.get_nowait())
+        for pending in pending_requests:
+            if not pending.future.done():
+                pending.future.set_exception(RuntimeError("BatchScheduler stopped"))
+        logger.info("BatchScheduler worker stopped.")
+
+    async def submit(self, image, **params) -> Any:
+        """
+        Queue an image for batched prediction and wait for its own result.
+
+        Args:
+            image: The image to run the prediction on.
+            **params: Inference parameters forwarded to ``predict_fn``. Only requests
+                with identical parameters are batched together.
+
+        Returns:
+            Any: The prediction result of ``predict_fn`` for this image.
+        """
+        if self._worker is None:
+            await self.start()
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        await self._queue.put(_PendingRequest(image, params, future, loop.time()))
+        return await future
+
+    async def _collect(self) -> List[_PendingRequest]:
+        """Wait for the first request, then gather more until the batch is full or the wait expires."""
+        loop = asyncio.get_running_loop()
+        # Gather into self._batch so a stop while collecting still fails the dequeued requests
+        batch = self._batch = [await self._queue.get()]
+        deadline = batch[0].enqueued_at + self.max_wait
+        while len(batch) < self.max_batch_size:
+            # Drain whatever is already queued without yielding to the loop
+            if not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+                continue
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout=remaining))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self) -> None:
+        """Batching worker loop."""
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await self._collect()
+            dispatched_at = loop.time()
+
+            # Group by inference parameters, images with different settings can not share a pass
+            groups: Dict[tuple, List[_PendingRequest]] = {}
+            for pending in batch:
+                if pending.future.done():  # the caller went away while waiting
+                    continue
+                groups.setdefault(tuple(sorted(pending.params.items())), []).append(pending)
+
+            for group in groups.values():
+                self._record(group, dispatched_at)
+                call = functools.partial(self.predict_fn, [pending.image for pending in group], **group[0].params)
+                try:
+                    results = await loop.run_in_executor(self.executor, call)
+                except Exception as e:
+                    logger.error("Batched prediction of %d images failed: %s", len(group), e)
+                    for pending in group:
+                        if not pending.future.done():
+                            pending.future.set_exception(e)
+                    continue
+                for pending, result in zip(group, results):
+                    if not pending.future.done():
+                        pending.future.set_result(result)
+            self._batch = []
+
+    def _record(self, group: List[_PendingRequest], dispatched_at: float) -> None:
+        """Record the batch size and queue wait of a dispatched batch."""
+        waits = [dispatched_at - pending.enqueued_at for pending in group]
+        with self._stats_lock:
+            self._batches += 1
+            self._images += len(group)
+            self._batch_sizes[len(group)] += 1
+            self._wait_total += sum(waits)
+            self._wait_max = max(self._wait_max, max(waits))
+        logger.debug("Dispatching batch of %d images, max queue wait %.2f ms", len(group), max(waits) * 1000.0)
+
+    def get_stats(self) -> dict:
+        """
+        Get the batch sizes and queue waits achieved so far.
+
+        Returns:
+            dict: Batch counters, the batch size histogram and queue wait summary in milliseconds.
+        """
+        with self._stats_lock:
+            return {
+                "max_batch_size": self.max_batch_size,
+                "max_wait_ms": self.max_wait * 1000.0,
+                "batches": self._batches,
+                "images": self._images,
+                "mean_batch_size": self._images / self._batches if self._batches else 0.0,
+                "batch_size_histogram": dict(sorted(self._batch_sizes.items())),
+                "mean_queue_wait_ms": self._wait_total / self._images * 1000.0 if self._images else 0.0,
+                "max_queue_wait_ms": self._wait_max * 1000.0,
+                "queue_depth": self.queue_depth,
+            }
@@ -4,31 +4,49 @@ Detector, it is used to run ultralytics-yolo detector
 Copyright 2024 ktun@
 
 CREATED: 2024-11-12 00:11:57
-MODIFIED: 2024-11-13 17:47:19
+MODIFIED: 2026-10-17 23:02:51
 """
 # -*- coding:utf-8 -*-
 # import the necessary libraries
-import io
-import pandas as pd
 import numpy as np
 #
 from PIL import Image
-from typing import Optional
-from ultralytics import YOLO
-from utils import DataProcessor, get_logger
+from typing import TYPE_CHECKING, List, Optional, Sequence, Union
+from utils import DataProcessor, Detections, get_logger, timed_stage
+from utils.metrics import DETECTIONS_PER_IMAGE, observe_stage
+from model.backends import DEFAULT_BACKEND, DYNAMIC_BACKENDS, ModelExporter
+
+if TYPE_CHECKING:  # ultralytics pulls in torch, it is imported when the first model is loaded
+    from ultralytics import YOLO
 
 
 # Setup logger
 logger = get_logger(__name__)
 
 class Detector:
-    def __init__(self, model_path, device):
-        """Initialize the DataProcessor class. """
+    def __init__(self, model_path, device, backend: str = DEFAULT_BACKEND, export_imgsz: int = 640, export_batch: int = 1, export_dir: str = "./weights/exported"):
+        """Initialize the Detector class.
+
+        Args:
+            model_path (str): Path of the .pt weights.
+            device (str): Device the predictions are transferred to.
+            backend (str, optional): Inference backend, "pytorch", "onnx", "openvino" or "torchscript".
+                Non-pytorch backends are exported once and cached, falling back to pytorch on failure. Defaults to "pytorch".
+            export_imgsz (int, optional): Image size of the exported model. Defaults to 640.
+            export_batch (int, optional): Batch size of the exported model. Defaults to 1.
+            export_dir (str, optional): Directory of the exported artifacts. Defaults to "./weights/exported".
+        """
         self.model_path = model_path
         self.device = device
+        self.backend = backend
+        self.export_imgsz = export_imgsz
+        self.export_batch = export_batch
+        self.export_dir = export_dir
+        self.fixed_image_size = None  # set when the backend only serves its export image size
         self.data_processor = None
         self.model = None
-        logger.debug(f"Initializing detector with model path: {self.model_path} and device: {self.device}")
+        self.class_names = None
+        logger.debug(f"Initializing detector with model path: {self.model_path}, device: {self.device} and backend: {self.backend}")
         #
         self.__init_resource()
         
@@ -37,53 +55,144 @@ class Detector:
         try:
             logger.info("Initializing resources for the detector . . .")
             # Initializing the model
-            self.model = YOLO(self.model_path)
-            logger.info(f"Model loaded successfully from {self.model_path}.")
+            self.model = self.__load_model()
+            logger.info(f"Model loaded successfully from {self.model_path} with {self.backend} backend.")
             
             # Initializing the data processor
             self.data_processor = DataProcessor(self.device)
             logger.info(f"DataProcessor initialized for device: {self.device}.")
             
+            # Precompute the class-id to class-name table used by every Detections
+            self.class_names = self.data_processor.build_class_names(self.model.names)
+            
         except Exception as e:
             logger.error(f"Error initializing resources: {e}")
             raise
 
-    def get_model_predict(self, input_image: Image, save: bool = False, image_size: int = 1248, conf: float = 0.5, augment: bool = False) -> pd.DataFrame:
+    def __load_model(self) -> "YOLO":
+        """Load the model on the configured backend, falling back to pytorch when the export is not available """
+        from ultralytics import YOLO
+
+        if self.backend != DEFAULT_BACKEND:
+            try:
+                exporter = ModelExporter(cache_dir=self.export_dir)
+                artifact_path = exporter.export(self.model_path, self.backend, imgsz=self.export_imgsz, batch=self.export_batch)
+                model = YOLO(artifact_path, task="detect")
+                if self.backend not in DYNAMIC_BACKENDS:
+                    self.fixed_image_size = self.export_imgsz
+                return model
+            except Exception as e:
+                logger.warning(f"{self.backend} backend unavailable, falling back to {DEFAULT_BACKEND}: {e}")
+                self.backend = DEFAULT_BACKEND
+        return YOLO(self.model_path)
+
+    def __record_speed(self, predictions: list) -> None:
+        """Record the pre-process, inference and NMS time ultralytics measured for every image """
+        for result in predictions:
+            for phase, milliseconds in (result.speed or {}).items():
+                if milliseconds is not None:
+                    observe_stage(f"model_{phase}", milliseconds / 1000.0)
+
+    def get_model_predict(self, input_image: Union[Image.Image, np.ndarray], save: bool = False, image_size: int = 1248, conf: float = 0.5, augment: bool = False,
+                          iou: float = 0.7, max_det: int = 300, classes: Optional[Sequence[int]] = None) -> Detections:
         """
         Get the predictions of a model on an input image.
         
         Args:
-            input_image (Image): The image on which the model will make predictions.
+            input_image (Union[Image, np.ndarray]): The image on which the model will make predictions,
+                a PIL image or an HxWx3 uint8 array in BGR order, e.g. a channel-reversed view of an RGB frame.
             save (bool, optional): Whether to save the image with the predictions. Defaults to False.
             image_size (int, optional): The size of the image the model will receive. Defaults to 1248.
             conf (float, optional): The confidence threshold for the predictions. Defaults to 0.5.
             augment (bool, optional): Whether to apply data augmentation on the input image. Defaults to False.
+            iou (float, optional): IoU threshold of the non-maximum suppression. Defaults to 0.7.
+            max_det (int, optional): Maximum number of detections per image. Defaults to 300.
+            classes (Sequence[int], optional): Class ids to keep, the other classes are dropped before the NMS. Defaults to None.
         
         Returns:
-            pd.DataFrame: A DataFrame containing the predictions.
+            Detections: The predicted boxes, confidence scores and class ids.
         """
         try:
-            logger.info(f"Making predictions on image with size: {input_image.size}, confidence threshold: {conf}")
+            logger.debug("Making predictions on image with size: %s, confidence threshold: %s",
+                         input_image.shape if isinstance(input_image, np.ndarray) else input_image.size, conf)
             
             # Make predictions
-            predictions = self.model.predict(
-                imgsz=image_size,
-                source=input_image,
-                conf=conf,
-                save=save,
-                augment=augment,
-                flipud=0.0,
-                fliplr=0.0,
-                mosaic=0.0,
-            )
-            logger.info("Predictions made successfully.")
+            with timed_stage("predict"):
+                predictions = self.model.predict(
+                    imgsz=self.fixed_image_size or image_size,
+                    source=input_image,
+                    conf=conf,
+                    save=save,
+                    augment=augment,
+                    iou=iou,
+                    max_det=max_det,
+                    classes=list(classes) if classes is not None else None,
+                    flipud=0.0,
+                    fliplr=0.0,
+                    mosaic=0.0,
+                )
+            self.__record_speed(predictions)
+            logger.debug("Predictions made successfully.")
+            
+            # Transform predictions to array-backed detections
+            with timed_stage("transform"):
+                detections = self.data_processor.transform_predict_to_detections(predictions, self.class_names)
+            DETECTIONS_PER_IMAGE.observe(len(detections))
+            logger.debug("Predictions converted to detections with %d entries.", len(detections))
+            
+            return detections
+        
+        except Exception as e:
+            logger.error("Error making predictions: %s", e)
+            raise
+
+    def get_model_batch_predict(self, input_images: List[Union[Image.Image, np.ndarray]], save: bool = False, image_size: int = 1248, conf: float = 0.5, augment: bool = False,
+                                iou: float = 0.7, max_det: int = 300, classes: Optional[Sequence[int]] = None) -> List[Detections]:
+        """
+        Get the predictions of a model on a batch of input images with a single forward pass.
+        
+        Args:
+            input_images (List[Union[Image, np.ndarray]]): The images on which the model will make predictions,
+                PIL images or HxWx3 uint8 arrays in BGR order.
+            save (bool, optional): Whether to save the images with the predictions. Defaults to False.
+            image_size (int, optional): The size of the images the model will receive. Defaults to 1248.
+            conf (float, optional): The confidence threshold for the predictions. Defaults to 0.5.
+            augment (bool, optional): Whether to apply data augmentation on the input images. Defaults to False.
+            iou (float, optional): IoU threshold of the non-maximum suppression. Defaults to 0.7.
+            max_det (int, optional): Maximum number of detections per image. Defaults to 300.
+            classes (Sequence[int], optional): Class ids to keep, the other classes are dropped before the NMS. Defaults to None.
+        
+        Returns:
+            List[Detections]: One Detections per input image, in input order.
+        """
+        try:
+            logger.debug("Making batched predictions on %d images, confidence threshold: %s", len(input_images), conf)
             
-            # Transform predictions to pandas dataframe
-            predictions_df = self.data_processor.transform_predict_to_df(predictions, self.model.names)
-            logger.debug(f"Predictions converted to dataframe with {len(predictions_df)} entries.")
+            # Make predictions, a list source is processed as a single batch
+            with timed_stage("predict"):
+                predictions = self.model.predict(
+                    imgsz=self.fixed_image_size or image_size,
+                    source=list(input_images),
+                    conf=conf,
+                    save=save,
+                    augment=augment,
+                    iou=iou,
+                    max_det=max_det,
+                    classes=list(classes) if classes is not None else None,
+                    flipud=0.0,
+                    fliplr=0.0,
+                    mosaic=0.0,
+                )
+            self.__record_speed(predictions)
+            logger.debug("Batched predictions made successfully.")
             
-            return predictions_df
+            # Transform every result to its own detections
+            with timed_stage("transform"):
+                detections = [self.data_processor.transform_result_to_detections(result, self.class_names) for result in predictions]
+            for image_detections in detections:
+                DETECTIONS_PER_IMAGE.observe(len(image_detections))
+            return detections
         
         except Exception as e:
-            logger.error(f"Error making predictions: {e}")
+            logger.error("Error making batched predictions: %s", e)
             raise
\ No newline at end of file
@@ -0,0 +1,275 @@
+""" model/registry.py
+Model Registry, it is used to serve several detectors by name,
+loading them on first use and unloading the least recently used ones.
+
+Copyright 2026 ktun@
+
+CREATED: 2026-10-17 18:26:09
+MODIFIED: 2026-10-17 23:02:51
+"""
+# -*- coding:utf-8 -*-
+# import the necessary libraries
+import os
+import time
+import itertools
+import threading
+import numpy as np
+#
+from PIL import Image
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Union
+from utils import Detections, get_logger
+from model.detector import Detector
+
+
+# Setup logger
+logger = get_logger(__name__)
+
+def measure_resident_bytes(detector: Detector) -> int:
+    """
+    Approximate the memory a loaded detector holds.
+
+    Args:
+        detector (Detector): The loaded detector.
+
+    Returns:
+        int: Size of the parameters and buffers of a PyTorch model, or of the weights
+            file for exported backends whose runtime memory is not visible from Python.
+    """
+    module = getattr(detector.model, "model", None)
+    if hasattr(module, "parameters") and hasattr(module, "buffers"):
+        tensors = itertools.chain(module.parameters(), module.buffers())
+        return sum(tensor.numel() * tensor.element_size() for tensor in tensors)
+    return os.path.getsize(detector.model_path) if os.path.isfile(detector.model_path) else 0
+
+
+class _ModelEntry:
+    """A served model, loaded or not."""
+    __slots__ = ("name", "options", "detector", "refcount", "load_lock", "uses", "loads",
+                 "load_seconds", "warmup_seconds", "resident_bytes", "last_used")
+
+    def __init__(self, name: str, options: dict):
+        self.name = name
+        self.options = options
+        self.detector: Optional[Detector] = None
+        self.refcount = 0
+        self.load_lock = threading.Lock()
+        self.uses = 0
+        self.loads = 0
+        self.load_seconds = 0.0
+        self.warmup_seconds = 0.0
+        self.resident_bytes = 0
+        self.last_used = 0.0
+
+
+class ModelRegistry:
+    def __init__(self, models: Dict[str, Union[str, dict]], default_model: str, memory_budget_bytes: int = 1024 ** 3,
+                 detector_options: Optional[dict] = None, warmup_image_size: int = 640,
+                 detector_factory: Callable[..., Detector] = Detector):
+        """
+        Initialize the ModelRegistry class.
+
+        Args:
+            models (Dict[str, Union[str, dict]]): Served models by name, either the weights path or
+                ``Detector`` keyword arguments overriding ``detector_options``.
+            default_model (str): Model of the requests not naming one.
+            memory_budget_bytes (int, optional): Resident size above which the least recently used
+                idle models are unloaded. Defaults to 1 GiB.
+            detector_options (dict, optional): ``Detector`` keyword arguments shared by every model. Defaults to None.
+            warmup_image_size (int, optional): Size of the blank image run once after loading. Defaults to 640.
+            detector_factory (Callable[..., Detector], optional): Builds a detector from the model options,
+                e.g. a stub detector of the benchmarks. Defaults to ``Detector``.
+
+        Raises:
+            ValueError: If the default model is not one of the models.
+        """
+        if default_model not in models:
+            raise ValueError(f"Default model '{default_model}' is not one of {sorted(models)}")
+        self.default_model = default_model
+        self.memory_budget_bytes = memory_budget_bytes
+        self.warmup_image_size = warmup_image_size
+        self.detector_factory = detector_factory
+        self._entries: Dict[str, _ModelEntry] = {}
+        for name, options in models.items():
+            options = {"model_path": options} if isinstance(options, str) else dict(options)
+            self._entries[name] = _ModelEntry(name, {**(detector_options or {}), **options})
+        # Guards the reference counts, the LRU order and the statistics, never held while loading
+        self._lock = threading.Lock()
+        self._evictions = 0
+        logger.info("ModelRegistry initialized with models %s and memory budget %d bytes . . .", sorted(models), memory_budget_bytes)
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._entries
+
+    @property
+    def names(self) -> List[str]:
+        """Names of the served models."""
+        return list(self._entries)
+
+    def resolve(self, name: Optional[str]) -> str:
+        """
+        Get the model name of a request.
+
+        Args:
+            name (str, optional): The requested model, None for the default model.
+
+        Returns:
+            str: The model name.
+
+        Raises:
+            KeyError: If the model is not served.
+        """
+        name = name or self.default_model
+        if name not in self._entries:
+            raise KeyError(f"Unknown model '{name}', expected one of {self.names}")
+        return name
+
+    def acquire(self, name: Optional[str] = None) -> Detector:
+        """
+        Lease a model, loading and warming it up on first use.
+
+        A leased model is never unloaded, every call must be paired with ``release``.
+
+        Args:
+            name (str, optional): The model name, None for the default model.
+
+        Returns:
+            Detector: The loaded detector.
+        """
+        entry = self._entries[self.resolve(name)]
+        with self._lock:
+            entry.refcount += 1
+        try:
+            # Concurrent first requests of a model wait for one load instead of loading it twice
+            with entry.load_lock:
+                if entry.detector is None:
+                    self._load(entry)
+        except Exception:
+            self.release(entry.name)
+            raise
+
+        with self._lock:
+            entry.uses += 1
+            entry.last_used = time.monotonic()
+            self._evict()
+            return entry.detector
+
+    def release(self, name: Optional[str] = None) -> None:
+        """
+        End a lease taken with ``acquire``, idle models may be unloaded afterwards.
+
+        Args:
+            name (str, optional): The model name, None for the default model.
+        """
+        entry = self._entries[self.resolve(name)]
+        with self._lock:
+            entry.refcount -= 1
+            self._evict()
+
+    @contextmanager
+    def lease(self, name: Optional[str] = None) -> Iterator[Detector]:
+        """Lease a model for the duration of a ``with`` block, see ``acquire``."""
+        detector = self.acquire(name)
+        try:
+            yield detector
+        finally:
+            self.release(name)
+
+    def get_loaded(self, name: Optional[str] = None) -> Detector:
+        """
+        Get a model the caller already holds a lease on.
+
+        Raises:
+            RuntimeError: If the model is not loaded.
+        """
+        detector = self._entries[self.resolve(name)].detector
+        if detector is None:
+            raise RuntimeError(f"Model '{name}' is not loaded, acquire it first")
+        return detector
+
+    def batch_predict(self, input_images: List[Union[Image.Image, np.ndarray]], model: Optional[str] = None, **params) -> List[Detections]:
+        """
+        Batch predict function of the ``BatchScheduler``, run on a model leased by the requests.
+
+        Args:
+            input_images (List[Union[Image.Image, np.ndarray]]): The images of the batch, PIL images or BGR arrays.
+            model (str, optional): The model name, None for the default model.
+            **params: Inference parameters of ``Detector.get_model_batch_predict``.
+
+        Returns:
+            List[Detections]: One Detections per input image, in input order.
+        """
+        return self.get_loaded(model).get_model_batch_predict(input_images, **params)
+
+    def preload(self, names: Iterable[str]) -> None:
+        """Load and warm up models ahead of their first request."""
+        for name in names:
+            with self.lease(name):
+                pass
+
+    def _load(self, entry: _ModelEntry) -> None:
+        """Load and warm up a model, called with its load lock held."""
+        logger.info("Loading model '%s' . . .", entry.name)
+        started = time.perf_counter()
+        detector = self.detector_factory(**entry.options)
+        load_seconds = time.perf_counter() - started
+
+        # One blank inference pays the lazy initialization cost before the first real request
+        started = time.perf_counter()
+        blank_image = Image.new("RGB", (self.warmup_image_size, self.warmup_image_size))
+        detector.get_model_predict(blank_image, image_size=self.warmup_image_size)
+        warmup_seconds = time.perf_counter() - started
+
+        with self._lock:
+            entry.detector = detector
+            entry.loads += 1
+            entry.load_seconds = load_seconds
+            entry.warmup_seconds = warmup_seconds
+            entry.resident_bytes = measure_resident_bytes(detector)
+        logger.info("Model '%s' loaded in %.2f s and warmed up in %.2f s, %d bytes resident.",
+                    entry.name, load_seconds, warmup_seconds, entry.resident_bytes)
+
+    def _evict(self) -> None:
+        """Unload the least recently used idle models while over the memory budget, called with the lock held."""
+        loaded = [entry for entry in self._entries.values() if entry.detector is not None]
+        resident_bytes = sum(entry.resident_bytes for entry in loaded)
+        for entry in sorted(loaded, key=lambda entry: entry.last_used):
+            if resident_bytes <= self.memory_budget_bytes:
+                return
+            if entry.refcount > 0:
+                continue
+            entry.detector = None
+            resident_bytes -= entry.resident_bytes
+            self._evictions += 1
+            logger.info("Model '%s' unloaded, %d bytes resident of a %d bytes budget.", entry.name, resident_bytes, self.memory_budget_bytes)
+        if resident_bytes > self.memory_budget_bytes:
+            logger.debug("Memory budget exceeded by leased models, %d bytes resident.", resident_bytes)
+
+    def get_stats(self) -> dict:
+        """
+        Get the state, load times and resident sizes of the served models.
+
+        Returns:
+            dict: Registry totals and one entry per model.
+        """
+        with self._lock:
+            models = {
+                entry.name: {
+                    "loaded": entry.detector is not None,
+                    "backend": entry.detector.backend if entry.detector is not None else entry.options.get("backend"),
+                    "leases": entry.refcount,
+                    "uses": entry.uses,
+                    "loads": entry.loads,
+                    "load_seconds": round(entry.load_seconds, 3),
+                    "warmup_seconds": round(entry.warmup_seconds, 3),
+                    "resident_bytes": entry.resident_bytes if entry.detector is not None else 0,
+                }
+                for entry in self._entries.values()
+            }
+            return {
+                "default_model": self.default_model,
+                "memory_budget_bytes": self.memory_budget_bytes,
+                "resident_bytes": sum(model["resident_bytes"] for model in models.values()),
+                "evictions": self._evictions,
+                "models": models,
+            }
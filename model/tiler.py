@@ -0,0 +1,142 @@
+""" model/tiler.py
+Tiled Detector, it is used to run the detector on overlapping
+tiles of very large images and merge the tile detections.
+
+Copyright 2026 ktun@
+
+CREATED: 2026-10-17 17:51:22
+MODIFIED: 2026-10-17 23:52:36
+"""
+# -*- coding:utf-8 -*-
+# import the necessary libraries
+import time
+import numpy as np
+#
+from PIL import Image
+from typing import Optional, Tuple
+from utils import Detections, get_logger
+from utils.box_ops import fuse_boxes, non_max_suppression
+
+
+# Setup logger
+logger = get_logger(__name__)
+
+# Ways of merging the duplicate detections of overlapping tiles
+MERGE_METHODS = {"nms": non_max_suppression, "fusion": fuse_boxes}
+
+def get_tile_boxes(width: int, height: int, tile_size: int, overlap: float) -> np.ndarray:
+    """
+    Cover an image with overlapping tiles, the last row and column are aligned to the image border.
+
+    Args:
+        width (int): Image width.
+        height (int): Image height.
+        tile_size (int): Side of the square tiles, tiles are clipped to smaller images.
+        overlap (float): Fraction of the tile size shared by neighbouring tiles, in [0, 1).
+
+    Returns:
+        np.ndarray: (T, 4) int array of tiles as xmin, ymin, xmax, ymax.
+    """
+    stride = max(1, int(tile_size * (1.0 - overlap)))
+
+    def get_starts(length: int) -> np.ndarray:
+        last_start = max(length - tile_size, 0)
+        return np.unique(np.append(np.arange(0, last_start, stride), last_start))
+
+    xmin, ymin = np.meshgrid(get_starts(width), get_starts(height))
+    xmin, ymin = xmin.ravel(), ymin.ravel()
+    return np.stack([xmin, ymin, np.minimum(xmin + tile_size, width), np.minimum(ymin + tile_size, height)], axis=1)
+
+
+class TiledDetector:
+    def __init__(self, prepass_size: int = 640, prepass_margin: float = 0.05):
+        """
+        Initialize the TiledDetector class.
+
+        Args:
+            prepass_size (int, optional): Image size of the low-resolution pass used to skip empty tiles. Defaults to 640.
+            prepass_margin (float, optional): Fraction of the image size the pre-pass boxes are grown by
+                before testing which tiles they touch. Defaults to 0.05.
+        """
+        self.prepass_size = prepass_size
+        self.prepass_margin = prepass_margin
+        logger.info("TiledDetector initialized with pre-pass size %d . . .", prepass_size)
+
+    def select_tiles(self, detector, image: Image.Image, tile_boxes: np.ndarray, conf: float) -> np.ndarray:
+        """
+        Run a cheap low-resolution pass over the whole image and keep the tiles it found something in.
+
+        Args:
+            detector (Detector): The detector running the pre-pass.
+            image (Image.Image): The full image.
+            tile_boxes (np.ndarray): (T, 4) tiles of the image.
+            conf (float): Confidence threshold of the pre-pass, usually below the final one.
+
+        Returns:
+            np.ndarray: (T,) boolean mask of the tiles to run.
+        """
+        # Predictions of a downscaled image are returned in original image coordinates
+        found = detector.get_model_predict(image, image_size=self.prepass_size, conf=conf)
+        if found.is_empty:
+            return np.zeros(len(tile_boxes), dtype=bool)
+
+        margin = self.prepass_margin * max(image.size)
+        boxes = found.xyxy + np.array([-margin, -margin, margin, margin], dtype=np.float32)
+        tiles = tile_boxes[:, None, :]
+        touches = (
+            (tiles[..., 0] < boxes[None, :, 2]) & (tiles[..., 2] > boxes[None, :, 0])
+            & (tiles[..., 1] < boxes[None, :, 3]) & (tiles[..., 3] > boxes[None, :, 1])
+        )
+        return touches.any(axis=1)
+
+    def predict(self, detector, image: Image.Image, tile_size: int = 640, overlap: float = 0.2, batch_size: int = 8,
+                skip_empty: bool = False, prepass_conf: float = 0.25, merge: str = "nms", merge_iou: float = 0.5,
+                conf: float = 0.5, augment: bool = False, image_size: Optional[int] = None) -> Tuple[Detections, dict]:
+        """
+        Detect objects on overlapping tiles of an image at the tile resolution.
+
+        Args:
+            detector (Detector): The detector running the tiles.
+            image (Image.Image): The full-resolution image.
+            tile_size (int, optional): Side of the square tiles, also the model image size. Defaults to 640.
+            overlap (float, optional): Fraction of the tile size shared by neighbouring tiles. Defaults to 0.2.
+            batch_size (int, optional): Tiles per forward pass. Defaults to 8.
+            skip_empty (bool, optional): Skip the tiles a low-resolution pre-pass found nothing in. Defaults to False.
+            prepass_conf (float, optional): Confidence threshold of the pre-pass. Defaults to 0.25.
+            merge (str, optional): Duplicate merge across tiles, one of ``MERGE_METHODS``. Defaults to "nms".
+            merge_iou (float, optional): IoU above which detections of a class are duplicates. Defaults to 0.5.
+            conf (float, optional): The confidence threshold for the predictions. Defaults to 0.5.
+            augment (bool, optional): Whether to apply data augmentation on the tiles. Defaults to False.
+            image_size (int, optional): Model image size of the tiles, None for the tile size. Defaults to None.
+
+        Returns:
+            Tuple[Detections, dict]: The merged detections in image coordinates and the tiling statistics.
+        """
+        started = time.perf_counter()
+        tile_boxes = get_tile_boxes(image.width, image.height, tile_size, overlap)
+        selected = self.select_tiles(detector, image, tile_boxes, prepass_conf) if skip_empty else np.ones(len(tile_boxes), dtype=bool)
+        run_boxes = tile_boxes[selected]
+        logger.debug("Running %d of %d tiles of %dx%d image.", len(run_boxes), len(tile_boxes), image.width, image.height)
+
+        # Run the tiles batch by batch, shifting every tile's boxes to image coordinates
+        tile_detections = []
+        for start in range(0, len(run_boxes), batch_size):
+            boxes = run_boxes[start:start + batch_size]
+            tiles = [image.crop(tuple(box)) for box in boxes.tolist()]
+            results = detector.get_model_batch_predict(tiles, image_size=image_size or tile_size, conf=conf, augment=augment)
+            for box, detections in zip(boxes, results):
+                if not detections.is_empty:
+                    tile_detections.append(detections.translate(box[0], box[1]))
+
+        raw = Detections.concatenate(tile_detections, detector.class_names)
+        merged = MERGE_METHODS[merge](raw, iou_threshold=merge_iou)
+        stats = {
+            "tiles": int(len(tile_boxes)),
+            "tiles_run": int(len(run_boxes)),
+            "tiles_skipped": int(len(tile_boxes) - len(run_boxes)),
+            "raw_detections": len(raw),
+            "merged_detections": len(merged),
+            "elapsed_ms": round((time.perf_counter() - started) * 1000.0, 2),
+        }
+        logger.debug("Tiled prediction finished: %s", stats)
+        return merged, stats
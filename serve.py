@@ -0,0 +1,390 @@
+""" serve.py
+Serving launcher, it is used to run the Fast API service with
+a worker and thread layout fitted to the CPU cores of the machine.
+
+Copyright 2026 ktun@
+
+CREATED: 2026-10-17 20:41:06
+MODIFIED: 2026-10-17 23:47:52
+"""
+# -*- coding:utf-8 -*-
+# import the necessary libraries
+import os
+import sys
+import json
+import time
+import socket
+import argparse
+import threading
+import subprocess
+import http.client
+#
+from typing import Dict, List, Optional, Tuple
+from utils import get_logger
+from utils.image_processor import with_jpeg_comment
+
+
+#region Configuration
+# Define the ASGI application served by the workers
+APP_URI = "app:app"
+# Define the layout file written by the calibration and read on start when no layout is given
+LAYOUT_PATH = "./data/serving_layout.json"
+# Define the intra-op threads of a worker when neither config nor calibration chose them,
+# YOLO inference on CPU scales poorly past a few threads, more workers use the rest of the cores
+DEFAULT_THREADS_PER_WORKER = 4
+# Define the environment variables limiting the thread pools of the native libraries,
+# they must be set before torch is imported by the worker
+THREAD_ENV_VARS = ("OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS", "NUMEXPR_NUM_THREADS")
+# Define the calibration load, posted to the JSON endpoint by concurrent clients
+CALIBRATION_IMAGE = "./data/test_image.jpg"
+CALIBRATION_ENDPOINT = "/img_object_detection_to_json"
+CALIBRATION_READY_TIMEOUT = 300.0
+#endregion
+
+
+# Setup logger
+logger = get_logger(__name__)
+
+def get_available_cpus() -> List[int]:
+    """Get the CPUs this process may run on, honouring the affinity mask set by containers and taskset."""
+    try:
+        return sorted(os.sched_getaffinity(0))
+    except AttributeError:  # not available on macOS and Windows
+        return list(range(os.cpu_count() or 1))
+
+def plan_layout(cpu_count: int, workers: Optional[int] = None, threads: Optional[int] = None) -> Tuple[int, int]:
+    """
+    Choose the number of workers and the intra-op threads of every worker.
+
+    Whatever is not given is derived from the CPU count, so that the workers times their
+    threads fill the cores without oversubscribing them.
+
+    Args:
+        cpu_count (int): CPUs available to the service.
+        workers (int, optional): Number of worker processes. Defaults to the CPUs divided by the threads.
+        threads (int, optional): Intra-op threads of every worker. Defaults to the CPUs divided by
+            the workers, or ``DEFAULT_THREADS_PER_WORKER`` when neither is given.
+
+    Returns:
+        Tuple[int, int]: The number of workers and the threads of every worker.
+    """
+    cpu_count = max(1, cpu_count)
+    if workers is None and threads is None:
+        threads = min(cpu_count, DEFAULT_THREADS_PER_WORKER)
+    if workers is None:
+        workers = max(1, cpu_count // threads)
+    if threads is None:
+        threads = max(1, cpu_count // workers)
+    if workers * threads > cpu_count:
+        logger.warning("%d workers x %d threads oversubscribe the %d available CPUs.", workers, threads, cpu_count)
+    return workers, threads
+
+def get_cpu_set(cpus: List[int], slot: int, threads: int) -> List[int]:
+    """
+    Get the CPUs a worker slot is pinned to, consecutive blocks of ``threads`` CPUs per slot.
+
+    Blocks wrap around when the workers need more CPUs than available.
+    """
+    return sorted({cpus[(slot * threads + offset) % len(cpus)] for offset in range(threads)})
+
+def candidate_layouts(cpu_count: int) -> List[Tuple[int, int]]:
+    """Get the worker x thread layouts the calibration benchmarks, each one filling the CPUs."""
+    layouts = []
+    threads = 1
+    while threads <= cpu_count:
+        layouts.append((max(1, cpu_count // threads), threads))
+        threads *= 2
+    if (1, cpu_count) not in layouts:
+        layouts.append((1, cpu_count))
+    return layouts
+
+def limit_threads(threads: int) -> None:
+    """Limit the native thread pools of the current process, the environment is inherited by the workers."""
+    for name in THREAD_ENV_VARS:
+        os.environ[name] = str(threads)
+    if "torch" in sys.modules:  # already imported, the environment is not read anymore
+        import torch
+        torch.set_num_threads(threads)
+
+def pin_process(cpu_set: List[int]) -> None:
+    """Pin the current process to a set of CPUs, when the platform supports it."""
+    try:
+        os.sched_setaffinity(0, cpu_set)
+    except (AttributeError, OSError) as e:
+        logger.warning("Could not pin process %d to CPUs %s: %s", os.getpid(), cpu_set, e)
+
+def load_layout(path: str = LAYOUT_PATH) -> Optional[dict]:
+    """Load the layout recorded by the calibration, None when there is none."""
+    if not os.path.isfile(path):
+        return None
+    try:
+        with open(path) as file:
+            return json.load(file)
+    except (OSError, ValueError) as e:
+        logger.warning("Ignoring the unreadable serving layout '%s': %s", path, e)
+        return None
+
+def resolve_layout(args: argparse.Namespace) -> Tuple[int, int, bool]:
+    """
+    Resolve the serving layout from the command line, the environment, the calibrated layout and the CPUs, in this order.
+
+    Returns:
+        Tuple[int, int, bool]: The number of workers, the threads of every worker and whether workers are pinned.
+    """
+    cpus = get_available_cpus()
+    workers = args.workers or (int(os.environ["SERVE_WORKERS"]) if os.getenv("SERVE_WORKERS") else None)
+    threads = args.threads or (int(os.environ["SERVE_THREADS"]) if os.getenv("SERVE_THREADS") else None)
+    pin_cpus = args.pin_cpus or os.getenv("SERVE_PIN_CPUS", "0").lower() in ("1", "true", "yes")
+
+    if workers is None and threads is None and args.layout:
+        layout = load_layout(args.layout)
+        if layout is not None and layout.get("cpu_count") == len(cpus):
+            logger.info("Using the calibrated serving layout from '%s'.", args.layout)
+            workers, threads = layout["workers"], layout["threads"]
+            pin_cpus = pin_cpus or layout.get("pin_cpus", False)
+        elif layout is not None:
+            logger.warning("Ignoring the serving layout '%s', it was calibrated for %s CPUs, %d are available.", args.layout, layout.get("cpu_count"), len(cpus))
+
+    workers, threads = plan_layout(len(cpus), workers, threads)
+    return workers, threads, pin_cpus
+
+
+#region Serving
+def run_gunicorn(host: str, port: int, workers: int, threads: int, pin_cpus: bool, timeout: int) -> None:
+    """
+    Serve the application with gunicorn managing uvicorn workers.
+
+    The application is imported by every worker after the fork, so each worker loads its own
+    models once, with the thread limits and CPU set of its slot already applied.
+    """
+    from gunicorn.app.base import BaseApplication
+
+    cpus = get_available_cpus()
+
+    def pre_fork(server, worker) -> None:
+        # Give the new worker the lowest slot no live worker holds, so a restarted worker takes over the CPUs of the dead one
+        used = {getattr(live, "cpu_slot", None) for live in server.WORKERS.values()}
+        worker.cpu_slot = next(slot for slot in range(len(used) + 1) if slot not in used)
+
+    def post_fork(server, worker) -> None:
+        limit_threads(threads)
+        if pin_cpus:
+            cpu_set = get_cpu_set(cpus, worker.cpu_slot, threads)
+            pin_process(cpu_set)
+            logger.info("Worker %d (slot %d) pinned to CPUs %s with %d threads.", worker.pid, worker.cpu_slot, cpu_set, threads)
+
+    class ServingApplication(BaseApplication):
+        def load_config(self) -> None:
+            options = {
+                "bind": f"{host}:{port}",
+                "workers": workers,
+                "worker_class": "uvicorn.workers.UvicornWorker",
+                "timeout": timeout,
+                "preload_app": False,  # torch must not be imported before the fork
+                "pre_fork": pre_fork,
+                "post_fork": post_fork,
+            }
+            for key, value in options.items():
+                self.cfg.set(key, value)
+
+        def load(self):
+            from app import app
+            return app
+
+    ServingApplication().run()
+
+def run_uvicorn(host: str, port: int, workers: int, threads: int, pin_cpus: bool) -> None:
+    """Serve the application with uvicorn alone, workers can only be pinned when there is a single one."""
+    import uvicorn
+
+    if pin_cpus:
+        if workers == 1:
+            pin_process(get_cpu_set(get_available_cpus(), 0, threads))
+        else:
+            logger.warning("Pinning %d uvicorn workers needs gunicorn, the workers are not pinned.", workers)
+    uvicorn.run(APP_URI, host=host, port=port, workers=workers)
+
+def serve(args: argparse.Namespace) -> None:
+    """Resolve the layout and start the workers."""
+    workers, threads, pin_cpus = resolve_layout(args)
+    logger.info("Serving %s on %s:%d with %d workers x %d threads%s.", APP_URI, args.host, args.port, workers, threads, ", pinned" if pin_cpus else "")
+    # Set in the launcher too, the workers inherit the environment before importing torch
+    limit_threads(threads)
+
+    server = args.server
+    if server == "gunicorn":
+        try:
+            import gunicorn  # noqa: F401
+        except ImportError:
+            logger.warning("gunicorn is not installed, serving with uvicorn workers.")
+            server = "uvicorn"
+    if server == "gunicorn":
+        run_gunicorn(args.host, args.port, workers, threads, pin_cpus, args.timeout)
+    else:
+        run_uvicorn(args.host, args.port, workers, threads, pin_cpus)
+#endregion
+
+
+#region Calibration
+def get_free_port() -> int:
+    """Get a free local TCP port."""
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def post_image(port: int, image_bytes: bytes, timeout: float = 60.0) -> int:
+    """Post an image to the calibration endpoint, returning the status code."""
+    boundary = "calibration-boundary"
+    body = (
+        f"--{boundary}\r\nContent-Disposition: form-data; name=\"file\"; filename=\"image.jpg\"\r\n"
+        "Content-Type: image/jpeg\r\n\r\n"
+    ).encode("latin-1") + image_bytes + f"\r\n--{boundary}--\r\n".encode("latin-1")
+    connection = http.client.HTTPConnection("127.0.0.1", port, timeout=timeout)
+    try:
+        connection.request("POST", CALIBRATION_ENDPOINT, body=body, headers={"Content-Type": f"multipart/form-data; boundary={boundary}"})
+        response = connection.getresponse()
+        response.read()
+        return response.status
+    finally:
+        connection.close()
+
+def wait_until_ready(port: int, process: subprocess.Popen, timeout: float) -> bool:
+    """Poll the readiness endpoint of a server until it answers 200, it exits or the timeout expires."""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline and process.poll() is None:
+        try:
+            connection = http.client.HTTPConnection("127.0.0.1", port, timeout=2.0)
+            connection.request("GET", "/ready")
+            if connection.getresponse().status == 200:
+                return True
+        except OSError:
+            pass
+        time.sleep(0.5)
+    return False
+
+def run_load(port: int, image_bytes: bytes, concurrency: int, duration: float) -> Dict[str, float]:
+    """
+    Post unique images with concurrent clients for a fixed duration.
+
+    Returns:
+        Dict[str, float]: Completed requests, errors, throughput in requests per second and the p50 and p95 latency in milliseconds.
+    """
+    latencies: List[float] = []
+    errors = 0
+    lock = threading.Lock()
+    deadline = time.monotonic() + duration
+
+    def client(index: int) -> None:
+        nonlocal errors
+        sent = 0
+        while time.monotonic() < deadline:
+            started = time.perf_counter()
+            try:
+                ok = post_image(port, with_jpeg_comment(image_bytes, f"{index}-{sent}")) == 200
+            except OSError:
+                ok = False
+            elapsed = time.perf_counter() - started
+            sent += 1
+            with lock:
+                if ok:
+                    latencies.append(elapsed)
+                else:
+                    errors += 1
+
+    started = time.monotonic()
+    clients = [threading.Thread(target=client, args=(index,), daemon=True) for index in range(concurrency)]
+    for thread in clients:
+        thread.start()
+    for thread in clients:
+        thread.join()
+    elapsed = time.monotonic() - started
+
+    latencies.sort()
+    def percentile(q: float) -> float:
+        return round(latencies[min(len(latencies) - 1, int(q * len(latencies)))] * 1000.0, 1) if latencies else float("nan")
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "throughput_rps": round(len(latencies) / elapsed, 2),
+        "p50_ms": percentile(0.50),
+        "p95_ms": percentile(0.95),
+    }
+
+def calibrate(args: argparse.Namespace) -> dict:
+    """
+    Benchmark the candidate worker x thread layouts on this machine and record the best one.
+
+    Every layout is served by a fresh launcher on a free port, warmed up until ready, then
+    loaded by ``2 x workers`` concurrent clients. The layout with the highest throughput wins,
+    among the layouts within ``--max-p95-ms`` when it is given.
+    """
+    cpus = get_available_cpus()
+    with open(CALIBRATION_IMAGE, "rb") as file:
+        image_bytes = file.read()
+
+    results = []
+    for workers, threads in candidate_layouts(len(cpus)):
+        port = get_free_port()
+        command = [sys.executable, os.path.abspath(__file__), "--host", "127.0.0.1", "--port", str(port),
+                   "--workers", str(workers), "--threads", str(threads), "--server", args.server]
+        if args.pin_cpus:
+            command.append("--pin-cpus")
+        logger.info("Calibrating %d workers x %d threads . . .", workers, threads)
+        process = subprocess.Popen(command, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        try:
+            if not wait_until_ready(port, process, CALIBRATION_READY_TIMEOUT):
+                logger.error("Layout %d workers x %d threads never became ready, skipped.", workers, threads)
+                continue
+            # Warm every worker up, then measure
+            run_load(port, image_bytes, workers * 2, min(5.0, args.duration))
+            result = {"workers": workers, "threads": threads, **run_load(port, image_bytes, workers * 2, args.duration)}
+            results.append(result)
+            logger.info("Layout %d workers x %d threads: %.2f req/s, p95 %.1f ms.", workers, threads, result["throughput_rps"], result["p95_ms"])
+        finally:
+            process.terminate()
+            try:
+                process.wait(timeout=30)
+            except subprocess.TimeoutExpired:
+                process.kill()
+
+    if not results:
+        raise RuntimeError("No serving layout could be calibrated.")
+    eligible = [result for result in results if args.max_p95_ms is None or result["p95_ms"] <= args.max_p95_ms] or results
+    best = max(eligible, key=lambda result: result["throughput_rps"])
+    layout = {
+        "workers": best["workers"],
+        "threads": best["threads"],
+        "pin_cpus": args.pin_cpus,
+        "cpu_count": len(cpus),
+        "calibrated_at": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "results": results,
+    }
+    with open(args.layout, "w") as file:
+        json.dump(layout, file, indent=2)
+    logger.info("Best layout %d workers x %d threads saved to '%s'.", best["workers"], best["threads"], args.layout)
+    return layout
+#endregion
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Serve the YOLO11 Fast API service with a CPU-fitted worker layout.")
+    parser.add_argument("--host", default="0.0.0.0", help="Address to bind.")
+    parser.add_argument("--port", type=int, default=8003, help="Port to bind.")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes, defaults to SERVE_WORKERS, the calibrated layout or the CPU count divided by the threads per worker.")
+    parser.add_argument("--threads", type=int, default=None, help=f"Torch/OpenMP threads per worker, defaults to SERVE_THREADS, the calibrated layout, the CPU count divided by the workers, or up to {DEFAULT_THREADS_PER_WORKER}.")
+    parser.add_argument("--pin-cpus", action="store_true", help="Pin every worker to its own CPU set, also enabled by SERVE_PIN_CPUS=1.")
+    parser.add_argument("--server", choices=("gunicorn", "uvicorn"), default="gunicorn", help="Process manager, uvicorn when gunicorn is not installed.")
+    parser.add_argument("--timeout", type=int, default=120, help="Seconds before gunicorn restarts a silent worker.")
+    parser.add_argument("--layout", default=LAYOUT_PATH, help="Calibrated layout file, read on start and written by --calibrate.")
+    parser.add_argument("--calibrate", action="store_true", help="Benchmark the candidate layouts and record the best one instead of serving.")
+    parser.add_argument("--duration", type=float, default=20.0, help="Seconds of load per calibrated layout.")
+    parser.add_argument("--max-p95-ms", type=float, default=None, help="Only pick calibrated layouts within this p95 latency.")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    arguments = parse_args()
+    if arguments.calibrate:
+        calibrate(arguments)
+    else:
+        serve(arguments)
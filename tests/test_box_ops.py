@@ -0,0 +1,95 @@
+""" tests/test_box_ops.py
+Box operations tests, it is used to check the merge of
+duplicate detections across tiles.
+
+Copyright 2026 ktun@
+
+CREATED: 2026-10-17 23:58:40
+MODIFIED: 2026-10-17 23:58:40
+"""
+# -*- coding:utf-8 -*-
+# import the necessary libraries
+import numpy as np
+#
+from utils.detections import Detections
+from utils.box_ops import box_iou, fuse_boxes, non_max_suppression
+
+
+CLASS_NAMES = np.array(["person", "car", "truck"], dtype=object)
+
+def make_detections(boxes, confidences, class_ids) -> Detections:
+    return Detections(np.array(boxes, dtype=np.float32), np.array(confidences), np.array(class_ids), CLASS_NAMES)
+
+def reference_nms(detections: Detections, iou_threshold: float) -> Detections:
+    """Plain greedy per-class NMS, one box at a time."""
+    detections = detections[np.argsort(-detections.confidence, kind="stable")]
+    keep = []
+    for index in range(len(detections)):
+        same_class = [kept for kept in keep if detections.class_id[kept] == detections.class_id[index]]
+        if not same_class or box_iou(detections.xyxy[index:index + 1], detections.xyxy[same_class]).max() <= iou_threshold:
+            keep.append(index)
+    return detections[np.array(keep, dtype=np.intp)]
+
+
+def test_box_iou():
+    iou = box_iou(np.array([[0, 0, 10, 10]], dtype=np.float32), np.array([[0, 0, 10, 10], [5, 0, 15, 10], [20, 20, 30, 30]], dtype=np.float32))
+    assert np.allclose(iou, [[1.0, 1.0 / 3.0, 0.0]])
+
+def test_nms_merges_duplicates_across_a_tile_seam():
+    # The same car detected by the tiles on both sides of the seam at x = 640
+    detections = make_detections([[600, 100, 680, 160], [602, 101, 681, 160]], [0.8, 0.9], [1, 1])
+    merged = non_max_suppression(detections, iou_threshold=0.5)
+    assert len(merged) == 1
+    assert np.allclose(merged.xyxy, [[602, 101, 681, 160]])
+    assert np.allclose(merged.confidence, [0.9])
+
+def test_nms_keeps_overlapping_boxes_of_different_classes():
+    detections = make_detections([[600, 100, 680, 160], [600, 100, 680, 160]], [0.9, 0.8], [1, 2])
+    merged = non_max_suppression(detections, iou_threshold=0.5)
+    assert sorted(merged.class_id.tolist()) == [1, 2]
+
+def test_nms_keeps_boxes_overlapping_a_suppressed_box():
+    # b is suppressed by a, so c, which only overlaps b, survives
+    detections = make_detections([[0, 0, 10, 10], [3, 0, 13, 10], [6, 0, 16, 10]], [0.9, 0.8, 0.7], [0, 0, 0])
+    merged = non_max_suppression(detections, iou_threshold=0.5)
+    assert np.allclose(merged.xyxy, [[0, 0, 10, 10], [6, 0, 16, 10]])
+
+def test_nms_of_empty_and_single_detections():
+    assert len(non_max_suppression(Detections.empty(CLASS_NAMES))) == 0
+    assert len(non_max_suppression(make_detections([[0, 0, 10, 10]], [0.5], [0]))) == 1
+
+def test_nms_matches_the_greedy_reference():
+    rng = np.random.default_rng(0)
+    for _ in range(50):
+        count = int(rng.integers(2, 80))
+        corners = np.round(rng.random((count, 2)) * 100)
+        boxes = np.hstack([corners, corners + np.round(5 + rng.random((count, 2)) * 30)])
+        detections = make_detections(boxes, np.round(0.1 + rng.random(count) * 0.9, 1), rng.integers(0, 3, count))
+        for iou_threshold in (0.2, 0.5):
+            merged, expected = non_max_suppression(detections, iou_threshold), reference_nms(detections, iou_threshold)
+            assert np.array_equal(merged.xyxy, expected.xyxy)
+            assert np.array_equal(merged.class_id, expected.class_id)
+
+def test_fusion_averages_duplicates_across_a_tile_seam():
+    detections = make_detections([[600, 100, 680, 160], [610, 100, 690, 160]], [0.75, 0.25], [1, 1])
+    fused = fuse_boxes(detections, iou_threshold=0.5)
+    assert len(fused) == 1
+    assert np.allclose(fused.xyxy, [[602.5, 100, 682.5, 160]])
+    assert np.allclose(fused.confidence, [0.75])
+    assert fused.class_id.tolist() == [1]
+
+def test_fusion_keeps_overlapping_boxes_of_different_classes():
+    detections = make_detections([[600, 100, 680, 160], [600, 100, 680, 160]], [0.9, 0.8], [1, 2])
+    fused = fuse_boxes(detections, iou_threshold=0.5)
+    assert sorted(fused.class_id.tolist()) == [1, 2]
+    assert np.allclose(fused.xyxy, [[600, 100, 680, 160]] * 2)
+
+def test_fusion_clusters_like_nms():
+    rng = np.random.default_rng(1)
+    corners = np.round(rng.random((60, 2)) * 100)
+    boxes = np.hstack([corners, corners + 20])
+    detections = make_detections(boxes, 0.1 + rng.random(60) * 0.9, rng.integers(0, 3, 60))
+    fused, kept = fuse_boxes(detections, 0.3), non_max_suppression(detections, 0.3)
+    # Every cluster is headed by a box NMS keeps, and reports its confidence
+    assert np.array_equal(fused.confidence, kept.confidence)
+    assert np.array_equal(fused.class_id, kept.class_id)
@@ -0,0 +1,63 @@
+""" tests/test_tiler.py
+Tiled Detector tests, it is used to check the tile layout
+and the merge of the detections of overlapping tiles.
+
+Copyright 2026 ktun@
+
+CREATED: 2026-10-17 23:58:40
+MODIFIED: 2026-10-17 23:58:40
+"""
+# -*- coding:utf-8 -*-
+# import the necessary libraries
+import numpy as np
+#
+from PIL import Image
+from utils.detections import Detections
+from model.tiler import TiledDetector, get_tile_boxes
+
+
+CLASS_NAMES = np.array(["object"], dtype=object)
+
+class BrightRegionDetector:
+    """Detects the bright pixels of every tile as one object, clipped to the tile."""
+    class_names = CLASS_NAMES
+
+    def get_model_batch_predict(self, tiles, **params):
+        results = []
+        for tile in tiles:
+            ys, xs = np.nonzero(np.asarray(tile.convert("L")) > 127)
+            if len(xs) == 0:
+                results.append(Detections.empty(CLASS_NAMES))
+                continue
+            results.append(Detections([[xs.min(), ys.min(), xs.max() + 1, ys.max() + 1]], [0.9], [0], CLASS_NAMES))
+        return results
+
+
+def test_tiles_cover_the_image_up_to_its_border():
+    width, height, tile_size = 1000, 700, 256
+    tiles = get_tile_boxes(width, height, tile_size, overlap=0.2)
+    covered = np.zeros((height, width), dtype=bool)
+    for xmin, ymin, xmax, ymax in tiles.tolist():
+        covered[ymin:ymax, xmin:xmax] = True
+    assert covered.all()
+    assert tiles[:, 2].max() == width and tiles[:, 3].max() == height
+    # Edge tiles are aligned to the border instead of being cut short
+    assert np.all(tiles[:, 2] - tiles[:, 0] == tile_size)
+    assert np.all(tiles[:, 3] - tiles[:, 1] == tile_size)
+
+def test_neighbouring_tiles_overlap():
+    tiles = get_tile_boxes(2000, 256, 512, overlap=0.25)
+    xmin = np.unique(tiles[:, 0])
+    assert np.all(np.diff(xmin) <= 512 * 0.75)
+
+def test_image_smaller_than_a_tile_is_one_tile():
+    assert get_tile_boxes(300, 200, 640, overlap=0.2).tolist() == [[0, 0, 300, 200]]
+
+def test_object_in_the_tile_overlap_is_detected_once():
+    image = np.zeros((256, 1000, 3), dtype=np.uint8)
+    image[100:140, 220:250] = 255  # inside the overlap of the first two 256 px tiles
+    for merge in ("nms", "fusion"):
+        detections, stats = TiledDetector().predict(BrightRegionDetector(), Image.fromarray(image), tile_size=256, overlap=0.2, merge=merge)
+        assert stats["raw_detections"] == 2
+        assert len(detections) == 1
+        assert np.allclose(detections.xyxy, [[220, 100, 250, 140]])
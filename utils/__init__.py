@@ -4,8 +4,22 @@ This package contains utility classes and functions
 for processing data, image, and logging.
 """
 from .logger import get_logger
+from .metrics import MetricsRegistry, MetricsMiddleware, metrics_registry, timed_stage
+from .detections import Detections
 from .data_processor import DataProcessor
 from .image_processor import ImageProcessor
 from .visualizer import Visualizer
+from .concurrency import StageExecutors, AdmissionController, ServiceOverloaded
+from .result_cache import ResultCache
+from .video_processor import VideoProcessor, MjpegParser
+from .frame_mailbox import LatestFrameMailbox
+from .frame_dedup import FrameDeduplicator
+from .quality_controller import QualityController, QualityLevel
+from .startup import StartupTracker
+from .uploads import UploadLimitMiddleware
 
-__all__ = ("get_logger", "DataProcessor", "ImageProcessor", "Visualizer")
\ No newline at end of file
+__all__ = ("get_logger", "MetricsRegistry", "MetricsMiddleware", "metrics_registry", "timed_stage",
+           "Detections", "DataProcessor", "ImageProcessor", "Visualizer",
+           "StageExecutors", "AdmissionController", "ServiceOverloaded", "ResultCache",
+           "VideoProcessor", "MjpegParser", "LatestFrameMailbox", "FrameDeduplicator",
+           "QualityController", "QualityLevel", "StartupTracker", "UploadLimitMiddleware")
\ No newline at end of file
@@ -0,0 +1,183 @@
+""" utils/box_ops.py
+Box operations, it is used to compare and merge
+bounding boxes with vectorized NumPy code.
+
+Copyright 2026 ktun@
+
+CREATED: 2026-10-17 17:51:22
+MODIFIED: 2026-10-17 23:58:12
+"""
+# -*- coding:utf-8 -*-
+# import the necessary libraries
+import numpy as np
+#
+from typing import Iterator, Tuple
+from utils.detections import Detections
+
+
+def box_iou(boxes_a: np.ndarray, boxes_b: np.ndarray) -> np.ndarray:
+    """
+    Compute the pairwise IoU of two sets of boxes.
+
+    Args:
+        boxes_a (np.ndarray): (N, 4) boxes as xmin, ymin, xmax, ymax.
+        boxes_b (np.ndarray): (M, 4) boxes as xmin, ymin, xmax, ymax.
+
+    Returns:
+        np.ndarray: (N, M) IoU matrix.
+    """
+    area_a = (boxes_a[:, 2] - boxes_a[:, 0]) * (boxes_a[:, 3] - boxes_a[:, 1])
+    area_b = (boxes_b[:, 2] - boxes_b[:, 0]) * (boxes_b[:, 3] - boxes_b[:, 1])
+    top_left = np.maximum(boxes_a[:, None, :2], boxes_b[None, :, :2])
+    bottom_right = np.minimum(boxes_a[:, None, 2:], boxes_b[None, :, 2:])
+    intersection = np.clip(bottom_right - top_left, 0, None).prod(axis=2)
+    return intersection / np.maximum(area_a[:, None] + area_b[None, :] - intersection, 1e-9)
+
+
+def _iter_overlap_pairs(boxes: np.ndarray, offsets: np.ndarray, block_size: int = 1 << 18) -> Iterator[Tuple[np.ndarray, np.ndarray]]:
+    """
+    Yield the pairs of boxes whose x extents overlap, in blocks of at most ``block_size`` pairs.
+
+    The boxes are sorted by xmin, so the boxes a box may overlap on its right are the next ones
+    starting before its xmax, found by a binary search. Every pair is yielded once, and the boxes
+    of different ``offsets`` are never paired, e.g. the class ids shifted past the image width.
+
+    Args:
+        boxes (np.ndarray): (N, 4) boxes as xmin, ymin, xmax, ymax.
+        offsets (np.ndarray): (N,) shifts of the x coordinates, boxes of different shifts must not overlap.
+        block_size (int, optional): Most pairs per block, except for a single box with more candidates. Defaults to 1 << 18.
+
+    Yields:
+        Tuple[np.ndarray, np.ndarray]: The indices of the two boxes of every pair of the block.
+    """
+    xmin = boxes[:, 0].astype(np.float64) + offsets
+    xmax = boxes[:, 2].astype(np.float64) + offsets
+    by_xmin = np.argsort(xmin, kind="stable")
+    ends = np.searchsorted(xmin[by_xmin], xmax[by_xmin], side="left")
+    counts = np.maximum(ends - np.arange(1, len(boxes) + 1), 0)
+    totals = np.cumsum(counts)
+    row = 0
+    while row < len(boxes):
+        done = totals[row - 1] if row else 0
+        end = max(int(np.searchsorted(totals, done + block_size, side="right")), row + 1)
+        block_counts = counts[row:end]
+        first = np.repeat(np.arange(row, end), block_counts)
+        # Every row is paired with the block_counts[row] boxes right after it in xmin order
+        starts = np.repeat(np.cumsum(block_counts) - block_counts, block_counts)
+        second = first + 1 + np.arange(len(first)) - starts
+        yield by_xmin[first], by_xmin[second]
+        row = end
+
+
+def _pair_iou(boxes: np.ndarray, first: np.ndarray, second: np.ndarray) -> np.ndarray:
+    """Compute the IoU of the boxes of every pair, see ``box_iou`` for the all-pairs matrix."""
+    boxes_a, boxes_b = boxes[first], boxes[second]
+    area_a = (boxes_a[:, 2] - boxes_a[:, 0]) * (boxes_a[:, 3] - boxes_a[:, 1])
+    area_b = (boxes_b[:, 2] - boxes_b[:, 0]) * (boxes_b[:, 3] - boxes_b[:, 1])
+    sides = np.clip(np.minimum(boxes_a[:, 2:], boxes_b[:, 2:]) - np.maximum(boxes_a[:, :2], boxes_b[:, :2]), 0, None)
+    intersection = sides[:, 0] * sides[:, 1]
+    return intersection / np.maximum(area_a + area_b - intersection, 1e-9)
+
+
+def _greedy_clusters(detections: Detections, iou_threshold: float) -> np.ndarray:
+    """
+    Cluster the duplicates of detections sorted by decreasing confidence, like a greedy per-class NMS.
+
+    A detection heads its own cluster unless it overlaps a more confident head of its class by more
+    than ``iou_threshold``, then it joins the most confident of those heads. Instead of visiting the
+    detections one by one, every round settles at once all the detections whose more confident
+    duplicates are already settled.
+
+    Args:
+        detections (Detections): Detections sorted by decreasing confidence.
+        iou_threshold (float): IoU above which two detections of a class are duplicates.
+
+    Returns:
+        np.ndarray: (N,) index of the cluster head of every detection, heads point to themselves.
+    """
+    boxes = detections.xyxy
+    count = len(detections)
+    # Shift every class past the others on the x axis, so only boxes of a class are paired
+    span = float(boxes[:, 2].max() - min(boxes[:, 0].min(), 0.0)) + 1.0
+    offsets = detections.class_id.astype(np.float64) * span
+    sources, targets = [], []
+    for first, second in _iter_overlap_pairs(boxes, offsets):
+        duplicate = _pair_iou(boxes, first, second) > iou_threshold
+        first, second = first[duplicate], second[duplicate]
+        sources.append(np.minimum(first, second))  # the more confident one
+        targets.append(np.maximum(first, second))
+    sources = np.concatenate(sources) if sources else np.empty(0, dtype=np.intp)
+    targets = np.concatenate(targets) if targets else np.empty(0, dtype=np.intp)
+
+    head = np.full(count, -1, dtype=np.intp)
+    while True:
+        undecided = head < 0
+        if not undecided.any():
+            return head
+        # A detection is settled once all its more confident duplicates are
+        waiting = np.zeros(count, dtype=bool)
+        waiting[targets[undecided[sources]]] = True
+        ready = undecided & ~waiting
+        claimed = np.full(count, count, dtype=np.intp)
+        claims = ready[targets] & (head[sources] == sources)
+        np.minimum.at(claimed, targets[claims], sources[claims])
+        ready_ids = np.flatnonzero(ready)
+        head[ready_ids] = np.where(claimed[ready_ids] < count, claimed[ready_ids], ready_ids)
+        # Only the duplicates of the detections still to settle matter from now on
+        pending = ~ready[targets]
+        sources, targets = sources[pending], targets[pending]
+
+
+def non_max_suppression(detections: Detections, iou_threshold: float = 0.5) -> Detections:
+    """
+    Remove duplicate detections of the same class, keeping the most confident one.
+
+    Args:
+        detections (Detections): Detections that may overlap, e.g. from overlapping tiles.
+        iou_threshold (float, optional): Boxes of a class overlapping a kept box more than this are removed. Defaults to 0.5.
+
+    Returns:
+        Detections: The kept detections, sorted by decreasing confidence.
+    """
+    if len(detections) <= 1:
+        return detections
+    order = np.argsort(-detections.confidence, kind="stable")
+    detections = detections[order]
+
+    # A box survives if no kept, more confident box of its class overlaps it
+    keep = _greedy_clusters(detections, iou_threshold) == np.arange(len(detections))
+    return detections[keep]
+
+
+def fuse_boxes(detections: Detections, iou_threshold: float = 0.5) -> Detections:
+    """
+    Merge duplicate detections of the same class into one confidence-weighted box.
+
+    Clusters are formed like in ``non_max_suppression``, but instead of dropping the
+    duplicates their boxes are averaged with the confidences as weights, which gives
+    tighter boxes for objects cut by tile borders.
+
+    Args:
+        detections (Detections): Detections that may overlap, e.g. from overlapping tiles.
+        iou_threshold (float, optional): Boxes of a class overlapping more than this are fused. Defaults to 0.5.
+
+    Returns:
+        Detections: The fused detections, with the confidence of the most confident member of each cluster.
+    """
+    if len(detections) <= 1:
+        return detections
+    order = np.argsort(-detections.confidence, kind="stable")
+    detections = detections[order]
+
+    # Assign every box to the first (most confident) cluster head of its class overlapping it
+    cluster = _greedy_clusters(detections, iou_threshold)
+
+    heads = np.unique(cluster)
+    member_of = np.searchsorted(heads, cluster)
+    weights = detections.confidence.astype(np.float64)
+    weight_sums = np.bincount(member_of, weights=weights, minlength=len(heads))
+    fused = np.stack([
+        np.bincount(member_of, weights=detections.xyxy[:, axis] * weights, minlength=len(heads))
+        for axis in range(4)
+    ], axis=1) / weight_sums[:, None]
+    return Detections(fused, detections.confidence[heads], detections.class_id[heads], detections.class_names)
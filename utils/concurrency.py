@@ -0,0 +1,184 @@
+""" utils/concurrency.py
+Concurrency, it is used to run the blocking pipeline stages
+off the event loop and to shed load when the service is full.
+
+Copyright 2026 ktun@
+
+CREATED: 2026-10-17 10:04:19
+MODIFIED: 2026-10-17 23:33:05
+"""
+# -*- coding:utf-8 -*-
+# import the necessary libraries
+import asyncio
+import functools
+import threading
+import contextvars
+#
+from contextlib import asynccontextmanager
+from typing import Any, Callable, Dict, Iterable, Optional
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from utils import get_logger
+
+
+# Setup logger
+logger = get_logger(__name__)
+
+class ServiceOverloaded(Exception):
+    """Raised when a request can not be admitted because the admission queue is full."""
+
+    def __init__(self, retry_after: int = 1):
+        super().__init__("Service overloaded, retry later")
+        self.retry_after = retry_after
+
+
+class StageExecutors:
+    # Stages allowed in a process pool: they only run stateless functions on picklable
+    # arguments, and their work is not timed by the request context, which processes lose
+    PROCESS_STAGES_ALLOWED = ("decode", "validate")
+
+    def __init__(self, workers: Dict[str, int], process_stages: Iterable[str] = ()):
+        """
+        Initialize the StageExecutors class, one dedicated pool per pipeline stage.
+
+        Args:
+            workers (Dict[str, int]): Number of workers per stage name, e.g. ``{"decode": 2, "inference": 1}``.
+            process_stages (Iterable[str], optional): Stages served by a process pool instead of a thread pool,
+                among ``PROCESS_STAGES_ALLOWED``. The functions and arguments of those stages must be picklable. Defaults to ().
+
+        Raises:
+            ValueError: If a process stage is not in ``PROCESS_STAGES_ALLOWED``.
+        """
+        unsupported = sorted(set(process_stages) - set(self.PROCESS_STAGES_ALLOWED))
+        if unsupported:
+            raise ValueError(f"Stages {unsupported} can not run in a process pool, only {list(self.PROCESS_STAGES_ALLOWED)} can")
+        self.workers = dict(workers)
+        self.process_stages = set(process_stages)
+        self._pools: Dict[str, Executor] = {}
+        for stage, max_workers in self.workers.items():
+            if stage in self.process_stages:
+                self._pools[stage] = ProcessPoolExecutor(max_workers=max_workers)
+            else:
+                self._pools[stage] = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=f"{stage}-stage")
+        logger.info("StageExecutors initialized with workers %s (process stages: %s) . . .", self.workers, sorted(self.process_stages))
+
+    def get_executor(self, stage: str) -> Executor:
+        """
+        Get the pool of a stage.
+
+        Args:
+            stage (str): The stage name.
+
+        Returns:
+            Executor: The pool running the stage.
+        """
+        try:
+            return self._pools[stage]
+        except KeyError:
+            raise KeyError(f"Unknown pipeline stage '{stage}'") from None
+
+    async def run(self, stage: str, fn: Callable[..., Any], *args, **kwargs) -> Any:
+        """
+        Run a blocking function in the pool of a stage without blocking the event loop.
+
+        Args:
+            stage (str): The stage name.
+            fn (Callable): The blocking function.
+            *args, **kwargs: Arguments passed to ``fn``.
+
+        Returns:
+            Any: The return value of ``fn``.
+        """
+        loop = asyncio.get_running_loop()
+        call = functools.partial(fn, *args, **kwargs)
+        if stage not in self.process_stages:
+            # Carry the request context into the worker thread, e.g. its stage timings
+            call = functools.partial(contextvars.copy_context().run, call)
+        return await loop.run_in_executor(self.get_executor(stage), call)
+
+    def shutdown(self) -> None:
+        """Shutdown every stage pool."""
+        for stage, pool in self._pools.items():
+            pool.shutdown(wait=False, cancel_futures=True)
+            logger.info("Stage pool '%s' shut down.", stage)
+
+
+class AdmissionController:
+    def __init__(self, max_in_flight: int, max_queue: int, retry_after: int = 1):
+        """
+        Initialize the AdmissionController class.
+
+        At most ``max_in_flight`` requests are processed concurrently and at most ``max_queue``
+        more wait for a slot. Any request beyond that is rejected immediately with
+        ``ServiceOverloaded`` so latency stays bounded under overload.
+
+        Args:
+            max_in_flight (int): Number of requests processed concurrently.
+            max_queue (int): Number of requests allowed to wait for a processing slot.
+            retry_after (int, optional): Seconds clients are asked to wait before retrying. Defaults to 1.
+        """
+        if max_in_flight < 1 or max_queue < 0:
+            raise ValueError("max_in_flight must be >= 1 and max_queue must be >= 0")
+        self.max_in_flight = max_in_flight
+        self.max_queue = max_queue
+        self.retry_after = retry_after
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._lock = threading.Lock()
+        self._admitted = 0  # in flight + waiting
+        self._in_flight = 0
+        self._accepted = 0
+        self._rejected = 0
+        logger.info("AdmissionController initialized with %d in flight and %d queued requests . . .", max_in_flight, max_queue)
+
+    @property
+    def in_flight(self) -> int:
+        """Number of requests currently being processed."""
+        return self._in_flight
+
+    @property
+    def queue_depth(self) -> int:
+        """Number of admitted requests waiting for a processing slot."""
+        return self._admitted - self._in_flight
+
+    @asynccontextmanager
+    async def admit(self):
+        """
+        Hold a processing slot for the duration of the ``async with`` block.
+
+        Raises:
+            ServiceOverloaded: If both the processing slots and the admission queue are full.
+        """
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_in_flight)
+        with self._lock:
+            if self._admitted >= self.max_in_flight + self.max_queue:
+                self._rejected += 1
+                logger.warning("Admission queue full (%d requests), rejecting request.", self._admitted)
+                raise ServiceOverloaded(retry_after=self.retry_after)
+            self._admitted += 1
+            self._accepted += 1
+        try:
+            async with self._semaphore:
+                self._in_flight += 1
+                try:
+                    yield
+                finally:
+                    self._in_flight -= 1
+        finally:
+            with self._lock:
+                self._admitted -= 1
+
+    def get_stats(self) -> dict:
+        """
+        Get the admission counters.
+
+        Returns:
+            dict: Limits, current occupancy and accepted/rejected request counts.
+        """
+        return {
+            "max_in_flight": self.max_in_flight,
+            "max_queue": self.max_queue,
+            "in_flight": self.in_flight,
+            "queue_depth": self.queue_depth,
+            "accepted": self._accepted,
+            "rejected": self._rejected,
+        }
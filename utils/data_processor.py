@@ -5,12 +5,18 @@ data for translation process of the application.
 Copyright 2024 ktun@
 
 CREATED: 2024-11-12 21:43:54
-MODIFIED: 2024-11-13 12:37:58
+MODIFIED: 2026-10-17 20:07:31
 """
 # -*- coding:utf-8 -*-
 # import the necessary libraries
-import pandas as pd
+import numpy as np
+#
+from typing import TYPE_CHECKING
 from utils import get_logger
+from utils.detections import Detections
+
+if TYPE_CHECKING:  # pandas is only needed for the optional DataFrame export
+    import pandas as pd
 
 
 # Setup logger
@@ -22,43 +28,77 @@ class DataProcessor:
         logger.info("DataProcessor initialized . . .")
         self.device = device
 
-    def transform_predict_to_df(self, results: list, labeles_dict: dict) -> pd.DataFrame:
+    def build_class_names(self, labeles_dict: dict) -> np.ndarray:
         """
-        Transform predict from yolov8 (torch.Tensor) to pandas DataFrame.
+        Build the class-id to class-name lookup table once per model.
 
         Args:
-            results (list): A list containing the predict output from yolov8 in the form of a torch.Tensor.
             labeles_dict (dict): A dictionary containing the labels names, where the keys are the class ids and the values are the label names.
-            
+
         Returns:
-            predict_bbox (pd.DataFrame): A DataFrame containing the bounding box coordinates, confidence scores and class labels.
+            np.ndarray: Object array where index i holds the name of class i.
+        """
+        class_names = np.empty(max(labeles_dict, default=-1) + 1, dtype=object)
+        class_names[:] = [str(i) for i in range(len(class_names))]  # ids missing from the dict keep their number
+        for class_id, name in labeles_dict.items():
+            class_names[class_id] = name
+        return class_names
+
+    def transform_predict_to_detections(self, results: list, class_names: np.ndarray) -> Detections:
+        """
+        Transform predict from yolo (torch.Tensor) to Detections.
+
+        Args:
+            results (list): A list containing the predict output from yolo in the form of a torch.Tensor.
+            class_names (np.ndarray): The class-id to class-name table built by ``build_class_names``.
+
+        Returns:
+            Detections: The bounding box coordinates, confidence scores and class ids of the first image.
         """
-        logger.info("Transforming predictions to DataFrame...")
+        logger.debug("Transforming predictions to Detections...")
         try:
-            # Log the type and attributes of the results object to understand its structure
+            # Log the type of the results object to understand its structure
             logger.debug("Results object type: %s", type(results))
-            logger.debug("Results attributes: %s", dir(results))
-            
+
             # get the all predictions
-            predictiions = results[0].to(self.device).numpy()
-            
-            # Transform the Tensor to numpy array
-            predict_bbox = pd.DataFrame(predictiions.boxes.xyxy, columns=['xmin', 'ymin', 'xmax','ymax'])
-            logger.debug("DataFrame columns after transformation: %s", predict_bbox.columns)
-            
-            # Add the confidence of the prediction to the DataFrame
-            predict_bbox['confidence'] = predictiions.boxes.conf
-            logger.debug("Added confidence to DataFrame")
-            
-            # Add the class of the prediction to the DataFrame
-            predict_bbox['class'] = (predictiions.boxes.cls).astype(int)
-            logger.debug("Added class to DataFrame")
-            
-            # Replace the class number with the class name from the labeles_dict
-            predict_bbox['name'] = predict_bbox["class"].replace(labeles_dict)
-            logger.info("Transformation complete. DataFrame created with %d rows", len(predict_bbox))
-            
-            return predict_bbox
+            return self.transform_result_to_detections(results[0], class_names)
         except Exception as e:
-            logger.error("Error while transforming predictions to DataFrame: %s", str(e))
-            raise
\ No newline at end of file
+            logger.error("Error while transforming predictions to Detections: %s", str(e))
+            raise
+
+    def transform_result_to_detections(self, result, class_names: np.ndarray) -> Detections:
+        """
+        Transform a single yolo result (one image of a batch) to Detections.
+
+        Args:
+            result (ultralytics.engine.results.Results): The predict output of the model for one image.
+            class_names (np.ndarray): The class-id to class-name table built by ``build_class_names``.
+
+        Returns:
+            Detections: The bounding box coordinates, confidence scores and class ids.
+        """
+        try:
+            # A single (N, 6) transfer: xmin, ymin, xmax, ymax, confidence, class
+            boxes = result.boxes.data.cpu().numpy()
+            detections = Detections(boxes[:, :4], boxes[:, 4], boxes[:, 5].astype(np.intp), class_names)
+            logger.debug("Transformation complete. Detections created with %d entries", len(detections))
+
+            return detections
+        except Exception as e:
+            logger.error("Error while transforming predictions to Detections: %s", str(e))
+            raise
+
+    def transform_predict_to_df(self, results: list, labeles_dict: dict) -> "pd.DataFrame":
+        """
+        Transform predict from yolo (torch.Tensor) to pandas DataFrame.
+
+        Kept as an optional export, the serving path uses ``transform_predict_to_detections``.
+
+        Args:
+            results (list): A list containing the predict output from yolo in the form of a torch.Tensor.
+            labeles_dict (dict): A dictionary containing the labels names, where the keys are the class ids and the values are the label names.
+
+        Returns:
+            predict_bbox (pd.DataFrame): A DataFrame containing the bounding box coordinates, confidence scores and class labels.
+        """
+        return self.transform_predict_to_detections(results, self.build_class_names(labeles_dict)).to_dataframe()
@@ -0,0 +1,168 @@
+""" utils/detections.py
+Detections, it is used to hold the detection results
+of one image in compact NumPy arrays.
+
+Copyright 2026 ktun@
+
+CREATED: 2026-10-17 11:47:05
+MODIFIED: 2026-10-17 21:38:02
+"""
+# -*- coding:utf-8 -*-
+# import the necessary libraries
+import json
+import numpy as np
+#
+from typing import TYPE_CHECKING, Sequence
+
+if TYPE_CHECKING:  # pandas is only needed for the optional DataFrame export
+    import pandas as pd
+
+
+class Detections:
+    """Detection results of one image.
+
+    Attributes:
+        xyxy (np.ndarray): (N, 4) float32 array of bounding boxes as xmin, ymin, xmax, ymax.
+        confidence (np.ndarray): (N,) float32 array of confidence scores.
+        class_id (np.ndarray): (N,) int array of class ids.
+        class_names (np.ndarray): Object array of class names indexed by class id, shared
+            between every Detections of the same model.
+    """
+    __slots__ = ("xyxy", "confidence", "class_id", "class_names")
+
+    def __init__(self, xyxy: np.ndarray, confidence: np.ndarray, class_id: np.ndarray, class_names: np.ndarray):
+        self.xyxy = np.asarray(xyxy, dtype=np.float32).reshape(-1, 4)
+        self.confidence = np.asarray(confidence, dtype=np.float32).reshape(-1)
+        self.class_id = np.asarray(class_id, dtype=np.intp).reshape(-1)
+        self.class_names = class_names
+
+    @classmethod
+    def empty(cls, class_names: np.ndarray) -> "Detections":
+        """Create a Detections without any object."""
+        return cls(np.empty((0, 4)), np.empty(0), np.empty(0), class_names)
+
+    @classmethod
+    def concatenate(cls, detections_list: Sequence["Detections"], class_names: np.ndarray) -> "Detections":
+        """Join the detections of several images or tiles sharing a class-name table."""
+        if not detections_list:
+            return cls.empty(class_names)
+        return cls(
+            np.concatenate([detections.xyxy for detections in detections_list]),
+            np.concatenate([detections.confidence for detections in detections_list]),
+            np.concatenate([detections.class_id for detections in detections_list]),
+            class_names,
+        )
+
+    def __len__(self) -> int:
+        return len(self.confidence)
+
+    def __getitem__(self, index) -> "Detections":
+        """Select detections with a boolean mask, an index array or a slice."""
+        if isinstance(index, (int, np.integer)):
+            index = slice(index, index + 1 or None)
+        return Detections(self.xyxy[index], self.confidence[index], self.class_id[index], self.class_names)
+
+    def __repr__(self) -> str:
+        return f"Detections(n={len(self)}, names={self.names.tolist()})"
+
+    @property
+    def is_empty(self) -> bool:
+        """Whether no object was detected."""
+        return len(self) == 0
+
+    @property
+    def names(self) -> np.ndarray:
+        """Class names of the detections, looked up through the class-id table."""
+        return self.class_names[self.class_id]
+
+    @property
+    def nbytes(self) -> int:
+        """Approximate memory held by the detection arrays."""
+        return self.xyxy.nbytes + self.confidence.nbytes + self.class_id.nbytes
+
+    def rescale(self, scale_x: float, scale_y: float) -> "Detections":
+        """
+        Map the boxes to another resolution of the same image.
+
+        Args:
+            scale_x (float): Factor applied to the x coordinates.
+            scale_y (float): Factor applied to the y coordinates.
+
+        Returns:
+            Detections: New detections with scaled boxes, self is left unchanged.
+        """
+        if scale_x == 1.0 and scale_y == 1.0:
+            return self
+        xyxy = self.xyxy * np.array([scale_x, scale_y, scale_x, scale_y], dtype=np.float32)
+        return Detections(xyxy, self.confidence, self.class_id, self.class_names)
+
+    def translate(self, offset_x: float, offset_y: float) -> "Detections":
+        """
+        Shift the boxes, e.g. from a region of an image to the whole image.
+
+        Args:
+            offset_x (float): Offset added to the x coordinates.
+            offset_y (float): Offset added to the y coordinates.
+
+        Returns:
+            Detections: New detections with shifted boxes, self is left unchanged.
+        """
+        if offset_x == 0 and offset_y == 0:
+            return self
+        xyxy = self.xyxy + np.array([offset_x, offset_y, offset_x, offset_y], dtype=np.float32)
+        return Detections(xyxy, self.confidence, self.class_id, self.class_names)
+
+    def to_records(self) -> list:
+        """
+        Convert the detections to the records returned by the JSON endpoints.
+
+        Returns:
+            list: One ``{"name": ..., "confidence": ...}`` dict per detection.
+        """
+        return [
+            {"name": name, "confidence": confidence}
+            for name, confidence in zip(self.names.tolist(), self.confidence.tolist())
+        ]
+
+    def to_result(self, **extra) -> dict:
+        """
+        Convert the detections to the response of the JSON endpoints.
+
+        Args:
+            **extra: Additional fields placed before the detection fields.
+
+        Returns:
+            dict: Detected objects with their confidence scores and the joined object names.
+        """
+        return {
+            **extra,
+            "detect_objects": self.to_records(),
+            "detect_objects_names": ", ".join(self.names.tolist()),
+        }
+
+    def to_json_bytes(self, **extra) -> bytes:
+        """
+        Serialize the detections straight to the JSON response body.
+
+        Args:
+            **extra: Additional fields placed before the detection fields.
+
+        Returns:
+            bytes: The UTF-8 encoded JSON document.
+        """
+        return json.dumps(self.to_result(**extra), separators=(",", ":")).encode("utf-8")
+
+    def to_dataframe(self) -> "pd.DataFrame":
+        """
+        Export the detections to a pandas DataFrame.
+
+        Returns:
+            pd.DataFrame: Columns xmin, ymin, xmax, ymax, confidence, class and name.
+        """
+        import pandas as pd  # imported lazily, pandas is an optional export
+
+        predict_bbox = pd.DataFrame(self.xyxy, columns=["xmin", "ymin", "xmax", "ymax"])
+        predict_bbox["confidence"] = self.confidence
+        predict_bbox["class"] = self.class_id
+        predict_bbox["name"] = self.names
+        return predict_bbox
@@ -0,0 +1,172 @@
+""" utils/frame_dedup.py
+Frame Deduplicator, it is used to skip the inference of stream frames
+that barely differ from the last inferred frame of their stream.
+
+Copyright 2026 ktun@
+
+CREATED: 2026-10-17 22:14:36
+MODIFIED: 2026-10-17 22:14:36
+"""
+# -*- coding:utf-8 -*-
+# import the necessary libraries
+import time
+import threading
+import numpy as np
+#
+from PIL import Image
+from collections import OrderedDict
+from typing import Any, BinaryIO, Hashable, Optional, Tuple, Union
+from utils import get_logger
+from utils.metrics import metrics_registry, timed_stage
+from utils.image_processor import open_image
+
+
+# Setup logger
+logger = get_logger(__name__)
+
+def compute_frame_hash(binary_image: Union[bytes, BinaryIO], hash_size: int = 8) -> Tuple[int, Tuple[int, int]]:
+    """
+    Compute the difference hash (dHash) of an image.
+
+    The image is shrunk to a ``(hash_size + 1) x hash_size`` grayscale thumbnail and every bit
+    tells whether a pixel is brighter than its right neighbour. JPEGs are decoded with DCT
+    scaling straight to a small draft, far cheaper than the decode of the inference.
+
+    Args:
+        binary_image (Union[bytes, BinaryIO]): The image bytes, or a binary file holding them.
+        hash_size (int, optional): Rows of the thumbnail, the hash has ``hash_size ** 2`` bits. Defaults to 8.
+
+    Returns:
+        Tuple[int, Tuple[int, int]]: The hash and the (width, height) of the original image.
+    """
+    with timed_stage("frame_hash"):
+        image = open_image(binary_image)
+        size = image.size
+        if image.format == "JPEG":
+            image.draft("L", (8 * (hash_size + 1), 8 * hash_size))
+        thumbnail = image.convert("L").resize((hash_size + 1, hash_size), Image.BOX)
+        pixels = np.asarray(thumbnail, dtype=np.int16)
+        bits = np.packbits(pixels[:, 1:] > pixels[:, :-1])
+    return int.from_bytes(bits.tobytes(), "big"), size
+
+
+class _StreamState:
+    """The last inferred frame of a stream, with its detections."""
+    __slots__ = ("frame_hash", "size", "params_key", "detections", "inferred_at", "last_seen")
+
+    def __init__(self, frame_hash: int, size: Tuple[int, int], params_key: Hashable, detections: Any, now: float):
+        self.frame_hash = frame_hash
+        self.size = size
+        self.params_key = params_key
+        self.detections = detections
+        self.inferred_at = now
+        self.last_seen = now
+
+
+class FrameDeduplicator:
+    def __init__(self, max_streams: int = 1024, max_distance: int = 4, max_reuse_seconds: float = 5.0, idle_seconds: float = 300.0):
+        """
+        Initialize the FrameDeduplicator class, an LRU of the last inferred frame of every stream.
+
+        Frames are compared by their ``compute_frame_hash`` difference hash, and frames whose
+        hashes differ in at most ``max_distance`` bits reuse the detections of the last inferred
+        frame. The comparison is always made with the last inferred frame, not the previous one,
+        so a slow drift still adds up to a new inference.
+
+        Args:
+            max_streams (int, optional): Streams tracked at once, the least recently seen one is evicted beyond it. Defaults to 1024.
+            max_distance (int, optional): Most differing hash bits of a reused frame, 0 for identical thumbnails only. Defaults to 4.
+            max_reuse_seconds (float, optional): Age of the detections after which a frame is inferred again
+                however similar it is. Defaults to 5.
+            idle_seconds (float, optional): Streams not seen for this long are dropped. Defaults to 300.
+        """
+        self.max_streams = max_streams
+        self.max_distance = max_distance
+        self.max_reuse_seconds = max_reuse_seconds
+        self.idle_seconds = idle_seconds
+        self._streams: "OrderedDict[str, _StreamState]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._reused = 0
+        self._inferred = 0
+        self._evictions = 0
+        self._frames = metrics_registry.counter("yolo_stream_frames_total", "Stream frames by whether their detections were inferred or reused.", ("result",))
+        logger.info("FrameDeduplicator initialized with %d streams and a %d bits distance . . .", max_streams, max_distance)
+
+    def lookup(self, stream_id: str, frame_hash: int, size: Tuple[int, int], params_key: Hashable) -> Optional[Any]:
+        """
+        Get the detections of the last inferred frame of a stream when the frame is a near duplicate of it.
+
+        Args:
+            stream_id (str): The client or stream id.
+            frame_hash (int): Hash of the frame, from ``compute_frame_hash``.
+            size (Tuple[int, int]): Size of the frame.
+            params_key (Hashable): The model and inference parameters, detections of other parameters are never reused.
+
+        Returns:
+            Optional[Any]: The reused detections, or None when the frame has to be inferred.
+        """
+        now = time.monotonic()
+        with self._lock:
+            self._expire(now)
+            state = self._streams.get(stream_id)
+            if state is not None:
+                state.last_seen = now
+                self._streams.move_to_end(stream_id)
+                if (state.size == size and state.params_key == params_key
+                        and now - state.inferred_at <= self.max_reuse_seconds
+                        and (state.frame_hash ^ frame_hash).bit_count() <= self.max_distance):
+                    self._reused += 1
+                    self._frames.inc(result="reused")
+                    return state.detections
+            self._inferred += 1
+            self._frames.inc(result="inferred")
+            return None
+
+    def update(self, stream_id: str, frame_hash: int, size: Tuple[int, int], params_key: Hashable, detections: Any) -> None:
+        """
+        Record an inferred frame as the reference of its stream, evicting the least recently seen stream beyond ``max_streams``.
+
+        Args:
+            stream_id (str): The client or stream id.
+            frame_hash (int): Hash of the frame, from ``compute_frame_hash``.
+            size (Tuple[int, int]): Size of the frame.
+            params_key (Hashable): The model and inference parameters of the detections.
+            detections (Any): The detections of the frame.
+        """
+        now = time.monotonic()
+        with self._lock:
+            self._streams[stream_id] = _StreamState(frame_hash, size, params_key, detections, now)
+            self._streams.move_to_end(stream_id)
+            while len(self._streams) > self.max_streams:
+                evicted, _ = self._streams.popitem(last=False)
+                self._evictions += 1
+                logger.debug("Stream '%s' evicted from the frame deduplicator.", evicted)
+
+    def _expire(self, now: float) -> None:
+        """Drop the streams idle for longer than ``idle_seconds``, the lock must be held."""
+        while self._streams:
+            stream_id, state = next(iter(self._streams.items()))
+            if now - state.last_seen <= self.idle_seconds:
+                break
+            del self._streams[stream_id]
+            self._evictions += 1
+
+    def get_stats(self) -> dict:
+        """
+        Get the deduplication counters.
+
+        Returns:
+            dict: Tracked streams, reused and inferred frame counts and the skip ratio.
+        """
+        with self._lock:
+            frames = self._reused + self._inferred
+            return {
+                "streams": len(self._streams),
+                "max_streams": self.max_streams,
+                "max_distance": self.max_distance,
+                "frames": frames,
+                "reused": self._reused,
+                "inferred": self._inferred,
+                "evictions": self._evictions,
+                "skip_ratio": self._reused / frames if frames else 0.0,
+            }
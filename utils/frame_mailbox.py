@@ -0,0 +1,67 @@
+""" utils/frame_mailbox.py
+Frame Mailbox, it is used to hand the latest received frame
+of a live stream to its inference loop.
+
+Copyright 2026 ktun@
+
+CREATED: 2026-10-17 14:08:12
+MODIFIED: 2026-10-17 14:08:12
+"""
+# -*- coding:utf-8 -*-
+# import the necessary libraries
+import asyncio
+#
+from typing import Any, Optional
+from utils import get_logger
+
+
+# Setup logger
+logger = get_logger(__name__)
+
+class LatestFrameMailbox:
+    def __init__(self):
+        """
+        Initialize the LatestFrameMailbox class, a one-slot mailbox.
+
+        A frame put while another one is still pending replaces it, so a slow
+        consumer always gets the most recent frame instead of a backlog of stale ones.
+        """
+        self._item: Optional[Any] = None
+        self._event = asyncio.Event()
+        self._closed = False
+        self.received = 0
+        self.dropped = 0
+
+    def put(self, item: Any) -> None:
+        """
+        Put a frame, replacing the pending one if it was not taken yet.
+
+        Args:
+            item (Any): The frame.
+        """
+        self.received += 1
+        if self._item is not None:
+            self.dropped += 1
+        self._item = item
+        self._event.set()
+
+    async def get(self) -> Optional[Any]:
+        """
+        Wait for the next frame.
+
+        Returns:
+            Optional[Any]: The latest frame, or None once the mailbox is closed and empty.
+        """
+        while self._item is None:
+            if self._closed:
+                return None
+            await self._event.wait()
+            self._event.clear()
+        item, self._item = self._item, None
+        return item
+
+    def close(self) -> None:
+        """Close the mailbox, waking up the consumer."""
+        self._closed = True
+        self._event.set()
+        logger.debug("Mailbox closed after %d frames, %d dropped.", self.received, self.dropped)
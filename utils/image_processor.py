@@ -5,57 +5,210 @@ images for application.
 Copyright 2024 ktun@
 
 CREATED: 2024-11-12 21:50:34
-MODIFIED: 2024-11-13 11:17:08
+MODIFIED: 2026-10-17 23:47:52
 """
 # -*- coding:utf-8 -*-
 # import the necessary libraries
 import io
+import os
+import math
+import tarfile
+import zipfile
+import numpy as np
 #
 from PIL import Image
+from typing import BinaryIO, Iterator, List, Sequence, Tuple, Union
 from utils import get_logger
+from utils.metrics import timed_stage
 
 
 # Setup logger
 logger = get_logger(__name__)
 
+# File extensions accepted as images inside archives
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp", ".webp", ".tif", ".tiff")
+# Output formats of the encoded images and their media types
+IMAGE_MEDIA_TYPES = {"JPEG": "image/jpeg", "WEBP": "image/webp", "PNG": "image/png"}
+# File extensions handled as archives of images
+ARCHIVE_EXTENSIONS = (".zip", ".tar", ".tar.gz", ".tgz", ".tar.bz2", ".tar.xz")
+
+def open_image(binary_image: Union[bytes, BinaryIO]) -> Image.Image:
+    """Open an image lazily from bytes or in place from a binary file, e.g. a spooled upload"""
+    if isinstance(binary_image, (bytes, bytearray, memoryview)):
+        return Image.open(io.BytesIO(binary_image))
+    binary_image.seek(0)
+    return Image.open(binary_image)
+
+def with_jpeg_comment(jpeg_bytes: bytes, comment: str) -> bytes:
+    """Insert a comment segment after the JPEG start marker, making an upload unique without changing the pixels"""
+    payload = comment.encode("ascii")
+    segment = b"\xff\xfe" + (len(payload) + 2).to_bytes(2, "big") + payload
+    return jpeg_bytes[:2] + segment + jpeg_bytes[2:]
+
+
 class ImageProcessor:
     def __init__(self):
         """ Initialize the ImageProcessor class."""
         logger.info("ImageProcessor initialized . . .")
         
-    def get_image_from_bytes(self, binary_image: bytes) -> Image:
+    def get_image_from_bytes(self, binary_image: Union[bytes, BinaryIO]) -> Image:
         """Convert image from bytes to PIL RGB format
         
         Args:
-            binary_image (bytes): The binary representation of the image
+            binary_image (Union[bytes, BinaryIO]): The binary representation of the image, or a binary
+                file holding it (e.g. a spooled upload), read in place without copying it to memory first
         
         Returns:
             PIL.Image: The image in PIL RGB format
         """
         try:
-            input_image = Image.open(io.BytesIO(binary_image)).convert("RGB")
-            logger.info("Image successfully converted from bytes to PIL format.")
+            with timed_stage("decode"):
+                input_image = open_image(binary_image).convert("RGB")
+            logger.debug("Image successfully converted from bytes to PIL format.")
         except Exception as e:
             logger.error("Error converting image from bytes: %s", e)
             raise
         return input_image
 
-    def get_bytes_from_image(self, image: Image) -> bytes:
+    def get_reduced_image_from_bytes(self, binary_image: Union[bytes, BinaryIO], target_size: int) -> Tuple[Image.Image, Tuple[float, float]]:
+        """Convert image from bytes to PIL RGB format at reduced resolution
+        
+        JPEGs are decoded with DCT scaling straight to the smallest scale (1/2, 1/4, 1/8)
+        whose longest side is still at least ``target_size``, which is much cheaper than
+        a full decode of a large image. Other formats are decoded at full resolution.
+        
+        Args:
+            binary_image (Union[bytes, BinaryIO]): The binary representation of the image, or a binary file holding it
+            target_size (int): The image size the model will receive
+        
+        Returns:
+            Tuple[PIL.Image, Tuple[float, float]]: The image in PIL RGB format and the (x, y) factors
+                mapping its coordinates back to the original image
+        """
+        try:
+            with timed_stage("decode"):
+                input_image = open_image(binary_image)
+                original_width, original_height = input_image.size
+                if input_image.format == "JPEG" and max(original_width, original_height) > target_size:
+                    # Requested size keeps the aspect ratio, draft never goes below it
+                    ratio = target_size / max(original_width, original_height)
+                    input_image.draft("RGB", (max(1, round(original_width * ratio)), max(1, round(original_height * ratio))))
+                input_image = input_image.convert("RGB")
+            scale = (original_width / input_image.width, original_height / input_image.height)
+            logger.debug("Image successfully converted from bytes to PIL format at %dx%d (original %dx%d).",
+                        input_image.width, input_image.height, original_width, original_height)
+        except Exception as e:
+            logger.error("Error converting image from bytes: %s", e)
+            raise
+        return input_image, scale
+
+    def get_bytes_from_image(self, image: Image, image_format: str = "JPEG", quality: int = 85) -> bytes:
         """
         Convert PIL image to Bytes
         
         Args:
         image (Image): A PIL image instance
+        image_format (str, optional): One of ``IMAGE_MEDIA_TYPES``, JPEG, WEBP or PNG. Defaults to "JPEG".
+        quality (int, optional): Quality of the lossy formats, PNG is always lossless. Defaults to 85.
         
         Returns:
-        bytes : BytesIO object that contains the image in JPEG format with quality 85
+        bytes : BytesIO object that contains the encoded image
         """
         try:
             return_image = io.BytesIO()
-            image.save(return_image, format='JPEG', quality=85)  # save the image in JPEG format with quality 85
+            image_format = image_format.upper()
+            with timed_stage("encode"):
+                if image_format == "PNG":
+                    image.save(return_image, format="PNG", compress_level=1)  # favour encoding speed over size
+                elif image_format in IMAGE_MEDIA_TYPES:
+                    image.save(return_image, format=image_format, quality=quality)
+                else:
+                    raise ValueError(f"Unsupported image format '{image_format}'")
             return_image.seek(0)  # set the pointer to the beginning of the file
-            logger.info("Image successfully converted to bytes.")
+            logger.debug("Image successfully converted to bytes.")
         except Exception as e:
             logger.error("Error converting image to bytes: %s", e)
             raise
-        return return_image
\ No newline at end of file
+        return return_image
+
+    def crop_region(self, image: Union[Image.Image, np.ndarray], region: Sequence[float]) -> Tuple[Union[Image.Image, np.ndarray], Tuple[int, int]]:
+        """Cut a region of interest out of an image, clipped to the image bounds
+        
+        Args:
+            image (Union[Image.Image, np.ndarray]): The image, or an HxWxC array cut as a view without copying
+            region (Sequence[float]): The region as xmin, ymin, xmax, ymax in image pixels
+        
+        Returns:
+            Tuple[Union[Image.Image, np.ndarray], Tuple[int, int]]: The region image and its (x, y) offset
+                in the image, see ``Detections.translate``
+        
+        Raises:
+            ValueError: If the region does not overlap the image
+        """
+        width, height = (image.shape[1], image.shape[0]) if isinstance(image, np.ndarray) else image.size
+        left, top = max(0, int(region[0])), max(0, int(region[1]))
+        right, bottom = min(width, math.ceil(region[2])), min(height, math.ceil(region[3]))
+        if right <= left or bottom <= top:
+            raise ValueError(f"Region {list(region)} is outside the {width}x{height} image")
+        if isinstance(image, np.ndarray):
+            return image[top:bottom, left:right], (left, top)
+        return image.crop((left, top, right, bottom)), (left, top)
+
+    def get_crops_bytes(self, image: Union[Image.Image, np.ndarray], boxes: Sequence[Sequence[float]], padding: int = 0, image_format: str = "JPEG", quality: int = 85) -> List[bytes]:
+        """Cut and encode the crop of every box of an image
+        
+        Args:
+            image (Union[Image.Image, np.ndarray]): The image the boxes are in, or its RGB array
+            boxes (Sequence[Sequence[float]]): Boxes as xmin, ymin, xmax, ymax in image pixels
+            padding (int, optional): Pixels added around every box, clipped to the image. Defaults to 0.
+            image_format (str, optional): One of ``IMAGE_MEDIA_TYPES``. Defaults to "JPEG".
+            quality (int, optional): Quality of the lossy formats. Defaults to 85.
+        
+        Returns:
+            List[bytes]: The encoded crops, in box order
+        """
+        crops = []
+        for xmin, ymin, xmax, ymax in boxes:
+            crop, _ = self.crop_region(image, (xmin - padding, ymin - padding, xmax + padding, ymax + padding))
+            if isinstance(crop, np.ndarray):
+                crop = Image.fromarray(np.ascontiguousarray(crop))
+            crops.append(self.get_bytes_from_image(crop, image_format, quality).getvalue())
+        return crops
+
+    def is_archive(self, filename: str) -> bool:
+        """Check whether a file name refers to a supported archive of images
+        
+        Args:
+            filename (str): The uploaded file name
+        
+        Returns:
+            bool: True if the file is a zip or tar archive
+        """
+        return (filename or "").lower().endswith(ARCHIVE_EXTENSIONS)
+
+    def iter_archive_images(self, fileobj: BinaryIO, filename: str) -> Iterator[Tuple[str, bytes]]:
+        """Lazily read the images of a zip or tar archive, one member at a time
+        
+        Only the member currently yielded is held in memory, so the archive
+        size does not matter.
+        
+        Args:
+            fileobj (BinaryIO): The archive file object
+            filename (str): The archive file name, used to pick the archive format
+        
+        Yields:
+            Tuple[str, bytes]: The member name and its binary content
+        """
+        if filename.lower().endswith(".zip"):
+            with zipfile.ZipFile(fileobj) as archive:
+                for member in archive.infolist():
+                    if member.is_dir() or not member.filename.lower().endswith(IMAGE_EXTENSIONS):
+                        continue
+                    yield member.filename, archive.read(member)
+        else:
+            # Stream mode reads the tar sequentially without seeking back
+            with tarfile.open(fileobj=fileobj, mode="r|*") as archive:
+                for member in archive:
+                    if not member.isfile() or not member.name.lower().endswith(IMAGE_EXTENSIONS):
+                        continue
+                    yield os.path.basename(member.name), archive.extractfile(member).read()
@@ -1,21 +1,38 @@
 """ utils/loger.py
-Logger, it is used to log 
+Logger, it is used to log
 the process about the inference pipline
 
 Copyright 2024 ktun@
 
 CREATED:  2024-11-12 23:12:13
-MODIFIED: 2024-11-1316:30:45
+MODIFIED: 2026-10-17 20:07:31
 """
 # -*- coding:utf-8 -*-
 # Import the necessary libraries
 import os
+import sys
+import json
+import time
+import queue
+import atexit
 import logging
+import threading
+import logging.handlers
 #
 from enum import Enum
+from typing import Dict, Optional, Tuple
 from rich.logging import RichHandler
 
 
+# Logging mode: "rich" writes colorful lines synchronously, "json" hands the records to a
+# background writer thread through a queue and writes compact JSON lines
+LOG_MODE = os.getenv("LOG_MODE", "rich").lower()
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+# Records per second allowed for every message below WARNING, 0 disables the rate limit
+LOG_RATE_LIMIT = float(os.getenv("LOG_RATE_LIMIT", "0"))
+# Records waiting for the background writer, records beyond it are dropped instead of blocking
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+
 class LoggerLevels(Enum):
     """Define standard logging levels with an enum for clear references."""
     INFO = logging.INFO
@@ -25,6 +42,95 @@ class LoggerLevels(Enum):
     WARNING = logging.WARNING
 
 
+class JsonFormatter(logging.Formatter):
+    """Format records as compact single-line JSON documents."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": round(record.created, 6),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+            "src": f"{record.filename}:{record.lineno}",
+            "func": record.funcName,
+        }
+        if getattr(record, "suppressed", 0):
+            entry["suppressed"] = record.suppressed
+        if record.exc_info:
+            record.exc_text = record.exc_text or self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, separators=(",", ":"), default=str)
+
+
+class RateLimitFilter(logging.Filter):
+    def __init__(self, max_per_second: float, burst: Optional[float] = None, level: int = logging.WARNING):
+        """
+        Initialize the RateLimitFilter class, a token bucket per message template.
+
+        Every call site logging per request (same logger and message template) may emit
+        ``max_per_second`` records on average, the records beyond it are dropped and
+        counted in the ``suppressed`` field of the next record let through.
+
+        Args:
+            max_per_second (float): Average records per second of each message, 0 disables the limit.
+            burst (float, optional): Records of a message allowed back to back. Defaults to ``max_per_second``.
+            level (int, optional): Records of this level and above are never limited. Defaults to WARNING.
+        """
+        super().__init__()
+        self.rate = max_per_second
+        self.burst = max(1.0, burst if burst is not None else max_per_second)
+        self.level = level
+        self._lock = threading.Lock()
+        self._buckets: Dict[Tuple[str, str], list] = {}  # tokens, last refill, suppressed
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if self.rate <= 0 or record.levelno >= self.level:
+            return True
+        key = (record.name, str(record.msg))
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = self._buckets[key] = [self.burst, now, 0]
+            bucket[0] = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+            bucket[1] = now
+            if bucket[0] < 1.0:
+                bucket[2] += 1
+                return False
+            bucket[0] -= 1.0
+            record.suppressed, bucket[2] = bucket[2], 0
+        return True
+
+
+class DeferredQueueHandler(logging.handlers.QueueHandler):
+    """Queue handler leaving the formatting to the writer thread and dropping records when the queue is full."""
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Merge the arguments now, they may change once the call returns, the rest is formatted by the writer
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+_queue_handler: Optional[DeferredQueueHandler] = None
+_queue_listener: Optional[logging.handlers.QueueListener] = None
+_queue_lock = threading.Lock()
+_rate_limit_filter = RateLimitFilter(LOG_RATE_LIMIT)
+
 def console_handler():
     """Create a console handler with RichHandler for colorful and structured output."""
     msg = '%(asctime)s - %(levelname)s - %(filename)s:%(lineno)d - %(funcName)s() - %(message)s'
@@ -34,7 +140,7 @@ def console_handler():
 
 def file_handler(log_file='app.log', max_bytes=5 * 1024 * 1024, backup_count=5):
     """Create a rotating file handler for persistent logging to file.
-    
+
     Parameters:
     - log_file : str : Path to the log file.
     - max_bytes : int : Maximum size of a log file before rotating.
@@ -47,13 +153,32 @@ def file_handler(log_file='app.log', max_bytes=5 * 1024 * 1024, backup_count=5):
     file_handler.setFormatter(logging.Formatter(msg, datefmt="%Y-%m-%d %H:%M:%S"))
     return file_handler
 
-def get_logger(name: str, verbosity: str = "INFO", log_file: str = 'app.log') -> logging.Logger:
+def queue_handler(log_file='app.log') -> DeferredQueueHandler:
+    """Get the queue handler shared by every logger, starting its background writer on first use.
+
+    Parameters:
+    - log_file : str : Path of the JSON lines log file, written next to the console output.
+    """
+    global _queue_handler, _queue_listener
+    with _queue_lock:
+        if _queue_handler is None:
+            json_formatter = JsonFormatter()
+            sinks = [logging.StreamHandler(sys.stdout), file_handler(log_file=log_file)]
+            for sink in sinks:
+                sink.setFormatter(json_formatter)
+            _queue_handler = DeferredQueueHandler(queue.Queue(maxsize=LOG_QUEUE_SIZE))
+            _queue_listener = logging.handlers.QueueListener(_queue_handler.queue, *sinks, respect_handler_level=False)
+            _queue_listener.start()
+            atexit.register(_queue_listener.stop)  # flush the pending records on exit
+    return _queue_handler
+
+def get_logger(name: str, verbosity: Optional[str] = None, log_file: str = 'app.log') -> logging.Logger:
     """
     Create or retrieve a logger with console and file handlers.
 
     Parameters:
     - name : str : Name of the logger, typically the module's __name__.
-    - verbosity : str : Logging level, default is 'INFO'.
+    - verbosity : str : Logging level, defaults to the LOG_LEVEL environment variable or 'INFO'.
     - log_file : str : File path for the rotating file handler.
 
     Returns:
@@ -62,19 +187,26 @@ def get_logger(name: str, verbosity: str = "INFO", log_file: str = 'app.log') ->
     logger = logging.getLogger(name)
 
     # Convert verbosity level to uppercase for consistency
-    verbosity = verbosity.upper()
+    verbosity = (verbosity or LOG_LEVEL).upper()
 
     # Only set up handlers if they haven't been added yet
     if not logger.hasHandlers():
         logger.setLevel(LoggerLevels[verbosity].value)
-        
-        # Add console handler
-        logger.addHandler(console_handler())
-        
-        # Add file handler
-        logger.addHandler(file_handler(log_file=log_file))
+
+        if LOG_MODE == "json":
+            # Hand the records to the background writer
+            logger.addHandler(queue_handler(log_file=log_file))
+        else:
+            # Add console handler
+            logger.addHandler(console_handler())
+
+            # Add file handler
+            logger.addHandler(file_handler(log_file=log_file))
+
+        # Rate limit the per-request messages before any formatting happens
+        logger.addFilter(_rate_limit_filter)
 
         # Ensure logs do not propagate to root logger
         logger.propagate = False
 
-    return logger
\ No newline at end of file
+    return logger
@@ -0,0 +1,289 @@
+""" utils/metrics.py
+Metrics, it is used to count requests and time the pipeline
+stages, exported in the Prometheus text format.
+
+Copyright 2026 ktun@
+
+CREATED: 2026-10-17 19:34:12
+MODIFIED: 2026-10-17 19:34:12
+"""
+# -*- coding:utf-8 -*-
+# import the necessary libraries
+import time
+import bisect
+import threading
+import contextvars
+#
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+from utils import get_logger
+
+
+# Setup logger
+logger = get_logger(__name__)
+
+# Latency buckets in seconds, from sub-millisecond stages to slow CPU inference
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# Buckets of the number of detections per image
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 300)
+
+def _format_labels(labelnames: Sequence[str], labelvalues: Tuple[str, ...], extra: str = "") -> str:
+    """Format a Prometheus label set, e.g. ``{stage="decode",le="0.1"}``."""
+    pairs = [f'{name}="{value}"' for name, value in zip(labelnames, labelvalues)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+def _format_value(value: float) -> str:
+    """Format a sample value, integers without a fraction."""
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+class _Metric:
+    """Base of the metric types, one series per label values."""
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: dict) -> Tuple[str, ...]:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def render(self) -> List[str]:
+        """Render the metric in the Prometheus text format."""
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}", *self._render_samples()]
+
+    def _render_samples(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    """A value that only goes up."""
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1.0, **labels) -> None:
+        """Increase the series of the labels by ``amount``."""
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def _render_samples(self) -> List[str]:
+        with self._lock:
+            values = dict(self._values)
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}" for key, value in values.items()]
+
+
+class Gauge(_Metric):
+    """A value that goes up and down, either set directly or read from a callback when rendered."""
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (), callback: Optional[Callable[[], float]] = None):
+        super().__init__(name, documentation, labelnames)
+        self.callback = callback
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def set(self, value: float, **labels) -> None:
+        """Set the series of the labels."""
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def inc(self, amount: float = 1.0, **labels) -> None:
+        """Increase the series of the labels by ``amount``, decrease with a negative amount."""
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def _render_samples(self) -> List[str]:
+        if self.callback is not None:
+            try:
+                return [f"{self.name} {_format_value(self.callback())}"]
+            except Exception as e:
+                logger.error("Gauge %s callback failed: %s", self.name, e)
+                return []
+        with self._lock:
+            values = dict(self._values)
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}" for key, value in values.items()]
+
+
+class Histogram(_Metric):
+    """Observations counted in fixed cumulative buckets, with their sum and count."""
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # Per series: one count per bucket plus the +Inf bucket, the sum and the count
+        self._series: Dict[Tuple[str, ...], list] = {}
+
+    def observe(self, value: float, **labels) -> None:
+        """Count an observation in the series of the labels."""
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def _render_samples(self) -> List[str]:
+        with self._lock:
+            snapshot = {key: (list(counts), total, count) for key, (counts, total, count) in self._series.items()}
+        lines = []
+        for key, (counts, total, count) in snapshot.items():
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                bound_label = 'le="{}"'.format("+Inf" if bound == float("inf") else _format_value(bound))
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, bound_label)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {count}")
+        return lines
+
+
+class MetricsRegistry:
+    def __init__(self):
+        """Initialize the MetricsRegistry class, the metrics served together on one endpoint."""
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def _register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        """Create a counter, or get the one already registered under the name."""
+        return self._register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = (), callback: Optional[Callable[[], float]] = None) -> Gauge:
+        """Create a gauge, or get the one already registered under the name."""
+        return self._register(Gauge(name, documentation, labelnames, callback))
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+        """Create a histogram, or get the one already registered under the name."""
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self) -> str:
+        """
+        Render every metric in the Prometheus text exposition format (version 0.0.4).
+
+        Returns:
+            str: The exposition, served with the ``PROMETHEUS_CONTENT_TYPE`` media type.
+        """
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4"  # the response adds the utf-8 charset
+
+# Metrics of the whole service, the pipeline stages record into them wherever they run
+metrics_registry = MetricsRegistry()
+STAGE_SECONDS = metrics_registry.histogram("yolo_stage_seconds", "Duration of the pipeline stages in seconds.", ("stage",))
+DETECTIONS_PER_IMAGE = metrics_registry.histogram("yolo_detections_per_image", "Number of detections per image.", buckets=COUNT_BUCKETS)
+
+# Stage durations of the current request, read back for its Server-Timing header
+_request_timings: contextvars.ContextVar[Optional[Dict[str, float]]] = contextvars.ContextVar("request_timings", default=None)
+
+def observe_stage(stage: str, seconds: float) -> None:
+    """
+    Record the duration of a stage in the stage histogram and in the timings of the current request.
+
+    Args:
+        stage (str): The stage name, e.g. "decode".
+        seconds (float): The stage duration.
+    """
+    STAGE_SECONDS.observe(seconds, stage=stage)
+    timings = _request_timings.get()
+    if timings is not None:
+        timings[stage] = timings.get(stage, 0.0) + seconds
+
+@contextmanager
+def timed_stage(stage: str) -> Iterator[None]:
+    """Time the body of a ``with`` block as a pipeline stage, see ``observe_stage``."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe_stage(stage, time.perf_counter() - started)
+
+def format_server_timing(timings: Dict[str, float]) -> str:
+    """Format stage durations as a ``Server-Timing`` header value in milliseconds."""
+    return ", ".join(f"{stage};dur={seconds * 1000.0:.2f}" for stage, seconds in timings.items())
+
+
+class MetricsMiddleware:
+    def __init__(self, app, server_timing: bool = False, server_timing_header: str = "x-server-timing"):
+        """
+        Initialize the MetricsMiddleware class, an ASGI middleware counting and timing the HTTP requests.
+
+        Args:
+            app: The wrapped ASGI application.
+            server_timing (bool, optional): Add a ``Server-Timing`` header with the stage durations
+                to every response. Defaults to False.
+            server_timing_header (str, optional): Request header opting a single request into the
+                ``Server-Timing`` header when it is off. Defaults to "x-server-timing".
+        """
+        self.app = app
+        self.server_timing = server_timing
+        self.server_timing_header = server_timing_header.lower().encode("latin-1")
+        self.requests = metrics_registry.counter("yolo_requests_total", "HTTP requests by endpoint and status code.", ("endpoint", "status"))
+        self.errors = metrics_registry.counter("yolo_request_errors_total", "HTTP requests failed with a server error, by endpoint.", ("endpoint",))
+        self.in_flight = metrics_registry.gauge("yolo_requests_in_flight", "HTTP requests currently being served.")
+        self.latency = metrics_registry.histogram("yolo_request_seconds", "Duration of the HTTP requests until the response starts, by endpoint.", ("endpoint",))
+
+    async def __call__(self, scope, receive, send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        timings: Dict[str, float] = {}
+        token = _request_timings.set(timings)
+        scope.setdefault("state", {})["started_at"] = started
+        add_header = self.server_timing or any(name == self.server_timing_header for name, _ in scope.get("headers", ()))
+        status_code = 500
+
+        async def send_with_metrics(message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                self.latency.observe(time.perf_counter() - started, endpoint=self._get_endpoint(scope))
+                if add_header:
+                    timings["total"] = time.perf_counter() - started
+                    headers = list(message.get("headers", ()))
+                    headers.append((b"server-timing", format_server_timing(timings).encode("latin-1")))
+                    message = {**message, "headers": headers}
+            await send(message)
+
+        self.in_flight.inc()
+        try:
+            await self.app(scope, receive, send_with_metrics)
+        finally:
+            self.in_flight.inc(-1)
+            _request_timings.reset(token)
+            endpoint = self._get_endpoint(scope)
+            self.requests.inc(endpoint=endpoint, status=status_code)
+            if status_code >= 500:
+                self.errors.inc(endpoint=endpoint)
+
+    @staticmethod
+    def _get_endpoint(scope) -> str:
+        """Name of the endpoint function the router matched, bounded label values unlike raw paths."""
+        endpoint = scope.get("endpoint")
+        return getattr(endpoint, "__name__", "unmatched")
@@ -0,0 +1,168 @@
+""" utils/quality_controller.py
+Quality Controller, it is used to trade inference quality for latency
+when the service is about to miss its latency target.
+
+Copyright 2026 ktun@
+
+CREATED: 2026-10-17 22:41:09
+MODIFIED: 2026-10-17 22:41:09
+"""
+# -*- coding:utf-8 -*-
+# import the necessary libraries
+import time
+import threading
+import numpy as np
+#
+from collections import deque
+from typing import Callable, Optional, Sequence
+from utils import get_logger
+from utils.metrics import metrics_registry
+
+
+# Setup logger
+logger = get_logger(__name__)
+
+class QualityLevel:
+    """A quality level, the settings left as None keep the request values."""
+    __slots__ = ("index", "name", "image_size", "model", "render")
+
+    def __init__(self, index: int, name: str, image_size: Optional[int] = None, model: Optional[str] = None, render: bool = True):
+        self.index = index
+        self.name = name
+        self.image_size = image_size  # largest model image size
+        self.model = model  # served model of the requests without a model
+        self.render = render  # whether annotated images are rendered at full size
+
+    def to_dict(self) -> dict:
+        """Get the level settings."""
+        return {"index": self.index, "name": self.name, "image_size": self.image_size, "model": self.model, "render": self.render}
+
+
+class QualityController:
+    def __init__(self, levels: Sequence[dict], target_p95_ms: float, max_queue_depth: Optional[int] = None,
+                 queue_depth: Optional[Callable[[], int]] = None, window_seconds: float = 10.0, min_samples: int = 20,
+                 step_up_ratio: float = 0.6, hold_seconds: float = 5.0, evaluate_interval: float = 0.5):
+        """
+        Initialize the QualityController class, stepping through quality levels to hold a p95 latency target.
+
+        The first level is the full quality. The controller steps one level down when the p95 of the
+        inference latencies of the last ``window_seconds`` exceeds ``target_p95_ms``, or when the queue
+        is deeper than ``max_queue_depth``. It steps one level back up once the p95 and the queue depth
+        fall under ``step_up_ratio`` of their limits, or the service is idle. A level is held for at least
+        ``hold_seconds`` and only latencies measured at the current level are counted.
+
+        Args:
+            levels (Sequence[dict]): The quality levels from best to cheapest, the keyword arguments of ``QualityLevel``
+                without the index.
+            target_p95_ms (float): The p95 inference latency to hold.
+            max_queue_depth (int, optional): Queue depth at which the controller steps down however fast
+                the inference is, None to only watch the latency. Defaults to None.
+            queue_depth (Callable[[], int], optional): Returns the current queue depth. Defaults to None.
+            window_seconds (float, optional): Age of the latencies the p95 is computed from. Defaults to 10.
+            min_samples (int, optional): Latencies needed before the p95 is trusted. Defaults to 20.
+            step_up_ratio (float, optional): Share of the limits the load has to fall under to step up. Defaults to 0.6.
+            hold_seconds (float, optional): Time a level is kept before the next step. Defaults to 5.
+            evaluate_interval (float, optional): Time between two evaluations of the load. Defaults to 0.5.
+        """
+        if not levels:
+            raise ValueError("At least one quality level is required")
+        self.levels = [QualityLevel(index, **level) for index, level in enumerate(levels)]
+        self.target_p95_ms = target_p95_ms
+        self.max_queue_depth = max_queue_depth
+        self.queue_depth = queue_depth
+        self.window_seconds = window_seconds
+        self.min_samples = min_samples
+        self.step_up_ratio = step_up_ratio
+        self.hold_seconds = hold_seconds
+        self.evaluate_interval = evaluate_interval
+        self._index = 0
+        self._samples: deque = deque()  # (time, milliseconds) at the current level
+        self._lock = threading.Lock()
+        self._changed_at = float("-inf")
+        self._evaluated_at = float("-inf")
+        self._p95_ms = None
+        self._served = [0] * len(self.levels)
+        self._changes = metrics_registry.counter("yolo_quality_level_changes_total", "Quality level changes by direction.", ("direction",))
+        metrics_registry.gauge("yolo_quality_level", "Index of the current quality level, 0 is the full quality.", callback=lambda: self._index)
+        logger.info("QualityController initialized with %d levels and a %.0f ms p95 target . . .", len(self.levels), target_p95_ms)
+
+    @property
+    def level(self) -> QualityLevel:
+        """The current quality level."""
+        return self.levels[self._index]
+
+    def acquire(self) -> QualityLevel:
+        """
+        Get the level serving a new request, re-evaluating the load when it is due.
+
+        Returns:
+            QualityLevel: The current quality level.
+        """
+        now = time.monotonic()
+        with self._lock:
+            if now - self._evaluated_at >= self.evaluate_interval:
+                self._evaluate(now)
+            self._served[self._index] += 1
+            return self.levels[self._index]
+
+    def observe(self, seconds: float) -> None:
+        """
+        Record the latency of an inference.
+
+        Args:
+            seconds (float): Time from the submission of the image to its detections.
+        """
+        now = time.monotonic()
+        with self._lock:
+            self._samples.append((now, seconds * 1000.0))
+            if now - self._evaluated_at >= self.evaluate_interval:
+                self._evaluate(now)
+
+    def _evaluate(self, now: float) -> None:
+        """Step the level down or up when the load calls for it, the lock must be held."""
+        self._evaluated_at = now
+        while self._samples and now - self._samples[0][0] > self.window_seconds:
+            self._samples.popleft()
+        self._p95_ms = float(np.percentile([ms for _, ms in self._samples], 95)) if self._samples else None
+        if now - self._changed_at < self.hold_seconds:
+            return
+
+        depth = self.queue_depth() if self.queue_depth is not None else 0
+        trusted = len(self._samples) >= self.min_samples
+        queue_full = self.max_queue_depth is not None and depth > self.max_queue_depth
+        if self._index < len(self.levels) - 1 and (queue_full or (trusted and self._p95_ms > self.target_p95_ms)):
+            self._step(+1, now, depth)
+            return
+
+        queue_low = self.max_queue_depth is None or depth <= self.max_queue_depth * self.step_up_ratio
+        idle = not self._samples and depth == 0 and now - self._changed_at >= self.window_seconds
+        latency_low = (trusted and self._p95_ms < self.target_p95_ms * self.step_up_ratio) or idle
+        if self._index > 0 and queue_low and latency_low:
+            self._step(-1, now, depth)
+
+    def _step(self, step: int, now: float, depth: int) -> None:
+        """Move to the next level, the lock must be held."""
+        previous = self.levels[self._index]
+        self._index += step
+        p95_ms = "-" if self._p95_ms is None else f"{self._p95_ms:.0f} ms"
+        logger.warning("Quality level changed from '%s' to '%s' (p95 %s, target %.0f ms, queue depth %d).",
+                       previous.name, self.levels[self._index].name, p95_ms, self.target_p95_ms, depth)
+        self._changes.inc(direction="down" if step > 0 else "up")
+        self._changed_at = now
+        self._samples.clear()  # the latencies of the previous level say nothing about this one
+
+    def get_stats(self) -> dict:
+        """
+        Get the controller state.
+
+        Returns:
+            dict: The current level, the last p95, the target and the requests served at every level.
+        """
+        with self._lock:
+            return {
+                "level": self.levels[self._index].to_dict(),
+                "p95_ms": self._p95_ms,
+                "target_p95_ms": self.target_p95_ms,
+                "samples": len(self._samples),
+                "served": {level.name: served for level, served in zip(self.levels, self._served)},
+            }
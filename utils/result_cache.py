@@ -0,0 +1,161 @@
+""" utils/result_cache.py
+Result Cache, it is used to reuse the detections and annotated
+images of uploads that were already processed.
+
+Copyright 2026 ktun@
+
+CREATED: 2026-10-17 12:31:26
+MODIFIED: 2026-10-17 23:59:05
+"""
+# -*- coding:utf-8 -*-
+# import the necessary libraries
+import time
+import hashlib
+import threading
+#
+from collections import OrderedDict
+from typing import Any, BinaryIO, Optional, Union
+from utils import get_logger
+
+
+# Setup logger
+logger = get_logger(__name__)
+
+# Fixed bookkeeping cost charged to every entry on top of its payload
+ENTRY_OVERHEAD_BYTES = 256
+
+class _CacheEntry:
+    """A cached value with its size and expiry time."""
+    __slots__ = ("value", "nbytes", "expires_at")
+
+    def __init__(self, value: Any, nbytes: int, expires_at: float):
+        self.value = value
+        self.nbytes = nbytes
+        self.expires_at = expires_at
+
+
+class ResultCache:
+    def __init__(self, max_bytes: int = 64 * 1024 * 1024, ttl_seconds: float = 300.0):
+        """
+        Initialize the ResultCache class, a content-addressed LRU cache.
+
+        Args:
+            max_bytes (int, optional): Memory budget of all entries, least recently used entries
+                are evicted beyond it. Defaults to 64 MiB.
+            ttl_seconds (float, optional): Time an entry stays valid after it was stored. Defaults to 300.
+        """
+        self.max_bytes = max_bytes
+        self.ttl = ttl_seconds
+        self._entries: "OrderedDict[tuple, _CacheEntry]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._nbytes = 0
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._expirations = 0
+        logger.info("ResultCache initialized with %d bytes budget and %.0f s TTL . . .", max_bytes, ttl_seconds)
+
+    @staticmethod
+    def make_key(binary_image: Union[bytes, BinaryIO], **params) -> str:
+        """
+        Build the cache key of an upload.
+
+        Args:
+            binary_image (Union[bytes, BinaryIO]): The uploaded image bytes, or a binary file holding them,
+                hashed chunk by chunk.
+            **params: Inference parameters that change the result (imgsz, conf, augment, model, ...).
+
+        Returns:
+            str: Hex digest of the bytes and the sorted parameters.
+        """
+        if isinstance(binary_image, (bytes, bytearray, memoryview)):
+            digest = hashlib.blake2b(binary_image, digest_size=20)
+        else:
+            digest = hashlib.blake2b(digest_size=20)
+            binary_image.seek(0)
+            for chunk in iter(lambda: binary_image.read(1024 * 1024), b""):
+                digest.update(chunk)
+        digest.update(repr(sorted(params.items())).encode("utf-8"))
+        return digest.hexdigest()
+
+    def get(self, key: str, kind: str = "detections", count: bool = True) -> Optional[Any]:
+        """
+        Look up a cached value.
+
+        Args:
+            key (str): The key built by ``make_key``.
+            kind (str, optional): The kind of value, e.g. ``"detections"`` or ``"image"``. Defaults to "detections".
+            count (bool, optional): Count the lookup as a hit or a miss, False for the extra lookups of a
+                request already counted by another one. Defaults to True.
+
+        Returns:
+            Optional[Any]: The cached value, or None on a miss.
+        """
+        with self._lock:
+            entry = self._entries.get((key, kind))
+            if entry is not None and entry.expires_at <= time.monotonic():
+                self._drop((key, kind))
+                self._expirations += 1
+                entry = None
+            if entry is None:
+                self._misses += count
+                return None
+            self._entries.move_to_end((key, kind))
+            self._hits += count
+            return entry.value
+
+    def put(self, key: str, value: Any, nbytes: int, kind: str = "detections") -> None:
+        """
+        Store a value, evicting least recently used entries beyond the memory budget.
+
+        Args:
+            key (str): The key built by ``make_key``.
+            value (Any): The value to cache.
+            nbytes (int): Size of the value in bytes.
+            kind (str, optional): The kind of value, e.g. ``"detections"`` or ``"image"``. Defaults to "detections".
+        """
+        nbytes += ENTRY_OVERHEAD_BYTES
+        if nbytes > self.max_bytes:
+            logger.debug("Value of %d bytes exceeds the cache budget, not cached.", nbytes)
+            return
+        with self._lock:
+            self._drop((key, kind))
+            self._entries[(key, kind)] = _CacheEntry(value, nbytes, time.monotonic() + self.ttl)
+            self._nbytes += nbytes
+            while self._nbytes > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._drop(oldest)
+                self._evictions += 1
+
+    def clear(self) -> None:
+        """Remove every entry."""
+        with self._lock:
+            self._entries.clear()
+            self._nbytes = 0
+
+    def _drop(self, entry_key: tuple) -> None:
+        """Remove an entry, the lock must be held."""
+        entry = self._entries.pop(entry_key, None)
+        if entry is not None:
+            self._nbytes -= entry.nbytes
+
+    def get_stats(self) -> dict:
+        """
+        Get the cache counters.
+
+        Returns:
+            dict: Occupancy, hit/miss/eviction/expiration counts and the hit ratio.
+        """
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._nbytes,
+                "max_bytes": self.max_bytes,
+                "ttl_seconds": self.ttl,
+                "hits": self._hits,
+                "misses": self._misses,
+                "evictions": self._evictions,
+                "expirations": self._expirations,
+                "hit_ratio": self._hits / lookups if lookups else 0.0,
+            }
@@ -0,0 +1,85 @@
+""" utils/startup.py
+Startup Tracker, it is used to time the startup phases
+of the service and to report its readiness.
+
+Copyright 2026 ktun@
+
+CREATED: 2026-10-17 18:58:40
+MODIFIED: 2026-10-17 18:58:40
+"""
+# -*- coding:utf-8 -*-
+# import the necessary libraries
+import time
+import threading
+#
+from typing import Dict, Optional
+from utils import get_logger
+
+
+# Setup logger
+logger = get_logger(__name__)
+
+class StartupTracker:
+    def __init__(self):
+        """
+        Initialize the StartupTracker class, the clock of the startup phases starts here.
+
+        Phases are recorded in the order they end, each one lasting from the end of the
+        previous phase, so together they cover the whole time to readiness.
+        """
+        self._lock = threading.Lock()
+        self._started_at = time.perf_counter()
+        self._last_mark = self._started_at
+        self._phases: Dict[str, float] = {}
+        self._ready_after: Optional[float] = None
+        self._error: Optional[str] = None
+
+    @property
+    def ready(self) -> bool:
+        """Whether the service finished its startup and can take traffic."""
+        return self._ready_after is not None
+
+    def mark(self, phase: str) -> float:
+        """
+        End a startup phase.
+
+        Args:
+            phase (str): Name of the phase that just ended.
+
+        Returns:
+            float: Duration of the phase in seconds.
+        """
+        with self._lock:
+            now = time.perf_counter()
+            duration = now - self._last_mark
+            self._phases[phase] = duration
+            self._last_mark = now
+        logger.info("Startup phase '%s' finished in %.3f s.", phase, duration)
+        return duration
+
+    def mark_ready(self) -> None:
+        """Mark the service ready, after its last startup phase."""
+        with self._lock:
+            self._ready_after = time.perf_counter() - self._started_at
+        logger.info("Service ready %.3f s after startup began.", self._ready_after)
+
+    def mark_failed(self, error: Exception) -> None:
+        """Record why the background startup phase failed, the service never becomes ready."""
+        with self._lock:
+            self._error = str(error)
+        logger.error("Startup failed: %s", error)
+
+    def get_stats(self) -> dict:
+        """
+        Get the readiness and the startup phase durations.
+
+        Returns:
+            dict: Readiness, seconds to readiness, the phase durations in seconds and the startup error.
+        """
+        with self._lock:
+            return {
+                "ready": self._ready_after is not None,
+                "ready_after_seconds": round(self._ready_after, 3) if self._ready_after is not None else None,
+                "phases": {phase: round(duration, 3) for phase, duration in self._phases.items()},
+                "error": self._error,
+            }
@@ -0,0 +1,124 @@
+""" utils/tensor_input.py
+Tensor Input, it is used to wrap decoded pixel buffers sent by
+upstream services as arrays, without decoding or copying them.
+
+Copyright 2026 ktun@
+
+CREATED: 2026-10-17 23:02:51
+MODIFIED: 2026-10-17 23:02:51
+"""
+# -*- coding:utf-8 -*-
+# import the necessary libraries
+import io
+import re
+import math
+import numpy as np
+#
+from numpy.lib import format as npy_format
+from typing import Optional, Tuple
+from utils import get_logger
+
+
+# Setup logger
+logger = get_logger(__name__)
+
+# Media type of the .npy bodies, any other body is a raw buffer described by headers
+NPY_MEDIA_TYPE = "application/x-npy"
+# Pixel types and channel orders accepted from the callers
+TENSOR_DTYPES = ("uint8",)
+TENSOR_CHANNEL_ORDERS = ("RGB", "BGR")
+
+def parse_tensor_shape(shape: str) -> Tuple[int, ...]:
+    """
+    Parse a shape header, e.g. ``480,640,3`` or ``480x640x3``.
+
+    Args:
+        shape (str): The header value.
+
+    Returns:
+        Tuple[int, ...]: The shape.
+
+    Raises:
+        ValueError: If the value is not a list of positive integers.
+    """
+    if not re.fullmatch(r"\s*\d+(\s*[,x]\s*\d+)*\s*", shape or ""):
+        raise ValueError(f"Invalid tensor shape '{shape}', expected e.g. 480,640,3")
+    return tuple(int(value) for value in re.split(r"[,x]", shape.replace(" ", "")))
+
+def wrap_npy(buffer: bytes) -> np.ndarray:
+    """
+    Wrap the array of a .npy file held in memory, without copying its data.
+
+    Args:
+        buffer (bytes): The .npy file content.
+
+    Returns:
+        np.ndarray: A read-only view of the array data inside ``buffer``.
+
+    Raises:
+        ValueError: If the buffer is not a .npy file or its data is truncated.
+    """
+    stream = io.BytesIO(buffer)  # shares the bytes until written to
+    version = npy_format.read_magic(stream)
+    read_header = npy_format.read_array_header_1_0 if version == (1, 0) else npy_format.read_array_header_2_0
+    shape, fortran_order, dtype = read_header(stream)
+    if dtype.hasobject:
+        raise ValueError("Object arrays are not accepted")
+    count = math.prod(shape)
+    if len(buffer) - stream.tell() < count * dtype.itemsize:
+        raise ValueError(f"Truncated .npy data, {shape} {dtype} needs {count * dtype.itemsize} bytes")
+    array = np.frombuffer(buffer, dtype=dtype, count=count, offset=stream.tell())
+    return array.reshape(shape, order="F" if fortran_order else "C")
+
+def wrap_raw_tensor(buffer: bytes, shape: Tuple[int, ...], dtype: str = "uint8") -> np.ndarray:
+    """
+    Wrap a raw C-ordered pixel buffer, without copying it.
+
+    Args:
+        buffer (bytes): The pixel data.
+        shape (Tuple[int, ...]): Shape of the array.
+        dtype (str, optional): Type of the values, one of ``TENSOR_DTYPES``. Defaults to "uint8".
+
+    Returns:
+        np.ndarray: A read-only view of ``buffer``.
+
+    Raises:
+        ValueError: If the type is not supported or the size does not match the shape.
+    """
+    if dtype not in TENSOR_DTYPES:
+        raise ValueError(f"Unsupported tensor dtype '{dtype}', expected one of {list(TENSOR_DTYPES)}")
+    expected = math.prod(shape) * np.dtype(dtype).itemsize
+    if len(buffer) != expected:
+        raise ValueError(f"Body of {len(buffer)} bytes does not match the {shape} {dtype} tensor of {expected} bytes")
+    return np.frombuffer(buffer, dtype=dtype).reshape(shape)
+
+def read_frame_tensor(buffer: bytes, media_type: str, shape: Optional[str] = None, dtype: str = "uint8", channels: str = "RGB") -> np.ndarray:
+    """
+    Read an HxWx3 uint8 frame sent as a .npy file or as a raw buffer, as a zero-copy RGB view.
+
+    Args:
+        buffer (bytes): The request body.
+        media_type (str): The body media type, ``NPY_MEDIA_TYPE`` for a .npy file.
+        shape (str, optional): Shape header of the raw buffers, see ``parse_tensor_shape``. Defaults to None.
+        dtype (str, optional): Type header of the raw buffers. Defaults to "uint8".
+        channels (str, optional): Channel order of the frame, one of ``TENSOR_CHANNEL_ORDERS``. Defaults to "RGB".
+
+    Returns:
+        np.ndarray: The frame in RGB order, BGR frames are returned as a channel-reversed view.
+
+    Raises:
+        ValueError: If the body is not an HxWx3 uint8 frame.
+    """
+    channels = channels.upper()
+    if channels not in TENSOR_CHANNEL_ORDERS:
+        raise ValueError(f"Unsupported channel order '{channels}', expected one of {list(TENSOR_CHANNEL_ORDERS)}")
+    if media_type == NPY_MEDIA_TYPE:
+        frame = wrap_npy(buffer)
+    elif shape is None:
+        raise ValueError(f"Raw tensors need a shape header, or send a .npy file as {NPY_MEDIA_TYPE}")
+    else:
+        frame = wrap_raw_tensor(buffer, parse_tensor_shape(shape), dtype.lower())
+    if frame.dtype != np.uint8 or frame.ndim != 3 or frame.shape[2] != 3 or 0 in frame.shape:
+        raise ValueError(f"Expected an HxWx3 uint8 frame, got {frame.shape} {frame.dtype}")
+    logger.debug("Frame tensor of shape %s wrapped without copy.", frame.shape)
+    return frame[..., ::-1] if channels == "BGR" else frame
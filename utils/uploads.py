@@ -0,0 +1,205 @@
+""" utils/uploads.py
+Uploads, it is used to cap the size of the request bodies while
+they stream in and to spool raw bodies and multipart files to disk.
+
+Copyright 2026 ktun@
+
+CREATED: 2026-10-17 21:55:47
+MODIFIED: 2026-10-17 23:59:40
+"""
+# -*- coding:utf-8 -*-
+# import the necessary libraries
+import json
+import tempfile
+#
+from typing import Dict, List, Optional
+from multipart.multipart import MultipartParser, parse_options_header
+from starlette.requests import ClientDisconnect, Request
+from starlette.datastructures import Headers, UploadFile
+from starlette.concurrency import run_in_threadpool
+from utils import get_logger
+from utils.metrics import metrics_registry
+
+
+# Setup logger
+logger = get_logger(__name__)
+
+class UploadLimitMiddleware:
+    def __init__(self, app, max_bytes: int, path_limits: Optional[Dict[str, Optional[int]]] = None):
+        """
+        Initialize the UploadLimitMiddleware class, an ASGI middleware capping the request body size.
+
+        A request declaring a larger ``Content-Length`` is rejected with 413 before its body is
+        read. Bodies without one are counted while they stream in, and the request is answered
+        with 413 as soon as the limit is crossed, so a huge upload is never fully received.
+
+        Args:
+            app: The wrapped ASGI application.
+            max_bytes (int): Upload limit of every path without its own limit.
+            path_limits (Dict[str, Optional[int]], optional): Upload limits by request path, None for no limit. Defaults to None.
+        """
+        self.app = app
+        self.max_bytes = max_bytes
+        self.path_limits = dict(path_limits or {})
+        self.rejected = metrics_registry.counter("yolo_uploads_rejected_total", "Requests rejected for a body larger than the upload limit.")
+        logger.info("UploadLimitMiddleware initialized with a %d bytes limit and path limits %s . . .", max_bytes, self.path_limits)
+
+    def get_limit(self, path: str) -> Optional[int]:
+        """Upload limit of a request path, None for no limit."""
+        return self.path_limits.get(path, self.max_bytes)
+
+    async def __call__(self, scope, receive, send) -> None:
+        limit = self.get_limit(scope["path"]) if scope["type"] == "http" else None
+        if limit is None:
+            await self.app(scope, receive, send)
+            return
+
+        content_length = dict(scope.get("headers", ())).get(b"content-length")
+        if content_length is not None and content_length.isdigit() and int(content_length) > limit:
+            await self._reject(send, limit)
+            return
+
+        received = 0
+        response_started = False
+        rejected = False
+
+        async def receive_with_limit():
+            nonlocal received, rejected
+            if rejected:
+                return {"type": "http.disconnect"}
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > limit:
+                    # Answer now and end the body, the application sees a disconnected client
+                    rejected = True
+                    if not response_started:
+                        await self._reject(send, limit)
+                    return {"type": "http.disconnect"}
+            return message
+
+        async def send_unless_rejected(message) -> None:
+            nonlocal response_started
+            if rejected:  # the 413 was already sent
+                return
+            if message["type"] == "http.response.start":
+                response_started = True
+            await send(message)
+
+        try:
+            await self.app(scope, receive_with_limit, send_unless_rejected)
+        except ClientDisconnect:
+            if not rejected:
+                raise
+
+    async def _reject(self, send, limit: int) -> None:
+        """Send the 413 response."""
+        self.rejected.inc()
+        logger.warning("Upload rejected, larger than the limit of %d bytes.", limit)
+        body = json.dumps({"detail": f"Upload larger than the limit of {limit} bytes"}).encode("utf-8")
+        await send({
+            "type": "http.response.start",
+            "status": 413,
+            "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode("ascii")), (b"connection", b"close")],
+        })
+        await send({"type": "http.response.body", "body": body})
+
+
+async def write_spooled(spooled_file: tempfile.SpooledTemporaryFile, chunk: bytes) -> None:
+    """Append a chunk to a spooled file, off the event loop once the file was rolled over to disk."""
+    if spooled_file.name is not None:  # only the rolled over file has a name
+        await run_in_threadpool(spooled_file.write, chunk)
+    else:
+        spooled_file.write(chunk)
+
+
+async def spool_request_body(request: Request, max_memory_bytes: int = 1024 * 1024) -> tempfile.SpooledTemporaryFile:
+    """
+    Stream a raw request body into a temporary file, kept in memory up to ``max_memory_bytes`` and on disk beyond.
+
+    Args:
+        request (Request): The request, its body is consumed.
+        max_memory_bytes (int, optional): Body size above which the file rolls over to disk. Defaults to 1 MiB.
+
+    Returns:
+        tempfile.SpooledTemporaryFile: The body, positioned at its start. The caller closes it.
+    """
+    spooled_file = tempfile.SpooledTemporaryFile(max_size=max_memory_bytes)
+    try:
+        async for chunk in request.stream():
+            await write_spooled(spooled_file, chunk)
+        spooled_file.seek(0)
+    except BaseException:
+        spooled_file.close()
+        raise
+    return spooled_file
+
+
+async def parse_multipart_files(request: Request, field_name: str, max_memory_bytes: int = 1024 * 1024) -> List[UploadFile]:
+    """
+    Parse the files of a ``multipart/form-data`` body, each kept in memory up to ``max_memory_bytes`` and on disk beyond.
+
+    Starlette spools every uploaded file with the same fixed threshold, so the routes holding many
+    files at once parse their body here instead of declaring ``UploadFile`` parameters.
+
+    Args:
+        request (Request): The request, its body is consumed.
+        field_name (str): Form field of the files, the other fields are ignored.
+        max_memory_bytes (int, optional): File size above which a file rolls over to disk. Defaults to 1 MiB.
+
+    Returns:
+        List[UploadFile]: The files in body order, positioned at their start. The caller closes them.
+
+    Raises:
+        ValueError: If the body is not ``multipart/form-data``.
+    """
+    content_type, options = parse_options_header(request.headers.get("content-type", ""))
+    if content_type != b"multipart/form-data" or b"boundary" not in options:
+        raise ValueError("Expected a multipart/form-data body")
+
+    events = []
+
+    def collect(kind: str):
+        def callback(data: bytes = b"", start: int = 0, end: int = 0) -> None:
+            events.append((kind, bytes(data[start:end])))
+        return callback
+
+    kinds = ("part_begin", "part_data", "part_end", "header_field", "header_value", "header_end", "headers_finished")
+    parser = MultipartParser(options[b"boundary"], {f"on_{kind}": collect(kind) for kind in kinds})
+    files: List[UploadFile] = []
+    headers, header_field, header_value, current = [], b"", b"", None
+    try:
+        async for chunk in request.stream():
+            parser.write(chunk)
+            for kind, data in events:
+                if kind == "part_begin":
+                    headers, current = [], None
+                elif kind == "header_field":
+                    header_field += data
+                elif kind == "header_value":
+                    header_value += data
+                elif kind == "header_end":
+                    headers.append((header_field.lower(), header_value))
+                    header_field, header_value = b"", b""
+                elif kind == "headers_finished":
+                    _, disposition = parse_options_header(dict(headers).get(b"content-disposition", b""))
+                    if disposition.get(b"name", b"").decode("utf-8", "replace") == field_name and b"filename" in disposition:
+                        current = UploadFile(
+                            disposition[b"filename"].decode("utf-8", "replace"),
+                            file=tempfile.SpooledTemporaryFile(max_size=max_memory_bytes),
+                            content_type=dict(headers).get(b"content-type", b"").decode("latin-1"),
+                            headers=Headers(raw=headers),
+                        )
+                        files.append(current)
+                elif kind == "part_data" and current is not None:
+                    await write_spooled(current.file, data)
+                elif kind == "part_end" and current is not None:
+                    current.file.seek(0)
+            events.clear()
+        parser.finalize()
+    except BaseException:
+        for upload in files:
+            upload.file.close()
+        raise
+    logger.debug("Parsed %d uploaded files of field '%s'.", len(files), field_name)
+    return files
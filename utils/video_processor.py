@@ -0,0 +1,215 @@
+""" utils/video_processor.py
+Video processor, it is used to lazily decode frames of videos
+and MJPEG streams and to build MJPEG responses.
+
+Copyright 2026 ktun@
+
+CREATED: 2026-10-17 13:20:48
+MODIFIED: 2026-10-17 23:37:14
+"""
+# -*- coding:utf-8 -*-
+# import the necessary libraries
+import os
+import shutil
+import tempfile
+#
+from PIL import Image
+from typing import BinaryIO, Iterator, List, Optional, Tuple
+from utils import get_logger
+
+
+# Setup logger
+logger = get_logger(__name__)
+
+# JPEG start and end of image markers
+JPEG_SOI = b"\xff\xd8"
+JPEG_EOI = b"\xff\xd9"
+
+def find_scan_data(buffer: bytearray) -> Optional[int]:
+    """Find the entropy coded data of the JPEG starting the buffer, skipping the header segments by their lengths
+
+    The segments before the scan, e.g. the EXIF thumbnail of an APP1 segment, may hold end of
+    image markers of their own, so the end of the frame is only searched from the scan on.
+
+    Args:
+        buffer (bytearray): Bytes starting with the start of image marker
+
+    Returns:
+        Optional[int]: Offset of the scan data, None when the headers are incomplete, -1 when they are malformed
+    """
+    position = 2
+    while position + 4 <= len(buffer):
+        if buffer[position] != 0xFF:
+            return -1
+        marker = buffer[position + 1]
+        if marker == 0xFF:  # fill byte
+            position += 1
+            continue
+        if 0xD0 <= marker <= 0xD7 or marker == 0x01:  # markers without a segment
+            position += 2
+            continue
+        if marker in (0xD8, 0xD9):
+            return -1
+        length = int.from_bytes(buffer[position + 2:position + 4], "big")
+        if length < 2:
+            return -1
+        position += 2 + length
+        if marker == 0xDA:  # start of scan
+            return position
+    return None
+
+
+class MjpegParser:
+    def __init__(self, max_frame_bytes: int = 16 * 1024 * 1024):
+        """
+        Initialize the MjpegParser class, an incremental splitter of MJPEG byte streams.
+
+        Works on ``multipart/x-mixed-replace`` bodies as well as on plainly concatenated
+        JPEGs, since frames are found by their start/end of image markers.
+
+        Args:
+            max_frame_bytes (int, optional): Largest frame accepted, bounds the parser buffer. Defaults to 16 MiB.
+        """
+        self.max_frame_bytes = max_frame_bytes
+        self._buffer = bytearray()
+        self._scan_from = 0  # where to resume the end marker search of a partial frame, 0 before its scan is found
+
+    def feed(self, chunk: bytes) -> List[bytes]:
+        """
+        Add a chunk of the stream and return the frames it completed.
+
+        Args:
+            chunk (bytes): The next bytes of the stream.
+
+        Returns:
+            List[bytes]: The complete JPEG frames found so far, in stream order.
+
+        Raises:
+            ValueError: If a frame grows beyond ``max_frame_bytes``.
+        """
+        self._buffer += chunk
+        frames = []
+        while True:
+            start = self._buffer.find(JPEG_SOI)
+            if start < 0:
+                # Keep a trailing 0xFF, it may be the first half of the next marker
+                del self._buffer[:max(len(self._buffer) - 1, 0)]
+                break
+            del self._buffer[:start]
+            if not self._scan_from:
+                scan = find_scan_data(self._buffer)
+                if scan is not None and scan < 0:
+                    del self._buffer[:2]  # not a JPEG, look for the next start of image
+                    continue
+                self._scan_from = scan or 0
+            end = self._buffer.find(JPEG_EOI, self._scan_from) if self._scan_from else -1
+            if end < 0:
+                if self._scan_from:
+                    self._scan_from = max(self._scan_from, len(self._buffer) - 1)
+                if len(self._buffer) > self.max_frame_bytes:
+                    raise ValueError(f"MJPEG frame exceeds {self.max_frame_bytes} bytes")
+                break
+            frames.append(bytes(self._buffer[:end + 2]))
+            del self._buffer[:end + 2]
+            self._scan_from = 0
+        return frames
+
+
+class VideoProcessor:
+    def __init__(self):
+        """ Initialize the VideoProcessor class."""
+        logger.info("VideoProcessor initialized . . .")
+
+    def spool_to_file(self, fileobj: BinaryIO, suffix: str = "") -> str:
+        """Copy an uploaded video to a named temporary file, which the video decoder needs
+
+        Args:
+            fileobj (BinaryIO): The uploaded file object
+            suffix (str, optional): Suffix of the temporary file, e.g. the video extension. Defaults to "".
+
+        Returns:
+            str: Path of the temporary file, the caller removes it
+        """
+        fileobj.seek(0)
+        with tempfile.NamedTemporaryFile(suffix=suffix, delete=False) as video_file:
+            shutil.copyfileobj(fileobj, video_file, length=1024 * 1024)
+        logger.info("Video spooled to '%s'.", video_file.name)
+        return video_file.name
+
+    def open_video(self, video_path: str):
+        """Open a video file for decoding, so an unreadable video is caught before any response is sent
+
+        Args:
+            video_path (str): Path of the video file
+
+        Returns:
+            cv2.VideoCapture: The opened capture, released by ``iter_video_frames`` or by the caller
+
+        Raises:
+            ValueError: If the video can not be opened
+        """
+        import cv2  # imported lazily, only the video endpoint needs OpenCV
+
+        capture = cv2.VideoCapture(video_path)
+        if not capture.isOpened():
+            capture.release()
+            raise ValueError("Video can not be opened")
+        return capture
+
+    def iter_video_frames(self, capture, stride: int = 1, target_fps: Optional[float] = None) -> Iterator[Tuple[int, float, Image.Image]]:
+        """Lazily decode the frames of a video, one frame at a time
+
+        Skipped frames are only grabbed, not decoded to pixels.
+
+        Args:
+            capture (cv2.VideoCapture): The video, from ``open_video``
+            stride (int, optional): Keep every n-th frame. Defaults to 1.
+            target_fps (float, optional): Keep frames at about this rate, overrides ``stride``. Defaults to None.
+
+        Yields:
+            Tuple[int, float, Image.Image]: Frame index, timestamp in seconds and the frame in PIL RGB format
+        """
+        import cv2
+
+        try:
+            source_fps = capture.get(cv2.CAP_PROP_FPS) or 0.0
+            if target_fps and source_fps > 0:
+                stride = max(1, round(source_fps / target_fps))
+            stride = max(1, int(stride))
+            logger.info("Decoding video at %.2f fps with frame stride %d.", source_fps, stride)
+
+            frame_index = 0
+            while capture.grab():
+                if frame_index % stride == 0:
+                    ok, frame = capture.retrieve()
+                    if not ok:
+                        break
+                    timestamp = frame_index / source_fps if source_fps > 0 else capture.get(cv2.CAP_PROP_POS_MSEC) / 1000.0
+                    yield frame_index, timestamp, Image.fromarray(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB))
+                frame_index += 1
+        finally:
+            capture.release()
+
+    def remove_file(self, path: str) -> None:
+        """Remove a temporary file, ignoring files that are already gone
+
+        Args:
+            path (str): Path of the file
+        """
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+    def get_mjpeg_part(self, jpeg_bytes: bytes, boundary: str = "frame") -> bytes:
+        """Wrap an encoded JPEG as one part of a ``multipart/x-mixed-replace`` stream
+
+        Args:
+            jpeg_bytes (bytes): The encoded JPEG
+            boundary (str, optional): The multipart boundary. Defaults to "frame".
+
+        Returns:
+            bytes: The part, boundary and headers included
+        """
+        header = f"--{boundary}\r\nContent-Type: image/jpeg\r\nContent-Length: {len(jpeg_bytes)}\r\n\r\n"
+        return header.encode("ascii") + jpeg_bytes + b"\r\n"
@@ -5,93 +5,144 @@ according to detection results by the model.
 Copyright 2024 ktun@
 
 CREATED: 2024-11-12 22:23:43
-MODIFIED: 2024-11-13 15:37:38
+MODIFIED: 2026-10-17 23:49:16
 """
 # -*- coding:utf-8 -*-
 # import the necessary libraries
-import random
-import pandas as pd
+import zlib
+import colorsys
+import numpy as np
 #
+from typing import Dict, Optional, Tuple
 from PIL import Image, ImageDraw, ImageFont
 from utils import get_logger
+from utils.detections import Detections
+from utils.metrics import timed_stage
 
 
 # Setup logger
 logger = get_logger(__name__)
 
 class Visualizer:
-    def __init__(self):
-        """ Initialize the Visualizer class."""
+    def __init__(self, class_names: Optional[np.ndarray] = None):
+        """ Initialize the Visualizer class.
+
+        Args:
+            class_names (np.ndarray, optional): Class-id to class-name table to build the color
+                table for up front, other tables are handled on first use. Defaults to None.
+        """
+        self.font = ImageFont.load_default()  # Default font; customize if necessary
+        self._palettes: Dict[Tuple[str, ...], list] = {}
+        self._label_tiles: Dict[Tuple[str, tuple], Image.Image] = {}
+        if class_names is not None:
+            self._get_palette(class_names)
         logger.info("[INFO] Visualizer initialized . . .")
-        
+
     def _generate_class_color(self, class_name: str) -> tuple:
         """
         Generate a unique color for each class based on its name using hashing.
-        
+
+        A CRC32 of the name picks the hue, so a class gets the same color in every
+        worker process, unlike the salted built-in ``hash``.
+
         Args:
             class_name (str): The name of the detected class.
-        
+
         Returns:
             tuple: An (R, G, B) color tuple for the class.
         """
-        logger.debug("Generating color for class: %s", class_name)
-        # Use a hash of the class name to generate a unique color
-        random.seed(hash(class_name) % 255)  # Ensure the same class always gets the same color
-        color = (random.randint(0, 255), random.randint(0, 255), random.randint(0, 255))
-        logger.debug("Generated color for class '%s': %s", class_name, color)
-        return color
-
-    def draw_bounding_boxes(self, image: Image.Image, predictions: pd.DataFrame) -> Image.Image:
+        hue = zlib.crc32(str(class_name).encode("utf-8")) / 0xFFFFFFFF
+        red, green, blue = colorsys.hsv_to_rgb(hue, 0.75, 0.9)
+        return (int(red * 255), int(green * 255), int(blue * 255))
+
+    def _get_palette(self, class_names: np.ndarray) -> list:
+        """
+        Get the color table of a class-id to class-name table, building it on first use.
+
+        Args:
+            class_names (np.ndarray): The class-id to class-name table of the detections.
+
+        Returns:
+            list: The (R, G, B) color of every class id.
+        """
+        # Keyed by the names, so every model with the same table shares one palette
+        names = tuple(class_names.tolist())
+        palette = self._palettes.get(names)
+        if palette is None:
+            palette = self._palettes[names] = [self._generate_class_color(name) for name in names]
+            logger.debug("Color table built for %d classes.", len(names))
+        return palette
+
+    def _get_label_tile(self, label: str, color: tuple) -> Image.Image:
+        """
+        Get the rendered label, text on its filled background, rendered once per distinct label.
+
+        Args:
+            label (str): The label, class name and confidence with two decimals.
+            color (tuple): The (R, G, B) background color of the class.
+
+        Returns:
+            Image.Image: The label tile, pasted above the box.
+        """
+        tile = self._label_tiles.get((label, color))
+        if tile is None:
+            text_bbox = ImageDraw.Draw(Image.new("RGB", (1, 1))).textbbox((0, 0), label, font=self.font)
+            tile = Image.new("RGB", (max(1, text_bbox[2] - text_bbox[0]), max(1, text_bbox[3] - text_bbox[1])), color)
+            ImageDraw.Draw(tile).text((-text_bbox[0], -text_bbox[1]), label, fill="white", font=self.font)
+            self._label_tiles[(label, color)] = tile
+        return tile
+
+    @timed_stage("draw")
+    def draw_bounding_boxes(self, image: Image.Image, predictions: Detections, max_size: Optional[int] = None) -> Image.Image:
         """
         Draw bounding boxes and labels on an image, with different colors for each class.
 
         Args:
             image (Image.Image): The input image on which to draw.
-            predictions (pd.DataFrame): DataFrame with bounding box coordinates, class names, and confidence scores.
+            predictions (Detections): Detections with bounding box coordinates, class ids, and confidence scores.
+            max_size (int, optional): Draw on a copy downscaled to this longest side instead of
+                on the image itself, for previews. Defaults to None.
 
         Returns:
             Image.Image: Image with drawn bounding boxes and labels.
         """
-        logger.info("Starting to draw bounding boxes on image")
-        
-        # Check if predictions dataframe is empty
-        if predictions.empty:
-            logger.warning("No predictions to draw on the image.")
+        logger.debug("Starting to draw bounding boxes on image")
+
+        # Draw a smaller preview on a downscaled copy, with the boxes scaled alike
+        if max_size and max(image.size) > max_size:
+            ratio = max_size / max(image.size)
+            preview_size = (max(1, round(image.width * ratio)), max(1, round(image.height * ratio)))
+            predictions = predictions.rescale(preview_size[0] / image.width, preview_size[1] / image.height)
+            image = image.resize(preview_size, Image.BILINEAR, reducing_gap=2.0)
+
+        # Check if predictions are empty
+        if predictions.is_empty:
+            logger.debug("No predictions to draw on the image.")
             return image
 
         draw = ImageDraw.Draw(image)
-        font = ImageFont.load_default()  # Default font; customize if necessary
+        palette = self._get_palette(predictions.class_names)
+        names = predictions.class_names.tolist()
 
-        for _, row in predictions.iterrows():
+        rows = zip(predictions.xyxy.tolist(), predictions.class_id.tolist(), predictions.confidence.tolist())
+        for index, ((xmin, ymin, xmax, ymax), class_id, confidence) in enumerate(rows):
             try:
-                # Extract bounding box coordinates and class name
-                xmin, ymin, xmax, ymax = row['xmin'], row['ymin'], row['xmax'], row['ymax']
-                label = f"{row['name']} ({row['confidence']:.2f})"
-                
-                # Generate a unique color for each class
-                color = self._generate_class_color(row['name'])
+                label = f"{names[class_id]} ({confidence:.2f})"
+                color = palette[class_id]
 
                 # Draw the bounding box with the specified color
                 draw.rectangle([(xmin, ymin), (xmax, ymax)], outline=color, width=2)
-                
-                # Calculate text size using textbbox
-                text_bbox = draw.textbbox((0, 0), label, font=font)
-                text_width = text_bbox[2] - text_bbox[0]
-                text_height = text_bbox[3] - text_bbox[1]
-                
+
                 # Determine text position
-                text_position = (xmin, ymin - text_height if ymin > text_height else ymin)
-                
-                # Draw a filled rectangle behind the text for readability
-                draw.rectangle(
-                    [text_position, (text_position[0] + text_width, text_position[1] + text_height)],
-                    fill=color
-                )
-                # Draw the text label
-                draw.text(text_position, label, fill="white", font=font)
+                tile = self._get_label_tile(label, color)
+                text_height = tile.height
+                text_position = (int(xmin), int(ymin - text_height if ymin > text_height else ymin))
+
+                # Paste the label, text on a filled rectangle for readability
+                image.paste(tile, text_position)
 
             except Exception as e:
-                logger.error("Error processing bounding box at row %d: %s", _, str(e))
+                logger.error("Error processing bounding box at row %d: %s", index, str(e))
 
-        logger.info("Finished drawing bounding boxes on image")
-        return image
\ No newline at end of file
+        logger.debug("Finished drawing bounding boxes on image")
+        return image